@@ -2,6 +2,28 @@
 
 from __future__ import absolute_import, unicode_literals
 
+import os
+import socket
+
+
+def metrics_process_id(pid=None):
+    """
+    Name for a process's prometheus_client multiprocess files; this
+    process's unless ``pid`` is given.
+
+    Every container sharing PROMETHEUS_MULTIPROC_DIR starts its PIDs from 1,
+    so the PID alone would make processes in different containers write
+    the same files; the hostname (the container ID) keeps them apart.
+    """
+    return f"{socket.gethostname()}-{pid or os.getpid()}"
+
+
+if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    # before any metric is created, so every value uses the per-container names
+    from prometheus_client import values
+
+    values.ValueClass = values.MultiProcessValue(metrics_process_id)
+
 # This will make sure the app is always imported when
 # Django starts so that shared_task will use this app.
 from .celery import app as celery_app
@@ -0,0 +1,65 @@
+"""
+Settings for `manage.py benchmark`.
+
+Runs the whole stack in one process: SQLite (or the regular PostgreSQL
+database with BENCH_DATABASE=postgres), an in-memory fakeredis server in
+place of Redis (or a real one via BENCH_REDIS_URL), eager Celery, so
+each order is processed inline, and a bar store under bench_barstore/.
+
+    DJANGO_SETTINGS_MODULE=StockFlow.bench_settings python manage.py benchmark
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+# `benchmark` refuses to run (and wipe data) under any other settings
+BENCHMARK = True
+
+DEBUG = False
+ALLOWED_HOSTS = ['testserver', 'localhost']
+
+if os.getenv('BENCH_DATABASE', 'sqlite') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('BENCH_SQLITE_PATH', str(BASE_DIR / 'bench.sqlite3')),
+        }
+    }
+
+BENCH_REDIS_URL = os.getenv('BENCH_REDIS_URL')
+if BENCH_REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": BENCH_REDIS_URL,
+            "OPTIONS": {"CLIENT_CLASS": "django_redis.client.DefaultClient"},
+        }
+    }
+else:
+    import fakeredis
+
+    _fake_server = fakeredis.FakeServer()
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": "redis://localhost:6379/1",
+            "OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+                "CONNECTION_POOL_KWARGS": {"connection_class": fakeredis.FakeConnection, "server": _fake_server},
+            },
+        }
+    }
+
+# the history.* cases compare the ORM and the bar store directly; the
+# stocks.bars case uses the store unless BENCH_BAR_STORE=0
+BAR_STORE_DIR = str(BASE_DIR / 'bench_barstore') if os.getenv('BENCH_BAR_STORE', '1') == '1' else None
+
+CELERY_BROKER_URL = "memory://"
+CELERY_RESULT_BACKEND = "cache+memory://"
+CELERY_TASK_ALWAYS_EAGER = True
+TRANSACTION_PROCESSING_MODE = 'task'
+
+# the cases submit orders for a few users as fast as they can; measure the
+# endpoints rather than the per-user rate limit
+ORDER_RATE_LIMIT = None
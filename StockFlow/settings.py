@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -47,6 +48,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app.metrics.MetricsMiddleware',  # first, so it times the whole stack
+    'app.profiling.SQLBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -101,6 +104,21 @@ CACHES = {
     }
 }
 
+# per-process LRU in front of Redis for cached API responses; entries are
+# evicted everywhere through Redis pub/sub and expire locally after
+# LOCAL_CACHE_TIMEOUT seconds in case an invalidation message is lost
+LOCAL_CACHE_MAX_ENTRIES = 1024
+LOCAL_CACHE_TIMEOUT = 5
+
+# /api/async/stocks/stream/: frames a client may lag behind before it is
+# disconnected, and seconds between keep-alive comments on an idle stream
+QUOTE_STREAM_QUEUE_SIZE = 256
+QUOTE_STREAM_HEARTBEAT = 15
+
+# orders are priced from a per-process table of latest prices kept current
+# by the quote stream; a price unconfirmed for this many seconds is re-read
+PRICE_TABLE_MAX_AGE = 60
+
 #celery settings
 # CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_BROKER_URL="redis://redis:6379/0"
@@ -112,6 +130,88 @@ CELERY_TASK_SERIALIZER = 'json'
 # CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND="redis://redis:6379/0"
 
+# process_transaction is routed by a consistent hash of user_id onto
+# TRANSACTION_SHARDS queues named transactions.0 .. transactions.N-1.
+# Each queue must be consumed by exactly one worker process
+# (--concurrency=1) so a user's orders are processed in order.
+TRANSACTION_SHARDS = int(os.getenv('TRANSACTION_SHARDS', 4))
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# "task" processes each order in its own process_transaction task;
+# "batch" leaves orders pending for `manage.py process_transactions`,
+# which applies them in aggregated batches.
+TRANSACTION_PROCESSING_MODE = os.getenv('TRANSACTION_PROCESSING_MODE', 'task')
+
+# seconds a transaction's status stays in Redis for /api/transactions/{id}/wait/
+TRANSACTION_STATUS_TIMEOUT = 3600
+
+# admission control for order intake (app/admission.py): submissions get
+# 429 + Retry-After once the user's shard queue is deeper than
+# ADMISSION_MAX_QUEUE_DEPTH messages or the oldest pending order is older
+# than ADMISSION_MAX_PENDING_AGE seconds; batch baskets are shed from
+# ADMISSION_SHED_RATIO of those limits. Each user may place
+# ORDER_RATE_LIMIT orders a second with bursts of ORDER_RATE_BURST.
+ADMISSION_MAX_QUEUE_DEPTH = int(os.getenv('ADMISSION_MAX_QUEUE_DEPTH', 10000))
+ADMISSION_MAX_PENDING_AGE = float(os.getenv('ADMISSION_MAX_PENDING_AGE', 30))
+ADMISSION_SHED_RATIO = 0.5
+ORDER_RATE_LIMIT = float(os.getenv('ORDER_RATE_LIMIT', 10))
+ORDER_RATE_BURST = int(os.getenv('ORDER_RATE_BURST', 20))
+
+# Transaction and StockData are partitioned by month on PostgreSQL. Beat
+# creates partitions PARTITION_MONTHS_AHEAD months ahead and moves months
+# older than ARCHIVE_RETENTION_MONTHS (per table) to compressed files in
+# ARCHIVE_DIR, which reads covering those months still return. ARCHIVE_DIR
+# must be shared by every web and worker process.
+PARTITION_MONTHS_AHEAD = 3
+ARCHIVE_RETENTION_MONTHS = {
+    'app_transaction': 24,
+    'app_stockdata': 36,
+}
+ARCHIVE_DIR = BASE_DIR / 'archive'
+# per-key archive files each process keeps decompressed in memory
+ARCHIVE_CACHE_FILES = 64
+CELERY_BEAT_SCHEDULE = {
+    'ensure-partitions': {
+        'task': 'app.tasks.ensure_partitions',
+        'schedule': crontab(hour=2, minute=0),
+    },
+    'archive-expired-partitions': {
+        'task': 'app.tasks.archive_expired_partitions',
+        'schedule': crontab(hour=3, minute=0),
+    },
+}
+
+# memory-mapped per-ticker bar columns served to the bars endpoint instead
+# of querying StockData (see app/barstore.py); off unless set, and must be
+# shared by every web and worker process
+BAR_STORE_DIR = os.getenv('BAR_STORE_DIR')
+
+# /api/stocks/{ticker}/indicators/ series are cached in Redis and advanced
+# bar by bar on ingest; unused series expire after this many seconds
+INDICATOR_CACHE_TIMEOUT = 86400
+
+# SQL budget per request or Celery task; routes are URL names (e.g.
+# "transactions-detail") and tasks their dotted names. Requests over budget
+# are logged and counted in stockflow_sql_budget_exceeded_total.
+SQL_QUERY_BUDGET = 20
+SQL_TIME_BUDGET_MS = 200
+SQL_QUERY_BUDGETS = {
+    'users-detail': 2,
+    'stocks-detail': 2,
+    'transactions-detail': 2,
+    'app.tasks.process_transaction': 8,
+}
+# adds X-SQL-Queries / X-SQL-Time-Ms response headers
+SQL_BUDGET_HEADERS = DEBUG
+
+# sampling profiler: fraction of requests profiled, plus any request with
+# "X-Profile: 1" when PROFILE_ON_DEMAND; folded stacks for flame graphs
+# are written to PROFILE_OUTPUT_DIR
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_ON_DEMAND = DEBUG
+PROFILE_INTERVAL_MS = 5
+PROFILE_OUTPUT_DIR = BASE_DIR / 'profiles'
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
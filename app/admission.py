@@ -0,0 +1,198 @@
+"""
+Admission control for order intake.
+
+Orders are turned away with 429 and Retry-After, before anything is
+written or queued, when any of these is true:
+
+* the user's Celery shard queue holds more than ADMISSION_MAX_QUEUE_DEPTH
+  messages;
+* the oldest pending transaction is older than ADMISSION_MAX_PENDING_AGE
+  seconds;
+* the user's token bucket cannot cover the orders submitted (ORDER_RATE_LIMIT
+  orders a second, bursts of up to ORDER_RATE_BURST).
+
+Low-priority submissions (batch baskets) are shed earlier, once the load
+passes ADMISSION_SHED_RATIO of either limit. Single orders keep flowing
+until the limit itself.
+
+Queue depths are LLENs on the broker. The pending age comes from the
+pending set that notifications keeps in Redis. Each process refreshes
+both at most every ADMISSION_CHECK_INTERVAL seconds. SQL is only used to
+confirm that an old entry in the pending set is still pending. Rate
+limiting is one Lua call per submission, charging one token per order.
+"""
+import logging
+import math
+import threading
+import time
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from . import metrics
+from .models import Transaction
+from .notifications import pending_key
+from .routing import queue_for_user, transaction_queues
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_MAX_QUEUE_DEPTH = getattr(settings, 'ADMISSION_MAX_QUEUE_DEPTH', 10000)
+ADMISSION_MAX_PENDING_AGE = getattr(settings, 'ADMISSION_MAX_PENDING_AGE', 30)
+ADMISSION_SHED_RATIO = getattr(settings, 'ADMISSION_SHED_RATIO', 0.5)
+ADMISSION_CHECK_INTERVAL = getattr(settings, 'ADMISSION_CHECK_INTERVAL', 1.0)
+ADMISSION_RETRY_AFTER = getattr(settings, 'ADMISSION_RETRY_AFTER', 5)
+
+# orders per second per user and the burst allowed; None disables
+ORDER_RATE_LIMIT = getattr(settings, 'ORDER_RATE_LIMIT', None)
+ORDER_RATE_BURST = getattr(settings, 'ORDER_RATE_BURST', 20)
+
+# pending ids checked against the database per refresh, for entries whose
+# final status never reached Redis
+MAX_STALE_PENDING_CHECKS = 10
+
+Load = namedtuple('Load', ['queue_depths', 'pending_age'])
+
+# all or nothing; ARGV is (rate, burst, now, cost per key...). Returns the
+# seconds until every bucket covers its cost, as a string, or "0" once taken
+_take_script = """
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local levels, wait = {}, 0
+for i, key in ipairs(KEYS) do
+    local cost = tonumber(ARGV[3 + i])
+    local bucket = redis.call('HMGET', key, 'tokens', 'at')
+    local tokens = tonumber(bucket[1]) or burst
+    local at = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - at) * rate)
+    levels[i] = tokens - cost
+    if tokens < cost then
+        wait = math.max(wait, (cost - tokens) / rate)
+    end
+end
+if wait > 0 then
+    return tostring(wait)
+end
+for i, key in ipairs(KEYS) do
+    redis.call('HSET', key, 'tokens', tostring(levels[i]), 'at', ARGV[3])
+    redis.call('EXPIRE', key, math.ceil(burst / rate) + 1)
+end
+return "0"
+"""
+
+
+class Rejected(Exception):
+    """
+    An order submission was not admitted.
+
+    Args:
+        reason (str): "overloaded", "shed", "rate_limited" or "too_large".
+        retry_after (float): Seconds the client should wait.
+    """
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self):
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class AdmissionControl:
+    """
+    Per-process view of the order pipeline's load, refreshed periodically.
+    """
+
+    def __init__(self):
+        self._load = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._load = None
+            self._checked = 0.0
+
+    def load(self):
+        """
+        Queue depths and oldest pending age, at most ADMISSION_CHECK_INTERVAL old.
+        """
+        with self._lock:
+            if self._load is not None and time.monotonic() - self._checked < ADMISSION_CHECK_INTERVAL:
+                return self._load
+        load = Load(metrics.queue_lengths(transaction_queues()) or {}, self._pending_age())
+        with self._lock:
+            self._load, self._checked = load, time.monotonic()
+        return load
+
+    def _pending_age(self):
+        client = get_redis_connection("default")
+        try:
+            for _ in range(MAX_STALE_PENDING_CHECKS):
+                oldest = client.zrange(pending_key(), 0, 0, withscores=True)
+                if not oldest:
+                    return 0.0
+                member, created = oldest[0]
+                age = time.time() - created
+                if age <= ADMISSION_MAX_PENDING_AGE * ADMISSION_SHED_RATIO:
+                    return age
+                # confirm before acting on it: a lost status update would
+                # otherwise hold the age up forever
+                if Transaction.objects.filter(id=int(member), status='pending').exists():
+                    return age
+                client.zrem(pending_key(), member)
+            return 0.0
+        except RedisError:
+            logger.warning("Could not read the pending transaction set", exc_info=True)
+            return 0.0
+
+    def check(self, user_ids, low_priority=False):
+        """
+        Admit a submission of orders or raise Rejected.
+
+        Args:
+            user_ids (iterable): The user of each order submitted, so a
+                user with several orders appears several times.
+            low_priority (bool): Shed this submission early under load.
+        """
+        orders = Counter(str(user_id) for user_id in user_ids)
+        user_ids = sorted(orders)
+        load = self.load()
+        ratio = ADMISSION_SHED_RATIO if low_priority else 1.0
+        depth = max((load.queue_depths.get(queue_for_user(user_id), 0) for user_id in user_ids
+                     if user_id.isdigit()), default=0)
+        if depth > ADMISSION_MAX_QUEUE_DEPTH * ratio or load.pending_age > ADMISSION_MAX_PENDING_AGE * ratio:
+            self._reject("shed" if low_priority else "overloaded", ADMISSION_RETRY_AFTER)
+        if ORDER_RATE_LIMIT and max(orders.values(), default=0) > ORDER_RATE_BURST:
+            # more than a full bucket: no amount of waiting admits it
+            self._reject("too_large", 0)
+        wait = self._take_tokens(orders)
+        if wait:
+            self._reject("rate_limited", wait)
+
+    @staticmethod
+    def _reject(reason, retry_after):
+        metrics.ORDERS_REJECTED.labels(reason).inc()
+        raise Rejected(reason, retry_after)
+
+    @staticmethod
+    def _take_tokens(orders):
+        if not ORDER_RATE_LIMIT or not orders:
+            return 0.0
+        client = get_redis_connection("default")
+        user_ids = sorted(orders)
+        keys = [cache.make_key(f"order_rate_{user_id}") for user_id in user_ids]
+        try:
+            wait = client.eval(_take_script, len(keys), *keys, ORDER_RATE_LIMIT, ORDER_RATE_BURST, time.time(),
+                               *[orders[user_id] for user_id in user_ids])
+        except RedisError:
+            # fail open; the queue limits still apply
+            logger.warning("Could not apply the order rate limit", exc_info=True)
+            return 0.0
+        return float(wait)
+
+
+admission_control = AdmissionControl()
@@ -0,0 +1,349 @@
+"""
+Cold storage for old Transaction and StockData rows.
+
+Once a month is older than its table's retention window, the
+archive_expired_partitions task writes its rows to
+``ARCHIVE_DIR/<table>/<YYYY-MM>/<key>.npz``, one file per user or ticker
+holding one compressed NumPy array per column, and removes them from the
+database (dropping the month's partition on PostgreSQL). The directories
+are the catalog: reads covering an archived month pick it up from disk, so
+bars, transaction pages and exports keep returning the full history, and a
+lookup for one user or ticker only opens that key's files.
+"""
+import logging
+import os
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+from itertools import groupby
+from operator import itemgetter
+from urllib.parse import quote
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction as db_transaction
+
+from .models import StockData, Transaction
+from .partitions import add_months, drop_partition, lock_partition, month_start
+from .prices import from_cents, to_cents
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = getattr(settings, 'ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archive'))
+
+# rows fetched per round trip while a month is archived
+ARCHIVE_CHUNK_SIZE = getattr(settings, 'ARCHIVE_CHUNK_SIZE', 5000)
+
+# months kept in the database per table before archival
+ARCHIVE_RETENTION_MONTHS = getattr(settings, 'ARCHIVE_RETENTION_MONTHS', {})
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def to_micros(timestamp):
+    return (timestamp - EPOCH) // MICROSECOND
+
+
+def from_micros(micros):
+    return EPOCH + timedelta(microseconds=int(micros))
+
+
+_encoders = {
+    'int': lambda values: np.array(values, dtype=np.int64),
+    'cents': lambda values: np.fromiter((to_cents(value) for value in values), dtype=np.int64, count=len(values)),
+    'time': lambda values: np.fromiter((to_micros(value) for value in values), dtype=np.int64, count=len(values)),
+    'str': lambda values: np.array(values, dtype=str),
+}
+
+_decoders = {
+    'int': int,
+    'cents': from_cents,
+    'time': from_micros,
+    'str': str,
+}
+
+
+@lru_cache(maxsize=getattr(settings, 'ARCHIVE_CACHE_FILES', 64))
+def _load(path, mtime_ns):
+    # keyed by mtime so a file rewritten by a later archive run is reloaded
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+@lru_cache(maxsize=16)
+def _catalog(directory, mtime_ns):
+    # month -> key file names, re-read only once archival touches the table
+    # directory again
+    catalog = {}
+    for name in os.listdir(directory):
+        try:
+            month = datetime.strptime(name, '%Y-%m').replace(tzinfo=dt_timezone.utc)
+        except ValueError:
+            continue
+        catalog[month] = frozenset(
+            entry for entry in os.listdir(os.path.join(directory, name)) if entry.endswith('.npz')
+        )
+    return dict(sorted(catalog.items()))
+
+
+class ColdTable:
+    """
+    A model's archived months.
+
+    Each month is a directory with one file per key, holding that key's rows
+    sorted by (timestamp, id), so one user's transactions or one ticker's
+    bars are found without decompressing anybody else's.
+
+    Args:
+        model: The archived model.
+        key (str): Column most reads filter on ('user_id', 'ticker').
+        columns (dict): Column name -> encoding ('int', 'cents', 'time', 'str').
+        hold (dict): Filter for rows that must stay in the database; a
+            month containing any is not archived yet.
+    """
+
+    def __init__(self, model, key, columns, hold=None):
+        self.model = model
+        self.table = model._meta.db_table
+        self.key = key
+        self.columns = columns
+        self.hold = hold
+
+    @property
+    def directory(self):
+        return os.path.join(ARCHIVE_DIR, self.table)
+
+    def month_directory(self, month):
+        return os.path.join(self.directory, f"{month:%Y-%m}")
+
+    @staticmethod
+    def file_name(key):
+        return f"{quote(str(key), safe='')}.npz"
+
+    def catalog(self):
+        """
+        Archived month starts, oldest first, each with its key file names.
+        """
+        try:
+            return _catalog(self.directory, os.stat(self.directory).st_mtime_ns)
+        except FileNotFoundError:
+            return {}
+
+    def months(self):
+        """
+        Month starts that have an archive directory, oldest first.
+        """
+        return list(self.catalog())
+
+    def read(self, month, name):
+        path = os.path.join(self.month_directory(month), name)
+        return _load(path, os.stat(path).st_mtime_ns)
+
+    def encode(self, rows):
+        values = list(zip(*rows)) if rows else [()] * len(self.columns)
+        return {name: _encoders[kind](column) for (name, kind), column in zip(self.columns.items(), values)}
+
+    def parts(self, key=None, start=None, end=None):
+        """
+        Archived rows with ``start <= timestamp < end``, optionally for one
+        key, one month at a time.
+
+        Yields:
+            dict: Column name -> array, ordered by (timestamp, id).
+        """
+        low = to_micros(start) if start is not None else None
+        high = to_micros(end) if end is not None else None
+        wanted = self.file_name(key) if key is not None else None
+        for month, names in self.catalog().items():
+            if (end is not None and month >= end) or (start is not None and add_months(month, 1) <= start):
+                continue
+            if wanted is not None:
+                if wanted not in names:
+                    continue
+                columns = self.read(month, wanted)
+            else:
+                files = [self.read(month, name) for name in sorted(names)]
+                if not files:
+                    continue
+                columns = {name: np.concatenate([part[name] for part in files]) for name in self.columns}
+                order = np.lexsort((columns['id'], columns['timestamp']))
+                columns = {name: array[order] for name, array in columns.items()}
+            timestamps = columns['timestamp']
+            first = np.searchsorted(timestamps, low, 'left') if low is not None else 0
+            last = np.searchsorted(timestamps, high, 'left') if high is not None else len(timestamps)
+            if first < last:
+                yield {name: array[first:last] for name, array in columns.items()}
+
+    def select(self, key=None, start=None, end=None):
+        """
+        Archived rows with ``start <= timestamp < end``, optionally for one key.
+
+        Returns:
+            dict: Column name -> array, ordered by (timestamp, id).
+        """
+        parts = list(self.parts(key, start, end))
+        if not parts:
+            return self.encode([])
+        return {name: np.concatenate([part[name] for part in parts]) for name in self.columns}
+
+    def rows(self, columns, fields):
+        """
+        Decode selected columns back into tuples of model values.
+        """
+        decoders = [_decoders[self.columns[field]] for field in fields]
+        arrays = [columns[field].tolist() for field in fields]
+        for values in zip(*arrays):
+            yield tuple(decode(value) for decode, value in zip(decoders, values))
+
+    def iter_rows(self, fields, key=None, start=None, end=None):
+        """
+        Archived rows as tuples of model values, ordered by (timestamp, id),
+        loading and decoding one month at a time.
+        """
+        for columns in self.parts(key, start, end):
+            yield from self.rows(columns, fields)
+
+    def archive_month(self, month):
+        """
+        Move one month's rows from the database into its key files,
+        merging with rows archived from that month before.
+
+        The files are renamed into place just before the deleting
+        transaction commits, so readers see a key's rows in one place or the
+        other except for that instant.
+
+        Returns:
+            int: Rows moved.
+        """
+        month = month_start(month)
+        queryset = self.model.objects.filter(timestamp__gte=month, timestamp__lt=add_months(month, 1))
+        directory = self.month_directory(month)
+        os.makedirs(directory, exist_ok=True)
+        fields = list(self.columns)
+        key_index, id_index = fields.index(self.key), fields.index('id')
+        moved = newest_id = 0
+        written = []
+        try:
+            with db_transaction.atomic():
+                lock_partition(connection, self.table, month)
+                # streamed in key order: only one key's rows are held at a time
+                rows = queryset.order_by(self.key, 'timestamp', 'id').values_list(*fields).iterator(
+                    chunk_size=ARCHIVE_CHUNK_SIZE
+                )
+                for key, group in groupby(rows, key=itemgetter(key_index)):
+                    group = list(group)
+                    moved += len(group)
+                    newest_id = max(newest_id, max(row[id_index] for row in group))
+                    path = os.path.join(directory, self.file_name(key))
+                    written.append((path + '.partial', path))
+                    self._write_key(path, self.encode(group))
+
+                drop_partition(connection, self.table, month)
+                # rows left in the default partition, or every row off PostgreSQL;
+                # anything inserted since the read above waits for the next run
+                queryset.filter(id__lte=newest_id).delete()
+                for partial, path in written:
+                    os.replace(partial, path)
+                # readers' catalogs are keyed by the table directory's mtime
+                os.utime(self.directory)
+        finally:
+            for partial, _ in written:
+                if os.path.exists(partial):
+                    os.remove(partial)
+        return moved
+
+    def _write_key(self, path, rows):
+        # a key's month, merged with what an earlier run archived, written
+        # beside its file until the month's transaction is about to commit
+        if os.path.exists(path):
+            existing = _load(path, os.stat(path).st_mtime_ns)
+            rows = {name: np.concatenate([existing[name], rows[name]]) for name in self.columns}
+            _, unique = np.unique(rows['id'], return_index=True)
+            rows = {name: array[unique] for name, array in rows.items()}
+            order = np.lexsort((rows['id'], rows['timestamp']))
+            rows = {name: array[order] for name, array in rows.items()}
+        with open(path + '.partial', 'wb') as f:
+            np.savez_compressed(f, **rows)
+
+    def expired_months(self, now=None):
+        """
+        Months with rows in the database that are past the retention window.
+        """
+        retention = ARCHIVE_RETENTION_MONTHS.get(self.table)
+        if retention is None:
+            return []
+        cutoff = add_months(month_start(now or datetime.now(dt_timezone.utc)), -retention)
+        dates = self.model.objects.filter(timestamp__lt=cutoff).dates('timestamp', 'month')
+        return [datetime(day.year, day.month, 1, tzinfo=dt_timezone.utc) for day in dates]
+
+    def archive_expired(self, now=None):
+        """
+        Archive every expired month, oldest first, stopping at a month that
+        still holds rows matching ``hold``.
+
+        Returns:
+            int: Rows moved.
+        """
+        moved = 0
+        for month in self.expired_months(now):
+            if self.hold and self.model.objects.filter(
+                timestamp__gte=month, timestamp__lt=add_months(month, 1), **self.hold
+            ).exists():
+                logger.warning("Not archiving %s for %s: it still has rows matching %s", self.table, f"{month:%Y-%m}", self.hold)
+                break
+            moved += self.archive_month(month)
+        return moved
+
+
+TRANSACTIONS = ColdTable(
+    Transaction, 'user_id',
+    {'id': 'int', 'user_id': 'int', 'ticker': 'str', 'transaction_type': 'str', 'transaction_volume': 'int',
+     'transaction_price': 'cents', 'timestamp': 'time', 'status': 'str'},
+    hold={'status': 'pending'},
+)
+
+BARS = ColdTable(
+    StockData, 'ticker',
+    {'id': 'int', 'ticker': 'str', 'open_price': 'cents', 'high': 'cents', 'low': 'cents',
+     'close_price': 'cents', 'volume': 'int', 'timestamp': 'time'},
+)
+
+COLD_TABLES = (TRANSACTIONS, BARS)
+
+
+def archive_expired(now=None):
+    """
+    Archive the expired months of every cold table.
+
+    Returns:
+        dict: Table name -> rows moved.
+    """
+    return {cold.table: cold.archive_expired(now) for cold in COLD_TABLES}
+
+
+def archived_transactions(user_id, start=None, end=None, before=None, limit=None):
+    """
+    A user's archived transactions, newest first, as unsaved Transaction
+    instances.
+
+    Args:
+        start, end (datetime): Inclusive timestamp bounds.
+        before (tuple): Only rows strictly before this (timestamp, id) position.
+        limit (int): Maximum number of rows.
+    """
+    try:
+        key = int(user_id)
+    except (TypeError, ValueError):
+        return []
+    if before is not None and (end is None or before[0] < end):
+        end = before[0]
+    columns = TRANSACTIONS.select(key, start, end + MICROSECOND if end is not None else None)
+    if before is not None:
+        timestamps, ids = columns['timestamp'], columns['id']
+        position = to_micros(before[0])
+        keep = (timestamps < position) | ((timestamps == position) & (ids < before[1]))
+        columns = {name: array[keep] for name, array in columns.items()}
+    if limit is not None:
+        columns = {name: array[-limit:] if limit else array[:0] for name, array in columns.items()}
+    fields = list(TRANSACTIONS.columns)
+    return [Transaction(**dict(zip(fields, row))) for row in reversed(list(TRANSACTIONS.rows(columns, fields)))]
@@ -0,0 +1,155 @@
+"""
+Async versions of the hot read endpoints, for deployment under ASGI.
+
+They return the same bodies and cache entries as the DRF viewsets but
+await Redis (redis.asyncio) and the database (Django's async ORM), so a
+request waiting on I/O holds no worker thread.
+"""
+import asyncio
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from .archive import archived_transactions
+from .caching import aget_or_build, entry_response
+from .models import User, StockData, LatestQuote, Transaction
+from .pagination import KeysetPagination, InvalidCursor
+from .serializers import UserSerializer, StockDataSerializer, LatestQuoteSerializer, TransactionSerializer
+from .streaming import hub, STREAM_EVENTS
+from .notifications import aget_status, waiters, FINAL_STATUSES
+
+# seconds between keep-alive comments on an idle stream
+STREAM_HEARTBEAT = getattr(settings, 'QUOTE_STREAM_HEARTBEAT', 15)
+
+MAX_STREAM_TICKERS = 100
+
+# long-poll bounds for /api/transactions/{id}/wait/, in seconds
+DEFAULT_WAIT_TIMEOUT = 25
+MAX_WAIT_TIMEOUT = 60
+
+
+async def user_detail(request, username):
+    """
+    Retrieve user data, using cache if available.
+    """
+    async def build():
+        try:
+            user = await User.objects.aget(username=username)
+        except User.DoesNotExist:
+            return None
+        return UserSerializer(user).data
+
+    entry = await aget_or_build(f"user_{username}", build, timeout=3600)
+    if entry is None:
+        return JsonResponse({"error": "User not found"}, status=404)
+    return entry_response(request, entry)
+
+
+async def stock_list(request):
+    """
+    List all stocks, using cache if available.
+    """
+    async def build():
+        stocks = [stock async for stock in StockData.objects.all()]
+        return StockDataSerializer(stocks, many=True).data
+
+    return entry_response(request, await aget_or_build("all_stocks", build, timeout=3600))
+
+
+async def stock_detail(request, ticker):
+    """
+    Retrieve the latest bar for a stock, using cache if available.
+    """
+    async def build():
+        try:
+            stock = await LatestQuote.objects.aget(ticker=ticker)
+        except LatestQuote.DoesNotExist:
+            return None
+        return LatestQuoteSerializer(stock).data
+
+    entry = await aget_or_build(f"stock_{ticker}", build, timeout=3600)
+    if entry is None:
+        return JsonResponse({"error": "Stock not found"}, status=404)
+    return entry_response(request, entry)
+
+
+async def transaction_history(request, user_id):
+    """
+    Retrieve transactions for a specific user, one keyset page at a time.
+    """
+    paginator = KeysetPagination(request)
+    try:
+        page = await paginator.apaginate_queryset(
+            Transaction.objects.filter(user_id=user_id),
+            lambda before, limit: archived_transactions(user_id, before=before, limit=limit),
+        )
+    except InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    body = JSONRenderer().render(TransactionSerializer(page, many=True).data)
+    return paginator.add_headers(HttpResponse(body, content_type='application/json'))
+
+
+async def transaction_wait(request, transaction_id):
+    """
+    Long-poll for a transaction to leave the pending state.
+
+    Answers as soon as process_transaction (or the batch processor) records
+    a final status, or after ``?timeout=`` seconds with the transaction
+    still pending. The status is read from Redis, so waiting on a recently
+    created order runs no database queries.
+    """
+    try:
+        timeout = min(float(request.GET.get('timeout', DEFAULT_WAIT_TIMEOUT)), MAX_WAIT_TIMEOUT)
+    except ValueError:
+        return JsonResponse({"error": "timeout must be a number of seconds."}, status=400)
+
+    record = await aget_status(transaction_id)
+    if record is None:
+        # older than the status record's lifetime, or created before it existed
+        transaction = await Transaction.objects.filter(id=transaction_id).afirst()
+        if transaction is None:
+            return JsonResponse({"error": "Transaction not found"}, status=404)
+        record = TransactionSerializer(transaction).data
+    if record['status'] not in FINAL_STATUSES and timeout > 0:
+        record = await waiters.wait(transaction_id, timeout) or record
+    return JsonResponse(record)
+
+
+async def quote_stream(request):
+    """
+    Server-Sent Events stream of new bars and latest-price changes.
+
+    Query params:
+        tickers: Comma-separated tickers to follow (required).
+        events: Comma-separated subset of 'bar' and 'quote' (default both).
+    """
+    tickers = {ticker.strip() for ticker in request.GET.get('tickers', '').split(',') if ticker.strip()}
+    events = {event.strip() for event in request.GET.get('events', ','.join(STREAM_EVENTS)).split(',') if event.strip()}
+    if not tickers or len(tickers) > MAX_STREAM_TICKERS:
+        return JsonResponse({"error": f"Provide between 1 and {MAX_STREAM_TICKERS} tickers."}, status=400)
+    if not events or not events <= set(STREAM_EVENTS):
+        return JsonResponse({"error": "events must be 'bar', 'quote' or both."}, status=400)
+
+    client = await hub.connect(tickers, events)
+
+    async def frames():
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                await hub.renew()
+                try:
+                    frame = await asyncio.wait_for(client.queue.get(), STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                if frame is None:  # fell too far behind
+                    break
+                yield frame
+        finally:
+            hub.disconnect(client)
+
+    response = StreamingHttpResponse(frames(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
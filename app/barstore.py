@@ -0,0 +1,226 @@
+"""
+Read-optimized, memory-mapped bar history, one file per ticker.
+
+Each file holds a ticker's bars as fixed-capacity NumPy columns
+(timestamp, open, high, low, close, volume) behind a small header:
+
+    [magic, capacity, length, 0, 0, 0, 0, 0][timestamp x capacity][open_price x capacity]...
+
+Timestamps (epoch seconds) and volumes are int64, prices float64, all in
+time order. A time-range read maps the file once per process and returns
+binary-search slices of it, so no rows are copied, parsed or turned into
+model instances.
+
+Files are built from the database (and archive) on first read and kept
+current on ingest: new bars are appended in place and the length in the
+header is bumped after the data is written, so readers never see a
+partial row. A file that runs out of capacity is rewritten larger and
+swapped in with os.replace; readers holding the old mapping keep a
+consistent snapshot. A bar older than the newest stored one deletes the
+ticker's file, which is rebuilt by the next read.
+
+Enabled by setting BAR_STORE_DIR, which every web and worker process must share.
+"""
+import fcntl
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+
+from .prices import to_epoch
+
+COLUMNS = ('timestamp', 'open_price', 'high', 'low', 'close_price', 'volume')
+INT_COLUMNS = ('timestamp', 'volume')
+
+MAGIC = int.from_bytes(b'SFBARS01', 'little')
+HEADER_WORDS = 8
+MIN_CAPACITY = 1024
+
+
+class BarStore:
+    """
+    Per-ticker memory-mapped bar columns under BAR_STORE_DIR.
+    """
+
+    def __init__(self):
+        self._maps = {}
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self):
+        return getattr(settings, 'BAR_STORE_DIR', None)
+
+    @property
+    def enabled(self):
+        return bool(self.directory)
+
+    def path(self, ticker):
+        # tickers are short symbols; anything unusual is hex-encoded to stay a safe file name
+        name = ticker if ticker.replace('.', '').replace('-', '').isalnum() else 'x' + ticker.encode().hex()
+        return os.path.join(self.directory, f"{name}.bars")
+
+    @contextmanager
+    def _locked(self, ticker):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(ticker) + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _map(self, ticker):
+        """
+        This process's mapping of the ticker's file, or None if it has none.
+        """
+        path = self.path(ticker)
+        try:
+            inode = os.stat(path).st_ino
+        except FileNotFoundError:
+            self._maps.pop(path, None)
+            return None
+        cached = self._maps.get(path)
+        if cached is None or cached[0] != inode:
+            with self._lock:
+                cached = (inode, np.memmap(path, dtype=np.int64, mode='r'))
+                self._maps[path] = cached
+        return cached[1]
+
+    @staticmethod
+    def _columns(mapped, length=None):
+        capacity = int(mapped[1])
+        if length is None:
+            length = int(mapped[2])
+        columns = {}
+        for index, name in enumerate(COLUMNS):
+            offset = HEADER_WORDS + index * capacity
+            block = np.asarray(mapped[offset:offset + length])
+            columns[name] = block if name in INT_COLUMNS else block.view(np.float64)
+        return columns
+
+    def load(self, ticker, start=None, end=None):
+        """
+        A ticker's bars with ``start <= timestamp < end``, as load_bars returns
+        them but sliced from the mapped file.
+
+        Returns:
+            dict: Column name -> read-only array view.
+        """
+        mapped = self._map(ticker)
+        if mapped is None:
+            mapped = self.rebuild(ticker)
+            if mapped is None:
+                from .timeseries import empty_bars
+                return empty_bars()
+        columns = self._columns(mapped)
+        timestamps = columns['timestamp']
+        first = np.searchsorted(timestamps, to_epoch(start), 'left') if start is not None else 0
+        # timestamps are kept to the whole second, so bounds are compared at that resolution
+        last = np.searchsorted(timestamps, -(-end.timestamp() // 1), 'left') if end is not None else len(timestamps)
+        return {name: column[first:last] for name, column in columns.items()}
+
+    def rebuild(self, ticker):
+        """
+        Write the ticker's file from the database and archive.
+
+        Returns:
+            np.memmap: The new mapping, or None if the ticker has no bars.
+        """
+        from .timeseries import query_bars
+        with self._locked(ticker):
+            mapped = self._map(ticker)
+            if mapped is not None:
+                return mapped  # built by another process while we waited
+            bars = query_bars(ticker)
+            if len(bars['timestamp']) == 0:
+                return None
+            self._write(ticker, bars, len(bars['timestamp']) * 2)
+        return self._map(ticker)
+
+    def _write(self, ticker, columns, capacity):
+        length = len(columns['timestamp'])
+        capacity = max(capacity, MIN_CAPACITY)
+        data = np.zeros(HEADER_WORDS + capacity * len(COLUMNS), dtype=np.int64)
+        data[:3] = (MAGIC, capacity, length)
+        for index, name in enumerate(COLUMNS):
+            offset = HEADER_WORDS + index * capacity
+            block = data[offset:offset + length]
+            if name in INT_COLUMNS:
+                block[:] = columns[name]
+            else:
+                block.view(np.float64)[:] = columns[name]
+        path = self.path(ticker)
+        data.tofile(path + '.partial')
+        os.replace(path + '.partial', path)
+
+    def append(self, bars):
+        """
+        Add newly committed bars to the files of tickers that have one.
+
+        Bars already present (committed before a concurrent rebuild read the
+        database) are skipped; a bar older than the newest stored one
+        invalidates the ticker's file instead.
+        """
+        by_ticker = {}
+        for bar in bars:
+            by_ticker.setdefault(bar.ticker, []).append((
+                to_epoch(bar.timestamp), float(bar.open_price), float(bar.high),
+                float(bar.low), float(bar.close_price), int(bar.volume),
+            ))
+        for ticker, rows in by_ticker.items():
+            with self._locked(ticker):
+                self._append(ticker, sorted(rows, key=lambda row: row[0]))
+
+    def _append(self, ticker, rows):
+        mapped = self._map(ticker)
+        if mapped is None:
+            return  # built from the database on first read
+        capacity, length = int(mapped[1]), int(mapped[2])
+        stored = self._columns(mapped, length)
+        timestamps = stored['timestamp']
+
+        fresh = []
+        for row in rows:
+            first, last = np.searchsorted(timestamps, row[0], 'left'), np.searchsorted(timestamps, row[0], 'right')
+            duplicate = any(
+                all(stored[name][index] == value for name, value in zip(COLUMNS, row))
+                for index in range(first, last)
+            )
+            if not duplicate:
+                fresh.append(row)
+        if not fresh:
+            return
+        if length and fresh[0][0] < timestamps[-1]:
+            os.remove(self.path(ticker))
+            return
+
+        new = {name: np.array(values, dtype=np.int64 if name in INT_COLUMNS else np.float64)
+               for name, values in zip(COLUMNS, zip(*fresh))}
+        if length + len(fresh) > capacity:
+            self._write(ticker, {name: np.concatenate([stored[name], new[name]]) for name in COLUMNS},
+                        (length + len(fresh)) * 2)
+            return
+        with open(self.path(ticker), 'r+b') as f:
+            for index, name in enumerate(COLUMNS):
+                f.seek((HEADER_WORDS + index * capacity + length) * 8)
+                f.write(new[name].tobytes())
+            f.flush()
+            # publish the rows only once their data is in place
+            f.seek(2 * 8)
+            f.write(np.int64(length + len(fresh)).tobytes())
+
+    def clear(self):
+        """
+        Delete every ticker's file; each is rebuilt on its next read.
+        """
+        self._maps.clear()
+        if not self.enabled or not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith('.bars'):
+                os.remove(os.path.join(self.directory, name))
+
+
+bar_store = BarStore()
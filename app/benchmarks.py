@@ -0,0 +1,329 @@
+import fnmatch
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from . import caching, timeseries
+from .barstore import bar_store
+from .models import Holding, LatestQuote, StockData, Transaction, User
+from .quotes import update_latest_quotes
+from .tasks import process_pending_batch, process_transaction
+
+SEED_BATCH_SIZE = 5000
+
+# seeded history ends here so runs are reproducible
+SEED_END = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _batches(total, size=SEED_BATCH_SIZE):
+    for start in range(0, total, size):
+        yield start, min(size, total - start)
+
+
+def seed(users, tickers, bars, transactions, random_seed=0):
+    """
+    Wipe the app's tables and fill them with deterministic synthetic data.
+
+    Bars are one-minute candles spread evenly across the tickers and ending
+    at SEED_END; transactions are completed orders by random users on
+    random tickers over the same period.
+
+    Returns:
+        dict: The seeded row counts.
+    """
+    rng = np.random.default_rng(random_seed)
+    for model in (Holding, Transaction, LatestQuote, StockData, User):
+        model.objects.all().delete()
+
+    User.objects.bulk_create(
+        [User(username=f"bench_user_{i}", balance=10_000_000) for i in range(users)],
+        batch_size=SEED_BATCH_SIZE,
+    )
+    user_ids = np.array(User.objects.order_by('id').values_list('id', flat=True))
+    ticker_names = [f"T{i:04d}" for i in range(tickers)]
+
+    per_ticker = -(-bars // tickers) if tickers else 0
+    newest = {}
+    for start, size in _batches(bars):
+        index = np.arange(start, start + size)
+        ticker_index = index // per_ticker
+        minutes_back = per_ticker - index % per_ticker
+        close = np.round(rng.uniform(10, 500, size), 2)
+        spread = np.round(rng.uniform(0, 5, size), 2)
+        volume = rng.integers(100, 100_000, size)
+        batch = [
+            StockData(
+                ticker=ticker_names[ticker_index[i]],
+                open_price=close[i], close_price=close[i],
+                high=close[i] + spread[i], low=max(close[i] - spread[i], 0.01),
+                volume=int(volume[i]),
+                timestamp=SEED_END - timedelta(minutes=int(minutes_back[i])),
+            )
+            for i in range(size)
+        ]
+        StockData.objects.bulk_create(batch)
+        # bars are generated oldest first within each ticker
+        newest.update((bar.ticker, bar) for bar in batch)
+    update_latest_quotes(list(newest.values()))
+
+    if len(user_ids) and tickers:
+        with _explicit_timestamps(Transaction):
+            _seed_transactions(rng, transactions, user_ids, ticker_names, max(per_ticker, 1) * 60)
+
+    if len(user_ids) and tickers:
+        Holding.objects.bulk_create([
+            Holding(user_id=int(user_id), ticker=ticker_names[i % tickers], quantity=10, cost_basis=1000)
+            for user_id in user_ids for i in range(min(tickers, 5))
+        ], batch_size=SEED_BATCH_SIZE)
+
+    reset_caches()
+    return {"users": users, "tickers": tickers, "bars": bars, "transactions": transactions}
+
+
+def _seed_transactions(rng, total, user_ids, ticker_names, period):
+    for _, size in _batches(total):
+        owners = rng.choice(user_ids, size)
+        picks = rng.integers(0, len(ticker_names), size)
+        volumes = rng.integers(1, 100, size)
+        prices = np.round(rng.uniform(10, 500, size), 2) * volumes
+        offsets = rng.integers(0, period, size)
+        sides = rng.integers(0, 2, size)
+        Transaction.objects.bulk_create([
+            Transaction(
+                user_id=int(owners[i]), ticker=ticker_names[picks[i]],
+                transaction_type=('BUY', 'SELL')[sides[i]],
+                transaction_volume=int(volumes[i]), transaction_price=prices[i], status='completed',
+                timestamp=SEED_END - timedelta(seconds=int(offsets[i])),
+            )
+            for i in range(size)
+        ])
+
+
+@contextmanager
+def _explicit_timestamps(model):
+    # timestamp is auto_now_add; let seeded rows keep the history they were given
+    field = model._meta.get_field('timestamp')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def reset_caches():
+    cache.clear()
+    caching.local_cache.clear()
+    bar_store.clear()
+
+
+def summarize(samples, items_per_op=1, errors=0):
+    """
+    Latency percentiles (ms) and throughput for a list of durations in seconds.
+    """
+    durations = np.array(samples)
+    total = durations.sum()
+    p50, p95, p99 = (np.percentile(durations, [50, 95, 99]) * 1000).tolist()
+    return {
+        "iterations": len(samples),
+        "errors": errors,
+        "mean_ms": round(float(durations.mean()) * 1000, 3),
+        "p50_ms": round(p50, 3),
+        "p95_ms": round(p95, 3),
+        "p99_ms": round(p99, 3),
+        "max_ms": round(float(durations.max()) * 1000, 3),
+        "ops_per_sec": round(len(samples) / total, 1) if total else None,
+        "items_per_sec": round(len(samples) * items_per_op / total, 1) if total else None,
+    }
+
+
+class Bench:
+    """
+    Benchmark cases against the seeded data, run in-process through the
+    full Django stack with DRF's test client.
+    """
+
+    TRANSACTION_BATCH = 50
+    BULK_ROWS = 100
+    PENDING_BATCH = 500
+    WATCHLIST = 50
+
+    def __init__(self, random_seed=0):
+        self.rng = np.random.default_rng(random_seed)
+        self.client = APIClient()
+        self.users = list(User.objects.values_list('id', 'username'))
+        self.tickers = sorted(StockData.objects.values_list('ticker', flat=True).distinct())
+        if not self.users or not self.tickers:
+            raise ValueError("The database has no users or bars; seed it first.")
+        self.counter = 0
+        # new bars must be newer than anything seeded so they move the latest quote
+        self.clock = SEED_END
+
+    def user(self):
+        return self.users[self.rng.integers(len(self.users))]
+
+    def ticker(self):
+        return self.tickers[self.rng.integers(len(self.tickers))]
+
+    def next_timestamp(self):
+        self.clock += timedelta(seconds=1)
+        return self.clock.isoformat().replace('+00:00', 'Z')
+
+    def unique(self, prefix):
+        self.counter += 1
+        return f"{prefix}_{int(time.time())}_{self.counter}"
+
+    def cases(self):
+        """
+        name -> (prepare, run, expected status or None, items per run).
+
+        ``prepare`` is untimed and returns the argument passed to ``run``.
+        """
+        window = "start_timestamp=2000-01-01T00:00:00Z&end_timestamp=2100-01-01T00:00:00Z"
+        return {
+            "users.create": (
+                lambda: {"username": self.unique("bench"), "balance": 1000},
+                lambda body: self.client.post('/api/users/', body), 201, 1),
+            "users.retrieve": (
+                lambda: self.user()[1],
+                lambda username: self.client.get(f'/api/users/{username}/'), 200, 1),
+            "users.portfolio": (
+                lambda: self.user()[1],
+                lambda username: self.client.get(f'/api/users/{username}/portfolio/'), 200, 1),
+            "stocks.list": (
+                lambda: None,
+                lambda _: self.client.get('/api/stocks/'), 200, 1),
+            "stocks.retrieve": (
+                self.ticker,
+                lambda ticker: self.client.get(f'/api/stocks/{ticker}/'), 200, 1),
+            "stocks.bars": (
+                self.ticker,
+                lambda ticker: self.client.get(f'/api/stocks/{ticker}/bars/?interval=1h'), 200, 1),
+            "stocks.quotes": (
+                lambda: ",".join(self.ticker() for _ in range(self.WATCHLIST)),
+                lambda tickers: self.client.get(f'/api/stocks/quotes/?tickers={tickers}'), 200, self.WATCHLIST),
+            "stocks.movers": (
+                lambda: None,
+                lambda _: self.client.get('/api/stocks/movers/?by=change&n=20'), 200, 1),
+            "history.orm": (
+                self.ticker,
+                lambda ticker: timeseries.resample(timeseries.query_bars(ticker), 3600), None, 1),
+            "history.store": (
+                self.ticker,
+                lambda ticker: timeseries.resample(bar_store.load(ticker), 3600), None, 1),
+            "stocks.export": (
+                self.ticker,
+                lambda ticker: _consume(self.client.get(f'/api/stocks/{ticker}/export/')), 200, 1),
+            "stocks.create": (
+                lambda: {"ticker": self.ticker(), "open_price": 100, "close_price": 101, "high": 102,
+                         "low": 99, "volume": 1000, "timestamp": self.next_timestamp()},
+                lambda body: self.client.post('/api/stocks/', body), 201, 1),
+            "stocks.bulk": (
+                self.bulk_csv,
+                lambda body: self.client.generic('POST', '/api/stocks/bulk/', body, content_type='text/csv'),
+                201, self.BULK_ROWS),
+            "transactions.create": (
+                lambda: {"user": self.user()[0], "ticker": self.ticker(), "transaction_type": "BUY", "transaction_volume": 1},
+                lambda body: self.client.post('/api/transactions/', body), 201, 1),
+            "transactions.batch": (
+                lambda: {"orders": [
+                    {"user": self.user()[0], "ticker": self.ticker(), "transaction_type": "BUY", "transaction_volume": 1}
+                    for _ in range(self.TRANSACTION_BATCH)
+                ]},
+                lambda body: self.client.post('/api/transactions/batch/', body, format='json'),
+                None, self.TRANSACTION_BATCH),
+            "transactions.retrieve": (
+                lambda: self.user()[0],
+                lambda user_id: self.client.get(f'/api/transactions/{user_id}/'), 200, 1),
+            "transactions.by_date": (
+                lambda: self.user()[0],
+                lambda user_id: self.client.get(f'/api/transactions/{user_id}/transactions_by_date/?{window}'), 200, 1),
+            "transactions.export": (
+                lambda: self.user()[0],
+                lambda user_id: _consume(self.client.get(f'/api/transactions/export/?user_id={user_id}&{window}')), 200, 1),
+            "async.stocks.retrieve": (
+                self.ticker,
+                lambda ticker: self.client.get(f'/api/async/stocks/{ticker}/'), 200, 1),
+            "async.transactions.retrieve": (
+                lambda: self.user()[0],
+                lambda user_id: self.client.get(f'/api/async/transactions/{user_id}/'), 200, 1),
+            "tasks.process_transaction": (
+                lambda: self.pending_orders(1)[0],
+                process_transaction, None, 1),
+            "tasks.process_pending_batch": (
+                self.pending_batch, process_pending_batch, None, self.PENDING_BATCH),
+        }
+
+    def bulk_csv(self):
+        ticker = self.ticker()
+        rows = ["ticker,timestamp,open_price,high,low,close_price,volume"]
+        rows += [f"{ticker},{self.next_timestamp()},100,102,99,101,1000" for _ in range(self.BULK_ROWS)]
+        return "\n".join(rows).encode()
+
+    def pending_batch(self):
+        self.pending_orders(self.PENDING_BATCH)
+        return self.PENDING_BATCH
+
+    def pending_orders(self, count):
+        orders = Transaction.objects.bulk_create([
+            Transaction(user_id=self.user()[0], ticker=self.ticker(), transaction_type='BUY',
+                        transaction_volume=1, transaction_price=100, status='pending')
+            for _ in range(count)
+        ])
+        return [order.id for order in orders]
+
+    def run(self, iterations, patterns=None, warmup=1):
+        """
+        Run every case whose name matches one of ``patterns`` (fnmatch).
+
+        Returns:
+            dict: Case name -> summary.
+        """
+        results = {}
+        for name, (prepare, run, expected, items) in self.cases().items():
+            if patterns and not any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+                continue
+            for _ in range(warmup):
+                run(prepare())
+            samples = []
+            errors = 0
+            for _ in range(iterations):
+                argument = prepare()
+                started = time.perf_counter()
+                outcome = run(argument)
+                samples.append(time.perf_counter() - started)
+                if expected is not None and outcome.status_code != expected:
+                    errors += 1
+            results[name] = summarize(samples, items, errors)
+        return results
+
+
+def _consume(response):
+    # exports stream; the work happens while the body is read
+    b"".join(response.streaming_content)
+    return response
+
+
+def compare(baseline, current):
+    """
+    Percentage change in p99 latency and throughput per case versus a previous run.
+    """
+    changes = {}
+    for name, result in current.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        changes[name] = {
+            "p99_change_pct": _change(before["p99_ms"], result["p99_ms"]),
+            "ops_change_pct": _change(before["ops_per_sec"], result["ops_per_sec"]),
+        }
+    return changes
+
+
+def _change(before, after):
+    if not before or after is None:
+        return None
+    return round((after - before) / before * 100, 1)
@@ -0,0 +1,618 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import socket
+import struct
+import threading
+import time
+import weakref
+import zlib
+from collections import Counter, OrderedDict, namedtuple
+
+import redis.asyncio
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django_redis import get_redis_connection
+from redis.connection import parse_url
+from redis.exceptions import LockError
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from . import metrics, pubsub
+
+# bodies larger than this are stored zlib-compressed
+COMPRESS_MIN_BYTES = 1024
+
+# how long an expired entry may still be served while one worker rebuilds it
+STALE_TIMEOUT = 300
+
+# a rebuild holding the lock longer than this is presumed dead
+LOCK_TIMEOUT = 30
+
+# how long a request with nothing to serve waits for another worker's rebuild
+LOCK_WAIT = 5
+
+# XFetch aggressiveness: >1 refreshes earlier, <1 later
+EARLY_EXPIRY_BETA = 1.0
+
+ENTRY_VERSION = 2
+FLAG_COMPRESSED = 0x01
+
+# version, flags, 16-byte content digest, fresh-until (epoch seconds), rebuild time (seconds)
+_header = struct.Struct('!BB16sdf')
+_FRESH_UNTIL_OFFSET = 18
+
+CacheEntry = namedtuple('CacheEntry', ['etag', 'body', 'compressed', 'fresh_until', 'compute_seconds'])
+
+# mark entries stale in place (keeping their TTL) without recreating deleted ones
+_invalidate_script = """
+for i, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        redis.call('SETRANGE', key, ARGV[1], ARGV[2])
+    end
+end
+return 0
+"""
+
+# per-process tier in front of Redis; 0 entries disables it
+LOCAL_CACHE_MAX_ENTRIES = getattr(settings, 'LOCAL_CACHE_MAX_ENTRIES', 1024)
+
+# upper bound on how long a process may serve its copy if an invalidation is lost
+LOCAL_CACHE_TIMEOUT = getattr(settings, 'LOCAL_CACHE_TIMEOUT', 5)
+
+INVALIDATION_CHANNEL = "cache-invalidation"
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+# asyncio Redis clients are bound to the event loop that created them:
+# loop -> (client, task closing it when the loop shuts down)
+_async_clients = weakref.WeakKeyDictionary()
+
+# django_redis OPTIONS that mean the same to redis.asyncio
+_ASYNC_OPTIONS = {
+    'PASSWORD': 'password',
+    'SOCKET_TIMEOUT': 'socket_timeout',
+    'SOCKET_CONNECT_TIMEOUT': 'socket_connect_timeout',
+}
+
+# CONNECTION_POOL_KWARGS the async pool accepts too; anything else (the
+# synchronous connection class, a fake server) stays with django_redis
+_ASYNC_POOL_KWARGS = (
+    'max_connections', 'retry_on_timeout', 'socket_keepalive', 'socket_keepalive_options',
+    'health_check_interval', 'client_name',
+)
+
+
+def async_redis_kwargs():
+    """
+    The default cache's Redis URL and client options, as django_redis
+    configures its own connections.
+    """
+    config = settings.CACHES["default"]
+    location = config["LOCATION"]
+    if isinstance(location, str):
+        location = location.split(",")
+    options = config.get("OPTIONS", {})
+    kwargs = {arg: options[option] for option, arg in _ASYNC_OPTIONS.items() if option in options}
+    pool_kwargs = options.get("CONNECTION_POOL_KWARGS", {})
+    kwargs.update({name: pool_kwargs[name] for name in _ASYNC_POOL_KWARGS if name in pool_kwargs})
+    return location[0].strip(), kwargs
+
+
+def _new_async_client():
+    url, kwargs = async_redis_kwargs()
+    pool_kwargs = settings.CACHES["default"].get("OPTIONS", {}).get("CONNECTION_POOL_KWARGS", {})
+    connection_class = pool_kwargs.get("connection_class")
+    if connection_class is not None and connection_class.__module__.startswith("fakeredis"):
+        # tests and benchmarks: the async client of the same in-memory server
+        import fakeredis.aioredis
+
+        return fakeredis.aioredis.FakeRedis(server=pool_kwargs.get("server"), db=parse_url(url).get("db", 0))
+    return redis.asyncio.Redis.from_url(url, **kwargs)
+
+
+async def _close_with_loop(client):
+    # asyncio.run, which asgiref uses for every async view served over WSGI,
+    # cancels leftover tasks before closing the loop
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await client.aclose()
+
+
+def async_redis():
+    """
+    Async Redis client for the running event loop, pointed at the cache's Redis.
+
+    Under ASGI there is one loop, and so one client, per process. A
+    per-request loop (an async view served over WSGI) closes its client's
+    connections as it shuts down.
+    """
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(loop)
+    if entry is None:
+        client = _new_async_client()
+        entry = _async_clients[loop] = (client, loop.create_task(_close_with_loop(client)))
+    return entry[0]
+
+
+class LocalCache:
+    """
+    Bounded, thread-safe LRU of decoded entries with a short TTL.
+    """
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            entry, expires = item
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (entry, time.monotonic() + self.timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def evict(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_cache = LocalCache(LOCAL_CACHE_MAX_ENTRIES, LOCAL_CACHE_TIMEOUT)
+
+# hit/miss counts per tier, e.g. stats[("local", "hit")]
+stats = Counter()
+
+_subscribed = False
+
+
+def record(tier, outcome, key):
+    stats[(tier, outcome)] += 1
+    metrics.CACHE_REQUESTS.labels(tier, metrics.key_family(key), outcome).inc()
+
+
+def cache_stats():
+    """
+    Return hit/miss counts and hit ratio for each tier in this process.
+    """
+    summary = {}
+    for tier in ("local", "redis"):
+        hits, misses = stats[(tier, "hit")], stats[(tier, "miss")]
+        total = hits + misses
+        summary[tier] = {"hits": hits, "misses": misses, "hit_ratio": hits / total if total else None}
+    return summary
+
+
+def _origin():
+    # computed per call so forked workers do not share an identity
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _on_invalidation(payload):
+    message = json.loads(payload)
+    if message["origin"] != _origin():  # our own evictions were applied when sent
+        local_cache.evict(message["keys"])
+
+
+def _ensure_subscribed():
+    global _subscribed
+    if not _subscribed and local_cache.max_entries > 0:
+        _subscribed = True
+        # a reconnect means invalidations may have been missed
+        pubsub.listener.subscribe(INVALIDATION_CHANNEL, _on_invalidation, on_reconnect=local_cache.clear)
+
+
+def _broadcast_eviction(keys):
+    """
+    Drop ``keys`` from this process's tier and, via pub/sub, every other's.
+    """
+    keys = list(keys)
+    local_cache.evict(keys)
+    pubsub.publish(INVALIDATION_CHANNEL, json.dumps({"origin": _origin(), "keys": keys}))
+
+
+def encode_entry(rendered, fresh_until, compute_seconds=0.0):
+    """
+    Pack rendered JSON bytes into a cache entry, compressing large bodies.
+    """
+    digest = hashlib.blake2b(rendered, digest_size=16).digest()
+    flags = 0
+    body = rendered
+    if len(rendered) >= COMPRESS_MIN_BYTES:
+        body = zlib.compress(rendered)
+        flags |= FLAG_COMPRESSED
+    return _header.pack(ENTRY_VERSION, flags, digest, fresh_until, compute_seconds) + body
+
+
+def decode_entry(raw):
+    """
+    Unpack a stored entry, or return None for missing or foreign values.
+    """
+    if not raw or len(raw) < _header.size:
+        return None
+    version, flags, digest, fresh_until, compute_seconds = _header.unpack_from(raw)
+    if version != ENTRY_VERSION:
+        return None
+    return CacheEntry(
+        f'"{digest.hex()}"', raw[_header.size:], bool(flags & FLAG_COMPRESSED), fresh_until, compute_seconds
+    )
+
+
+def get_entry(key, local=True):
+    """
+    Look an entry up in the local tier, then in Redis.
+
+    Args:
+        key (str): Cache key.
+        local (bool): Pass False to read Redis directly, e.g. to see
+            another worker's rebuild.
+    """
+    if local:
+        _ensure_subscribed()
+        entry = local_cache.get(key)
+        record("local", "hit" if entry is not None else "miss", key)
+        if entry is not None:
+            return entry
+
+    entry = decode_entry(_redis().get(cache.make_key(key)))
+    record("redis", "hit" if entry is not None else "miss", key)
+    if entry is not None:
+        local_cache.set(key, entry)
+    return entry
+
+
+def set_entry(key, rendered, timeout, stale_timeout=STALE_TIMEOUT, compute_seconds=0.0):
+    """
+    Store an entry that is fresh for ``timeout`` seconds and kept in Redis
+    for another ``stale_timeout`` seconds so it can be served while stale.
+    """
+    raw = encode_entry(rendered, time.time() + timeout, compute_seconds)
+    _redis().set(cache.make_key(key), raw, ex=timeout + stale_timeout)
+    _broadcast_eviction([key])  # other processes drop their previous copy
+    entry = decode_entry(raw)
+    local_cache.set(key, entry)
+    return entry
+
+
+def get_entries(keys):
+    """
+    Look many entries up with one pass over the local tier and a single
+    Redis MGET for the rest.
+
+    Returns:
+        dict: Key -> CacheEntry for the keys found.
+    """
+    _ensure_subscribed()
+    found = {}
+    missing = []
+    for key in keys:
+        entry = local_cache.get(key)
+        record("local", "hit" if entry is not None else "miss", key)
+        if entry is not None:
+            found[key] = entry
+        else:
+            missing.append(key)
+    if missing:
+        for key, raw in zip(missing, _redis().mget([cache.make_key(key) for key in missing])):
+            entry = decode_entry(raw)
+            record("redis", "hit" if entry is not None else "miss", key)
+            if entry is not None:
+                local_cache.set(key, entry)
+                found[key] = entry
+    return found
+
+
+def set_entries(rendered, timeout, stale_timeout=STALE_TIMEOUT, compute_seconds=0.0):
+    """
+    Store many entries in one pipelined round trip; see set_entry.
+
+    Args:
+        rendered (dict): Key -> rendered JSON bytes.
+
+    Returns:
+        dict: Key -> the stored CacheEntry.
+    """
+    if not rendered:
+        return {}
+    raw = {key: encode_entry(body, time.time() + timeout, compute_seconds) for key, body in rendered.items()}
+    pipe = _redis().pipeline(transaction=False)
+    for key, value in raw.items():
+        pipe.set(cache.make_key(key), value, ex=timeout + stale_timeout)
+    pipe.execute()
+    _broadcast_eviction(raw)
+    entries = {key: decode_entry(value) for key, value in raw.items()}
+    for key, entry in entries.items():
+        local_cache.set(key, entry)
+    return entries
+
+
+def entry_body(entry):
+    """
+    The entry's rendered JSON, decompressed.
+    """
+    return zlib.decompress(entry.body) if entry.compressed else entry.body
+
+
+def invalidate(*keys):
+    """
+    Mark entries stale without deleting them.
+
+    The next request rebuilds the entry under the lock while concurrent
+    requests keep getting the previous body, instead of all of them
+    missing at once as they would after cache.delete.
+    """
+    if keys:
+        _redis().eval(_invalidate_script, len(keys), *[cache.make_key(key) for key in keys],
+                      _FRESH_UNTIL_OFFSET, struct.pack('!d', 0.0))
+        _broadcast_eviction(keys)
+
+
+def delete(*keys):
+    """
+    Remove entries from Redis and from every process's local tier.
+    """
+    if keys:
+        cache.delete_many(keys)
+        _broadcast_eviction(keys)
+
+
+def needs_refresh(entry, now=None):
+    """
+    Decide whether to rebuild an entry, expiring it early at random.
+
+    Uses probabilistic early expiration ("XFetch"): the closer an entry
+    is to going stale and the longer it takes to rebuild, the more likely
+    a request is to refresh it ahead of time, so hot keys are usually
+    rebuilt by one request before they ever expire for everyone.
+    """
+    now = time.time() if now is None else now
+    jitter = -entry.compute_seconds * EARLY_EXPIRY_BETA * math.log(1.0 - random.random())
+    return now + jitter >= entry.fresh_until
+
+
+def _build_entry(key, build, timeout, stale_timeout):
+    started = time.perf_counter()
+    response = build()
+    if response.status_code != status.HTTP_200_OK:
+        return None, response
+    rendered = JSONRenderer().render(response.data)
+    entry = set_entry(key, rendered, timeout, stale_timeout, time.perf_counter() - started)
+    return entry, None
+
+
+def get_or_build(key, build, timeout=3600, stale_timeout=STALE_TIMEOUT):
+    """
+    Fetch an entry, rebuilding it at most once across all workers.
+
+    A fresh entry is returned as is. When the entry is stale or due for
+    early refresh, only the request that wins a Redis lock rebuilds it;
+    everyone else keeps serving the stale copy. On a cold miss the other
+    requests wait for the winner's result (up to LOCK_WAIT seconds) rather
+    than all querying the database.
+
+    Returns:
+        tuple: (CacheEntry, None), or (None, Response) when ``build``
+        produced a non-200 response, which is never cached.
+    """
+    entry = get_entry(key)
+    if entry is not None and not needs_refresh(entry):
+        return entry, None
+
+    lock = _redis().lock(f"{cache.make_key(key)}:lock", timeout=LOCK_TIMEOUT,
+                         blocking=entry is None, blocking_timeout=LOCK_WAIT)
+    if lock.acquire():
+        try:
+            current = get_entry(key, local=False)
+            # someone else rebuilt it while we were waiting for the lock
+            rebuilt = current is not None and (entry is None or current.fresh_until != entry.fresh_until)
+            if rebuilt and current.fresh_until > time.time():
+                return current, None
+            return _build_entry(key, build, timeout, stale_timeout)
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                pass  # held past LOCK_TIMEOUT; another worker may own it now
+
+    if entry is not None:
+        return entry, None  # serve stale while the lock holder refreshes
+    entry = get_entry(key, local=False)
+    if entry is not None:
+        return entry, None
+    # the rebuild is taking too long; answer this request without caching
+    response = build()
+    if response.status_code != status.HTTP_200_OK:
+        return None, response
+    return decode_entry(encode_entry(JSONRenderer().render(response.data), 0.0)), None
+
+
+async def aget_entry(key, local=True):
+    """
+    Async counterpart of get_entry, reading Redis with redis.asyncio.
+    """
+    if local:
+        if not _subscribed:
+            await sync_to_async(_ensure_subscribed)()
+        entry = local_cache.get(key)
+        record("local", "hit" if entry is not None else "miss", key)
+        if entry is not None:
+            return entry
+
+    entry = decode_entry(await async_redis().get(cache.make_key(key)))
+    record("redis", "hit" if entry is not None else "miss", key)
+    if entry is not None:
+        local_cache.set(key, entry)
+    return entry
+
+
+async def aset_entry(key, rendered, timeout, stale_timeout=STALE_TIMEOUT, compute_seconds=0.0):
+    raw = encode_entry(rendered, time.time() + timeout, compute_seconds)
+    client = async_redis()
+    await client.set(cache.make_key(key), raw, ex=timeout + stale_timeout)
+    local_cache.evict([key])
+    await client.publish(INVALIDATION_CHANNEL, json.dumps({"origin": _origin(), "keys": [key]}))
+    entry = decode_entry(raw)
+    local_cache.set(key, entry)
+    return entry
+
+
+async def aget_or_build(key, build, timeout=3600, stale_timeout=STALE_TIMEOUT):
+    """
+    Async counterpart of get_or_build with the same single-flight rules.
+
+    ``build`` is a coroutine function returning JSON-ready data, or None
+    when there is nothing to cache (e.g. not found).
+
+    Returns:
+        CacheEntry or None.
+    """
+    entry = await aget_entry(key)
+    if entry is not None and not needs_refresh(entry):
+        return entry
+
+    async def rebuild():
+        started = time.perf_counter()
+        data = await build()
+        if data is None:
+            return None
+        return await aset_entry(key, JSONRenderer().render(data), timeout, stale_timeout,
+                                time.perf_counter() - started)
+
+    lock = async_redis().lock(f"{cache.make_key(key)}:lock", timeout=LOCK_TIMEOUT,
+                               blocking=entry is None, blocking_timeout=LOCK_WAIT)
+    if await lock.acquire():
+        try:
+            current = await aget_entry(key, local=False)
+            rebuilt = current is not None and (entry is None or current.fresh_until != entry.fresh_until)
+            if rebuilt and current.fresh_until > time.time():
+                return current
+            return await rebuild()
+        finally:
+            try:
+                await lock.release()
+            except LockError:
+                pass
+
+    if entry is not None:
+        return entry
+    entry = await aget_entry(key, local=False)
+    if entry is not None:
+        return entry
+    data = await build()
+    return None if data is None else decode_entry(encode_entry(JSONRenderer().render(data), 0.0))
+
+
+def entry_response(request, entry):
+    """
+    Plain Django response for a cache entry, honouring If-None-Match and
+    Accept-Encoding the same way cached_response does.
+    """
+    if _not_modified(request, entry):
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    elif entry.compressed and 'deflate' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        response = HttpResponse(entry.body, content_type='application/json')
+        response['Content-Encoding'] = 'deflate'
+    else:
+        response = HttpResponse(entry_body(entry), content_type='application/json')
+    response['ETag'] = entry.etag
+    response['Vary'] = 'Accept-Encoding'
+    return response
+
+
+class RenderedResponse(Response):
+    """
+    Response whose JSON body was rendered ahead of time.
+
+    The body is sent as stored (deflate-encoded when the entry is
+    compressed and the client accepts it), so a cache hit skips both
+    json.loads and DRF rendering. ``data`` is only decoded if something
+    actually reads it, e.g. tests.
+    """
+
+    def __init__(self, entry, request, status=status.HTTP_200_OK):
+        self.entry = entry
+        self._data = None
+        super().__init__(None, status=status, headers={'ETag': entry.etag})
+        self.send_compressed = entry.compressed and 'deflate' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        self['Vary'] = 'Accept-Encoding'
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = json.loads(self.plain_body())
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+    def plain_body(self):
+        return entry_body(self.entry)
+
+    @property
+    def rendered_content(self):
+        self['Content-Type'] = 'application/json'
+        if self.send_compressed:
+            self['Content-Encoding'] = 'deflate'
+            return self.entry.body
+        return self.plain_body()
+
+
+def _not_modified(request, entry):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+    return entry.etag in (tag.strip() for tag in if_none_match.split(','))
+
+
+def cached_response(request, key, build, timeout=3600, stale_timeout=STALE_TIMEOUT):
+    """
+    Serve a JSON endpoint from pre-rendered cache entries.
+
+    On a miss, ``build()`` is called and must return a DRF Response. Only
+    200 responses are rendered, stored under ``key`` and served from the
+    cache; anything else (e.g. a 404) is passed through uncached. Clients
+    sending a matching If-None-Match get an empty 304. See get_or_build
+    for how concurrent misses are collapsed into one rebuild.
+
+    Args:
+        request (Request): The current request.
+        key (str): Cache key, e.g. "stock_AAPL".
+        build (callable): Produces the response on a miss.
+        timeout (int): Seconds the entry is fresh.
+        stale_timeout (int): Further seconds it may be served while being rebuilt.
+    """
+    entry, response = get_or_build(key, build, timeout, stale_timeout)
+    if entry is None:
+        return response
+
+    if _not_modified(request, entry):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': entry.etag})
+    return RenderedResponse(entry, request)
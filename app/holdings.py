@@ -0,0 +1,113 @@
+from decimal import Decimal
+
+import numpy as np
+
+from .models import Holding, LatestQuote
+
+COST_PRECISION = Decimal('0.0001')
+
+
+def apply_fill(quantity, cost_basis, volume, amount):
+    """
+    Apply a fill to a position using the average-cost method.
+
+    Args:
+        quantity (int): Current signed position size.
+        cost_basis (Decimal): Current signed total cost of the position.
+        volume (int): Signed fill size (positive buys, negative sells).
+        amount (Decimal): Total price of the fill.
+
+    Returns:
+        tuple: (new quantity, new cost basis).
+    """
+    unit_price = amount / abs(volume)
+    if quantity == 0 or (quantity > 0) == (volume > 0):
+        # opening or adding to a position
+        return quantity + volume, (cost_basis + unit_price * volume).quantize(COST_PRECISION)
+
+    new_quantity = quantity + volume
+    if abs(volume) <= abs(quantity):
+        # reducing: the remainder keeps its average cost
+        return new_quantity, (cost_basis * new_quantity / quantity).quantize(COST_PRECISION)
+    # flipping through zero: the excess opens a new position at the fill price
+    return new_quantity, (unit_price * new_quantity).quantize(COST_PRECISION)
+
+
+def signed_volume(transaction_type, volume):
+    return volume if transaction_type == 'BUY' else -volume
+
+
+def update_holding(user_id, ticker, transaction_type, volume, amount):
+    """
+    Apply one completed transaction to the user's holding. Must run inside
+    the transaction that records the fill.
+    """
+    holding, _ = Holding.objects.select_for_update().get_or_create(user_id=user_id, ticker=ticker)
+    holding.quantity, holding.cost_basis = apply_fill(
+        holding.quantity, holding.cost_basis, signed_volume(transaction_type, volume), amount
+    )
+    holding.save(update_fields=['quantity', 'cost_basis', 'updated_at'])
+
+
+def latest_prices(tickers):
+    """
+    Current close price per ticker, from the latest-quote table.
+    """
+    return dict(LatestQuote.objects.filter(ticker__in=tickers).values_list('ticker', 'close_price'))
+
+
+def value_portfolio(user):
+    """
+    Value a user's open positions against the latest prices.
+
+    Work is one holdings query, one price query and a vectorized NumPy
+    pass, so the cost depends on the number of positions, not on the
+    length of the user's transaction history.
+
+    Returns:
+        dict: Per-position rows plus portfolio totals.
+    """
+    rows = list(
+        Holding.objects.filter(user=user).exclude(quantity=0)
+        .order_by('ticker').values_list('ticker', 'quantity', 'cost_basis')
+    )
+    if not rows:
+        return {"positions": [], "market_value": "0.00", "cost_basis": "0.00", "unrealized_pnl": "0.00"}
+
+    tickers, quantities, costs = zip(*rows)
+    prices = latest_prices(tickers)
+    quantity = np.array(quantities, dtype=np.float64)
+    cost = np.array(costs, dtype=np.float64)
+    price = np.array([prices.get(ticker, np.nan) for ticker in tickers], dtype=np.float64)
+
+    market_value = quantity * price
+    pnl = market_value - cost
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pnl_pct = np.where(cost != 0, pnl / np.abs(cost) * 100, np.nan)
+    priced = ~np.isnan(price)
+
+    def money(value):
+        return None if np.isnan(value) else f"{value:.2f}"
+
+    positions = [
+        {
+            "ticker": ticker,
+            "quantity": int(qty),
+            "average_cost": money(c / qty),
+            "cost_basis": money(c),
+            "price": money(p),
+            "market_value": money(mv),
+            "unrealized_pnl": money(pl),
+            "unrealized_pnl_pct": None if np.isnan(pct) else round(pct, 2),
+        }
+        for ticker, qty, c, p, mv, pl, pct in zip(
+            tickers, quantity.tolist(), cost.tolist(), price.tolist(),
+            market_value.tolist(), pnl.tolist(), pnl_pct.tolist()
+        )
+    ]
+    return {
+        "positions": positions,
+        "market_value": money(market_value[priced].sum()),
+        "cost_basis": money(cost[priced].sum()),
+        "unrealized_pnl": money(pnl[priced].sum()),
+    }
@@ -0,0 +1,452 @@
+"""
+Technical indicators over a ticker's bars, with incremental updates.
+
+Each indicator is computed for the whole history with vectorized NumPy the
+first time it is requested for a (ticker, indicator, window). The result is
+cached in Redis as three keys:
+
+    <key>:ts      int64 bar timestamps (epoch seconds), appended to
+    <key>:values  float64 values, one row of ``fields`` per bar, appended to
+    <key>:state   JSON with what the next step needs (the last ``window``
+                  closes, a running average, ...)
+
+When bars are ingested, each cached series for the ticker is advanced one
+bar at a time from its state and the new points are APPENDed. The cost
+depends on the window, never on the length of the history. A bar that is
+not newer than the last one processed invalidates the ticker's series,
+which are recomputed on the next request.
+"""
+import json
+import logging
+import math
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from redis.exceptions import LockError, RedisError
+
+from .prices import to_epoch
+from .timeseries import load_bars
+
+logger = logging.getLogger(__name__)
+
+# cached series expire this many seconds after their last update
+INDICATOR_CACHE_TIMEOUT = getattr(settings, 'INDICATOR_CACHE_TIMEOUT', 86400)
+
+LOCK_TIMEOUT = 30
+
+# rows per block in the closed-form exponential smoothing; decay**-BLOCK must
+# stay within float range for every alpha used (alpha <= 2/3)
+SMOOTHING_BLOCK = 128
+
+BOLLINGER_WIDTH = 2
+
+
+def smooth(values, alpha, initial):
+    """
+    Exponential smoothing ``y[i] = y[i-1] + alpha * (values[i] - y[i-1])``
+    with ``y[-1] = initial``, vectorized block by block.
+
+    Within a block ``y[t] = decay**t * y[-1] + alpha * decay**t * sum(values[k] * decay**-k)``,
+    which is a cumulative sum; each block starts from the previous one's last value.
+    """
+    out = np.empty(len(values))
+    decay = 1.0 - alpha
+    previous = initial
+    for start in range(0, len(values), SMOOTHING_BLOCK):
+        block = values[start:start + SMOOTHING_BLOCK]
+        powers = decay ** np.arange(1, len(block) + 1)
+        out[start:start + len(block)] = alpha * powers * np.cumsum(block / powers) + powers * previous
+        previous = out[start + len(block) - 1]
+    return out
+
+
+def rolling_sum(values, window):
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        sums = np.cumsum(np.r_[0.0, values])
+        out[window - 1:] = sums[window:] - sums[:-window]
+    return out
+
+
+def typical_price(high, low, close):
+    return (high + low + close) / 3
+
+
+class Indicator(ABC):
+    """
+    One indicator: a vectorized ``compute`` over full history, and a
+    ``step`` that advances the saved state by one bar.
+    """
+    fields = ('value',)
+
+    @abstractmethod
+    def compute(self, bars, window):
+        """
+        Returns:
+            tuple: (values array of shape (bars, len(fields)), state dict).
+        """
+
+    @abstractmethod
+    def step(self, state, bar, window):
+        """
+        Advance ``state`` in place by one (timestamp, open, high, low, close,
+        volume) bar and return that bar's values.
+        """
+
+    @staticmethod
+    def recent(bars, window, *columns):
+        return {column: bars[column][-window:].tolist() for column in columns}
+
+    @staticmethod
+    def push(state, column, value, window):
+        state[column].append(value)
+        del state[column][:-window]
+
+
+class SMA(Indicator):
+    def compute(self, bars, window):
+        values = rolling_sum(bars['close_price'], window) / window
+        return values[:, None], self.recent(bars, window, 'close_price')
+
+    def step(self, state, bar, window):
+        self.push(state, 'close_price', bar[4], window)
+        closes = state['close_price']
+        return (math.fsum(closes) / window if len(closes) == window else math.nan,)
+
+
+class EMA(Indicator):
+    def compute(self, bars, window):
+        closes = bars['close_price']
+        if len(closes) == 0:
+            return np.empty((0, 1)), {'count': 0, 'ema': None}
+        # seeded with the first close (no bias adjustment); the first window - 1 values are warm-up
+        values = np.r_[closes[0], smooth(closes[1:], 2 / (window + 1), closes[0])]
+        state = {'count': len(closes), 'ema': float(values[-1])}
+        values[:window - 1] = np.nan
+        return values[:, None], state
+
+    def step(self, state, bar, window):
+        close = bar[4]
+        state['ema'] = close if state['ema'] is None else state['ema'] + 2 / (window + 1) * (close - state['ema'])
+        state['count'] += 1
+        return (state['ema'] if state['count'] >= window else math.nan,)
+
+
+class VWAP(Indicator):
+    """
+    Volume-weighted average of the typical price over the last ``window`` bars.
+    """
+
+    def compute(self, bars, window):
+        weighted = typical_price(bars['high'], bars['low'], bars['close_price']) * bars['volume']
+        volume = rolling_sum(bars['volume'].astype(np.float64), window)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.where(volume > 0, rolling_sum(weighted, window) / volume, np.nan)
+        state = {'weighted': weighted[-window:].tolist(), 'volume': bars['volume'][-window:].tolist()}
+        return values[:, None], state
+
+    def step(self, state, bar, window):
+        self.push(state, 'weighted', (bar[2] + bar[3] + bar[4]) / 3 * bar[5], window)
+        self.push(state, 'volume', bar[5], window)
+        volume = sum(state['volume'])
+        if len(state['volume']) < window or volume <= 0:
+            return (math.nan,)
+        return (math.fsum(state['weighted']) / volume,)
+
+
+class RSI(Indicator):
+    """
+    Wilder's relative strength index: average gains and losses are seeded
+    with the mean of the first ``window`` changes, then smoothed with
+    alpha = 1 / window.
+    """
+
+    @staticmethod
+    def index(gain, loss):
+        if loss == 0:
+            return 100.0 if gain > 0 else 50.0
+        return 100 - 100 / (1 + gain / loss)
+
+    def compute(self, bars, window):
+        closes = bars['close_price']
+        values = np.full(len(closes), np.nan)
+        changes = np.diff(closes)
+        gains, losses = np.maximum(changes, 0), np.maximum(-changes, 0)
+        state = {'close': float(closes[-1]) if len(closes) else None, 'count': len(changes),
+                 'gains': [], 'losses': [], 'gain': None, 'loss': None}
+        if len(changes) < window:
+            state.update(gains=gains.tolist(), losses=losses.tolist())
+            return values[:, None], state
+
+        gain = np.r_[gains[:window].mean(), smooth(gains[window:], 1 / window, gains[:window].mean())]
+        loss = np.r_[losses[:window].mean(), smooth(losses[window:], 1 / window, losses[:window].mean())]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            index = np.where(loss == 0, np.where(gain > 0, 100.0, 50.0), 100 - 100 / (1 + gain / loss))
+        values[window:] = index
+        state.update(gain=float(gain[-1]), loss=float(loss[-1]))
+        return values[:, None], state
+
+    def step(self, state, bar, window):
+        close, previous = bar[4], state['close']
+        state['close'] = close
+        if previous is None:
+            return (math.nan,)
+        change = close - previous
+        state['count'] += 1
+        if state['gain'] is None:
+            state['gains'].append(max(change, 0))
+            state['losses'].append(max(-change, 0))
+            if state['count'] < window:
+                return (math.nan,)
+            state['gain'] = math.fsum(state['gains']) / window
+            state['loss'] = math.fsum(state['losses']) / window
+            state['gains'], state['losses'] = [], []
+        else:
+            state['gain'] += (max(change, 0) - state['gain']) / window
+            state['loss'] += (max(-change, 0) - state['loss']) / window
+        return (self.index(state['gain'], state['loss']),)
+
+
+class BollingerBands(Indicator):
+    """
+    SMA of the closes plus and minus BOLLINGER_WIDTH population standard deviations.
+    """
+    fields = ('middle', 'upper', 'lower')
+
+    def compute(self, bars, window):
+        closes = bars['close_price']
+        # shifted by the first close so the sum of squares keeps its precision
+        shifted = closes - closes[0] if len(closes) else closes
+        mean = rolling_sum(shifted, window) / window
+        variance = np.maximum(rolling_sum(shifted * shifted, window) / window - mean * mean, 0)
+        middle = mean + (closes[0] if len(closes) else 0)
+        width = BOLLINGER_WIDTH * np.sqrt(variance)
+        return np.column_stack([middle, middle + width, middle - width]), self.recent(bars, window, 'close_price')
+
+    def step(self, state, bar, window):
+        self.push(state, 'close_price', bar[4], window)
+        if len(state['close_price']) < window:
+            return (math.nan,) * 3
+        closes = np.array(state['close_price'])
+        middle, width = closes.mean(), BOLLINGER_WIDTH * closes.std()
+        return (middle, middle + width, middle - width)
+
+
+INDICATORS = {
+    'sma': SMA(),
+    'ema': EMA(),
+    'vwap': VWAP(),
+    'rsi': RSI(),
+    'bbands': BollingerBands(),
+}
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+def _key(ticker, name, window):
+    return cache.make_key(f"indicator_{ticker}_{name}_{window}")
+
+
+def _index_key(ticker):
+    # every (indicator, window) cached for the ticker, so ingest knows what to advance
+    return cache.make_key(f"indicators_{ticker}")
+
+
+def _store(client, ticker, name, window, timestamps, values, state):
+    key = _key(ticker, name, window)
+    pipe = client.pipeline()
+    pipe.set(f"{key}:ts", np.ascontiguousarray(timestamps, dtype=np.int64).tobytes(), ex=INDICATOR_CACHE_TIMEOUT)
+    pipe.set(f"{key}:values", np.ascontiguousarray(values, dtype=np.float64).tobytes(), ex=INDICATOR_CACHE_TIMEOUT)
+    pipe.set(f"{key}:state", json.dumps(state), ex=INDICATOR_CACHE_TIMEOUT)
+    pipe.sadd(_index_key(ticker), f"{name}:{window}")
+    pipe.expire(_index_key(ticker), INDICATOR_CACHE_TIMEOUT)
+    pipe.execute()
+
+
+def _read(client, key, width, start=None, end=None, limit=None):
+    """
+    The cached points with ``start <= timestamp < end``, newest ``limit``
+    only, or None if the series is not cached.
+
+    Without time bounds only the tail of each array is fetched with
+    GETRANGE. With bounds the timestamps are read to locate the range and
+    only the matching rows of values follow; appends never move existing
+    rows, so the offsets stay valid between the two reads.
+    """
+    row = width * 8
+    pipe = client.pipeline()
+    pipe.exists(f"{key}:state")
+    if start is None and end is None:
+        if limit is None:
+            pipe.get(f"{key}:ts")
+            pipe.get(f"{key}:values")
+        else:
+            pipe.getrange(f"{key}:ts", -limit * 8, -1)
+            pipe.getrange(f"{key}:values", -limit * row, -1)
+        cached, raw_ts, raw_values = pipe.execute()
+        if not cached or not raw_ts or len(raw_values or b'') != len(raw_ts) // 8 * row:
+            return None
+        return np.frombuffer(raw_ts, dtype=np.int64), np.frombuffer(raw_values, dtype=np.float64).reshape(-1, width)
+
+    pipe.get(f"{key}:ts")
+    cached, raw_ts = pipe.execute()
+    if not cached or not raw_ts:
+        return None
+    timestamps = np.frombuffer(raw_ts, dtype=np.int64)
+    first, last = _bounds(timestamps, start, end, limit)
+    if first == last:
+        return timestamps[:0], np.empty((0, width))
+    raw_values = client.getrange(f"{key}:values", first * row, last * row - 1)
+    if len(raw_values) != (last - first) * row:
+        return None  # invalidated in between
+    return timestamps[first:last], np.frombuffer(raw_values, dtype=np.float64).reshape(-1, width)
+
+
+def _bounds(timestamps, start, end, limit):
+    first = int(timestamps.searchsorted(to_epoch(start))) if start is not None else 0
+    last = int(timestamps.searchsorted(to_epoch(end))) if end is not None else len(timestamps)
+    if limit is not None:
+        first = max(first, last - limit)
+    return first, min(max(first, last), len(timestamps))
+
+
+@contextmanager
+def _locked(client, key):
+    lock = client.lock(f"{key}:lock", timeout=LOCK_TIMEOUT, blocking_timeout=LOCK_TIMEOUT)
+    acquired = lock.acquire()
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            try:
+                lock.release()
+            except LockError:
+                pass  # held past LOCK_TIMEOUT
+
+
+def get_series(ticker, name, window, load=load_bars, start=None, end=None, limit=None):
+    """
+    An indicator's points for a ticker, from Redis when cached, otherwise
+    computed over the full history (at most once across workers) and cached.
+
+    Args:
+        load (callable): ``load(ticker)`` returning the bars to compute from on a miss.
+        start, end (datetime): Only points with ``start <= timestamp < end``.
+        limit (int): Only the newest ``limit`` of those points.
+
+    Returns:
+        tuple: (timestamps int64 array, values array of shape (n, len(fields))),
+        or None if the ticker has no bars.
+    """
+    indicator = INDICATORS[name]
+    width = len(indicator.fields)
+    client = _redis()
+    key = _key(ticker, name, window)
+    cached = _read(client, key, width, start, end, limit)
+    if cached is not None:
+        return cached
+
+    with _locked(client, key):
+        cached = _read(client, key, width, start, end, limit)
+        if cached is not None:
+            return cached  # computed while we waited
+        # registered before reading bars: an ingest committing meanwhile then
+        # waits for this lock and appends its bars, rather than skipping the series
+        client.sadd(_index_key(ticker), f"{name}:{window}")
+        bars = load(ticker)
+        if len(bars['timestamp']) == 0:
+            return None
+        values, state = indicator.compute(bars, window)
+        state['timestamp'] = int(bars['timestamp'][-1])
+        _store(client, ticker, name, window, bars['timestamp'], values, state)
+        timestamps = np.asarray(bars['timestamp'])
+        first, last = _bounds(timestamps, start, end, limit)
+        return timestamps[first:last], values[first:last]
+
+
+def invalidate(client, ticker):
+    """
+    Drop every cached series for a ticker.
+    """
+    members = client.smembers(_index_key(ticker))
+    keys = [_index_key(ticker)]
+    for member in members:
+        name, window = member.decode().split(':')
+        key = _key(ticker, name, int(window))
+        keys += [f"{key}:ts", f"{key}:values", f"{key}:state"]
+    client.delete(*keys)
+
+
+def update(bars):
+    """
+    Advance every cached series of the tickers in ``bars`` by their new bars.
+    """
+    by_ticker = {}
+    for bar in bars:
+        by_ticker.setdefault(bar.ticker, []).append((
+            to_epoch(bar.timestamp), float(bar.open_price), float(bar.high),
+            float(bar.low), float(bar.close_price), float(bar.volume),
+        ))
+    for ticker, rows in by_ticker.items():
+        rows.sort(key=lambda row: row[0])
+        try:
+            # inside the guard: this runs after the ingest committed, so an
+            # outage must not turn the write into an error response
+            client = _redis()
+            for member in client.smembers(_index_key(ticker)):
+                name, window = member.decode().split(':')
+                if not _advance(client, ticker, name, int(window), rows):
+                    invalidate(client, ticker)
+                    break
+        except RedisError:
+            logger.warning("Could not update cached indicators for %s", ticker, exc_info=True)
+
+
+def _advance(client, ticker, name, window, rows):
+    """
+    Returns:
+        bool: False if the rows cannot be applied in order.
+    """
+    indicator = INDICATORS[name]
+    key = _key(ticker, name, window)
+    with _locked(client, key) as acquired:
+        if not acquired:
+            return False
+        raw_state = client.get(f"{key}:state")
+        if raw_state is None:
+            return True  # expired; recomputed on the next request
+        state = json.loads(raw_state)
+        points = []
+        for row in rows:
+            if state['timestamp'] is not None and row[0] <= state['timestamp']:
+                return False  # late or already counted
+            points.append(indicator.step(state, row, window))
+            state['timestamp'] = row[0]
+        pipe = client.pipeline()
+        pipe.append(f"{key}:ts", np.array([row[0] for row in rows], dtype=np.int64).tobytes())
+        pipe.append(f"{key}:values", np.array(points, dtype=np.float64).tobytes())
+        pipe.set(f"{key}:state", json.dumps(state), ex=INDICATOR_CACHE_TIMEOUT)
+        pipe.expire(f"{key}:ts", INDICATOR_CACHE_TIMEOUT)
+        pipe.expire(f"{key}:values", INDICATOR_CACHE_TIMEOUT)
+        pipe.execute()
+    return True
+
+
+def series_records(name, timestamps, values):
+    """
+    JSON-ready points; warm-up values are null.
+    """
+    fields = INDICATORS[name].fields
+    times = timestamps.astype('datetime64[s]').tolist()
+    return [
+        dict(timestamp=ts.isoformat() + 'Z', **{
+            field: None if math.isnan(value) else round(value, 4) for field, value in zip(fields, row)
+        })
+        for ts, row in zip(times, values.tolist())
+    ]
@@ -0,0 +1,260 @@
+import csv
+import io
+import json
+import time
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction as db_transaction
+from django.db.models import IntegerField
+from django.utils import timezone
+
+from .models import StockData
+from .signals import bars_ingested
+
+# columns every bar must provide, in the order used for COPY
+BAR_FIELDS = ['ticker', 'open_price', 'close_price', 'high', 'low', 'volume', 'timestamp']
+
+DEFAULT_BATCH_SIZE = getattr(settings, 'INGEST_BATCH_SIZE', 5000)
+
+# size of the raw byte chunks read from an upload or file
+READ_CHUNK_SIZE = 64 * 1024
+
+# only the first few rejected rows are echoed back in the report
+MAX_REPORTED_ERRORS = 50
+
+
+class IngestReport:
+    """
+    Running totals for a bulk ingestion run.
+    """
+
+    def __init__(self):
+        self.received = 0
+        self.inserted = 0
+        self.rejected = 0
+        self.batches = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    def reject(self, line, errors):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "errors": errors})
+
+    def as_dict(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            "received": self.received,
+            "inserted": self.inserted,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(self.inserted / elapsed, 1) if elapsed > 0 else None,
+            "errors": self.errors,
+        }
+
+
+def iter_lines(chunks, encoding='utf-8'):
+    """
+    Turn an iterable of byte chunks into decoded text lines without
+    reading the whole payload into memory.
+
+    Bytes that are not valid in ``encoding`` are kept as lone surrogates
+    (``surrogateescape``) so the rows holding them are rejected by
+    validate_row instead of failing the whole upload.
+    """
+    pending = b''
+    for chunk in chunks:
+        if not chunk:
+            continue
+        pending += chunk
+        lines = pending.split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line.rstrip(b'\r').decode(encoding, 'surrogateescape')
+    if pending:
+        yield pending.rstrip(b'\r').decode(encoding, 'surrogateescape')
+
+
+def iter_chunks(stream, chunk_size=READ_CHUNK_SIZE):
+    """
+    Read a binary file-like object in fixed-size chunks.
+    """
+    return iter(lambda: stream.read(chunk_size), b'')
+
+
+def parse_csv(lines):
+    """
+    Yield (line_number, row_dict) pairs from CSV text lines with a header row.
+    """
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def parse_ndjson(lines):
+    """
+    Yield (line_number, row_dict) pairs from newline-delimited JSON text lines.
+    Lines that are not JSON objects are yielded as None so they get rejected.
+    """
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else None
+
+
+PARSERS = {
+    'csv': parse_csv,
+    'ndjson': parse_ndjson,
+}
+
+
+def detect_format(name='', content_type=''):
+    """
+    Guess the upload format from a file name or content type, defaulting to CSV.
+    """
+    name = (name or '').lower()
+    content_type = (content_type or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'ndjson'
+    return 'csv'
+
+
+_model_fields = {name: StockData._meta.get_field(name) for name in BAR_FIELDS}
+
+
+def validate_row(row):
+    """
+    Validate a single parsed row against the StockData model fields.
+
+    Returns:
+        tuple: (StockData instance, None) or (None, dict of field errors).
+    """
+    if row is None:
+        return None, {"row": ["Malformed row."]}
+
+    values = {}
+    errors = {}
+    for name, field in _model_fields.items():
+        raw = row.get(name)
+        if raw is None or raw == '':
+            errors[name] = ["This field is required."]
+            continue
+        if isinstance(raw, str) and not raw.isascii():
+            try:
+                raw.encode('utf-8')
+            except UnicodeEncodeError:
+                errors[name] = ["Not valid UTF-8 text."]
+                continue
+        if isinstance(raw, float) and isinstance(field, IntegerField) and not raw.is_integer():
+            # int() would silently truncate it
+            errors[name] = [str(field.error_messages['invalid'] % {'value': raw})]
+            continue
+        try:
+            values[name] = field.clean(raw, None)
+        except ValidationError as e:
+            errors[name] = e.messages
+        except (TypeError, ValueError):
+            # JSON values of the wrong type, e.g. a numeric timestamp
+            errors[name] = [str(field.error_messages.get('invalid', "Invalid value.") % {'value': raw})]
+
+    if errors:
+        return None, errors
+
+    if timezone.is_naive(values['timestamp']):
+        values['timestamp'] = timezone.make_aware(values['timestamp'], dt_timezone.utc)
+    return StockData(**values), None
+
+
+def validate_batch(rows, report):
+    """
+    Validate a batch of (line_number, row) pairs, recording rejects on the report.
+    """
+    bars = []
+    for line_number, row in rows:
+        bar, errors = validate_row(row)
+        if errors:
+            report.reject(line_number, errors)
+        else:
+            bars.append(bar)
+    return bars
+
+
+def _copy_bars(bars):
+    """
+    Write bars with PostgreSQL COPY, which skips per-row INSERT overhead.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for bar in bars:
+        writer.writerow([getattr(bar, name).isoformat() if name == 'timestamp' else getattr(bar, name)
+                         for name in BAR_FIELDS])
+    buffer.seek(0)
+
+    table = connection.ops.quote_name(StockData._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(name) for name in BAR_FIELDS)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def write_bars(bars, use_copy=None):
+    """
+    Persist a validated batch of bars and notify bars_ingested listeners once.
+    """
+    if not bars:
+        return
+    if use_copy is None:
+        use_copy = connection.vendor == 'postgresql'
+
+    with db_transaction.atomic():
+        if use_copy:
+            _copy_bars(bars)
+        else:
+            StockData.objects.bulk_create(bars, batch_size=1000)
+        bars_ingested.send(sender=StockData, bars=bars)
+
+
+def ingest(rows, batch_size=DEFAULT_BATCH_SIZE, use_copy=None):
+    """
+    Validate and store a stream of parsed rows in batches.
+
+    Args:
+        rows (iterable): (line_number, row_dict) pairs, e.g. from parse_csv.
+        batch_size (int): Number of rows validated and written together.
+        use_copy (bool): Force COPY on or off; defaults to COPY on PostgreSQL.
+
+    Returns:
+        IngestReport: Counts, timing and the first rejected rows.
+    """
+    report = IngestReport()
+    batch = []
+    for item in rows:
+        report.received += 1
+        batch.append(item)
+        if len(batch) >= batch_size:
+            _flush(batch, report, use_copy)
+            batch = []
+    if batch:
+        _flush(batch, report, use_copy)
+    return report
+
+
+def _flush(batch, report, use_copy):
+    bars = validate_batch(batch, report)
+    write_bars(bars, use_copy=use_copy)
+    report.inserted += len(bars)
+    report.batches += 1
+
+
+def ingest_stream(chunks, data_format='csv', batch_size=DEFAULT_BATCH_SIZE, use_copy=None):
+    """
+    Parse and ingest an iterable of raw byte chunks in the given format.
+    """
+    parser = PARSERS[data_format]
+    return ingest(parser(iter_lines(chunks)), batch_size=batch_size, use_copy=use_copy)
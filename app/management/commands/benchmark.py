@@ -0,0 +1,77 @@
+import json
+import platform
+from datetime import datetime, timezone as dt_timezone
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from app.benchmarks import Bench, compare, reset_caches, seed
+
+
+class Command(BaseCommand):
+    help = ("Seed synthetic data and measure latency percentiles and throughput of every API "
+            "endpoint and of transaction processing. Run with StockFlow.bench_settings.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--tickers', type=int, default=50)
+        parser.add_argument('--bars', type=int, default=100_000)
+        parser.add_argument('--transactions', type=int, default=100_000)
+        parser.add_argument('--no-seed', action='store_true',
+                            help="Reuse the data left by a previous run")
+        parser.add_argument('--iterations', type=int, default=200,
+                            help="Timed runs per case")
+        parser.add_argument('--case', action='append', dest='cases',
+                            help="Only run cases matching this pattern (e.g. 'stocks.*'); repeatable")
+        parser.add_argument('--random-seed', type=int, default=0)
+        parser.add_argument('--output', help="Write the JSON results to this file instead of stdout")
+        parser.add_argument('--compare', help="Previous results file to report changes against")
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'BENCHMARK', False):
+            raise CommandError("benchmark wipes the database; run it with DJANGO_SETTINGS_MODULE=StockFlow.bench_settings.")
+        if options['iterations'] <= 0:
+            raise CommandError("--iterations must be positive.")
+
+        call_command('migrate', verbosity=0)
+        if options['no_seed']:
+            reset_caches()
+            seeded = None
+        else:
+            self.stderr.write("Seeding...")
+            seeded = seed(options['users'], options['tickers'], options['bars'],
+                          options['transactions'], options['random_seed'])
+
+        try:
+            bench = Bench(options['random_seed'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stderr.write("Running cases...")
+        results = bench.run(options['iterations'], options['cases'])
+
+        report = {
+            "meta": {
+                "started_at": datetime.now(dt_timezone.utc).isoformat(),
+                "database": connection.vendor,
+                "redis": "real" if getattr(settings, 'BENCH_REDIS_URL', None) else "fake",
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "iterations": options['iterations'],
+                "seed": seeded,
+            },
+            "results": results,
+        }
+        if options['compare']:
+            with open(options['compare']) as f:
+                report["changes"] = compare(json.load(f)["results"], results)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stderr.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,46 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.ingest import DEFAULT_BATCH_SIZE, PARSERS, detect_format, ingest_stream, iter_chunks
+
+
+class Command(BaseCommand):
+    help = "Bulk load OHLCV bars from a CSV or NDJSON file ('-' reads stdin)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to load, or '-' for stdin")
+        parser.add_argument('--format', dest='data_format', choices=sorted(PARSERS),
+                            help="Input format (defaults to the file extension, then csv)")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help="Rows validated and written per batch")
+        parser.add_argument('--no-copy', action='store_true',
+                            help="Use bulk_create even on PostgreSQL")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if options['batch_size'] <= 0:
+            raise CommandError("--batch-size must be a positive integer.")
+        data_format = options['data_format'] or detect_format(name=path)
+        use_copy = False if options['no_copy'] else None
+
+        try:
+            stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        except OSError as e:
+            raise CommandError(f"Cannot open {path}: {e}")
+
+        try:
+            report = ingest_stream(iter_chunks(stream), data_format,
+                                   batch_size=options['batch_size'], use_copy=use_copy)
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+
+        summary = report.as_dict()
+        for error in summary['errors']:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Inserted {summary['inserted']} of {summary['received']} rows "
+            f"({summary['rejected']} rejected) in {summary['seconds']}s "
+            f"- {summary['rows_per_second']} rows/s"
+        ))
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+
+async def _request(reader, writer, host, path):
+    """
+    Send one keep-alive GET and read the response.
+
+    Returns:
+        int: The HTTP status code.
+    """
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\n\r\n".encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Server closed the connection")
+    status = int(status_line.split()[1])
+
+    length = None
+    chunked = False
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name = name.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "transfer-encoding" and "chunked" in value.lower():
+            chunked = True
+
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    return status
+
+
+async def _worker(url, paths, deadline, latencies, errors):
+    parts = urlsplit(url)
+    port = parts.port or 80
+    reader = writer = None
+    index = 0
+    while time.perf_counter() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(parts.hostname, port)
+            status = await _request(reader, writer, parts.netloc, parts.path.rstrip("/") + path)
+        except (OSError, ConnectionError, ValueError, asyncio.IncompleteReadError):
+            errors["connection"] += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        latencies.append(time.perf_counter() - started)
+        if status >= 400:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(url, paths, concurrency, duration):
+    """
+    Hammer ``paths`` on ``url`` from ``concurrency`` keep-alive connections.
+
+    Returns:
+        dict: Request count, requests per second, latency percentiles (ms) and errors.
+    """
+    latencies = []
+    errors = {"connection": 0}
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(_worker(url, paths, deadline, latencies, errors) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    samples = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99]).tolist()
+    return {
+        "url": url,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(p50, 2),
+        "p95_ms": round(p95, 2),
+        "p99_ms": round(p99, 2),
+        "max_ms": round(float(samples.max()), 2),
+        "errors": {key: count for key, count in errors.items() if count},
+    }
+
+
+class Command(BaseCommand):
+    help = "Measure requests per second and latency percentiles of running API servers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+',
+                            help="Base URLs to compare, e.g. http://web:8000/api http://asgi:8001/api/async")
+        parser.add_argument('--path', action='append', dest='paths',
+                            help="Path under each base URL; repeat to rotate through several (default: /stocks/)")
+        parser.add_argument('--concurrency', type=int, default=200,
+                            help="Number of simultaneous keep-alive connections")
+        parser.add_argument('--duration', type=float, default=30,
+                            help="Seconds to run against each URL")
+        parser.add_argument('--json', action='store_true',
+                            help="Print results as JSON")
+
+    def handle(self, *args, **options):
+        if options['concurrency'] <= 0 or options['duration'] <= 0:
+            raise CommandError("--concurrency and --duration must be positive.")
+        paths = options['paths'] or ['/stocks/']
+
+        results = [
+            asyncio.run(run_load(url, paths, options['concurrency'], options['duration']))
+            for url in options['urls']
+        ]
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for result in results:
+            self.stdout.write(
+                f"{result['url']}: {result['requests']} requests, {result['rps']} req/s, "
+                f"p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, p99 {result['p99_ms']} ms"
+                + (f", errors {result['errors']}" if result['errors'] else "")
+            )
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.tasks import process_pending_batch
+
+
+class Command(BaseCommand):
+    help = "Continuously apply pending transactions in micro-batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Maximum transactions applied per batch")
+        parser.add_argument('--max-wait-ms', type=int, default=50,
+                            help="How long to wait for more orders when a batch is not full")
+        parser.add_argument('--once', action='store_true',
+                            help="Drain the current backlog and exit")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        max_wait = options['max_wait_ms'] / 1000
+        if batch_size <= 0 or max_wait < 0:
+            raise CommandError("--batch-size must be positive and --max-wait-ms non-negative.")
+
+        total = 0
+        while True:
+            processed = process_pending_batch(batch_size)
+            total += processed
+            if processed < batch_size:
+                if options['once']:
+                    break
+                # a full batch means more is waiting; otherwise let orders accumulate
+                time.sleep(max_wait)
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} transactions."))
@@ -0,0 +1,162 @@
+import logging
+import os
+import time
+
+import redis
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest, multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+from .routing import transaction_queues
+
+logger = logging.getLogger(__name__)
+
+REQUEST_LATENCY = Histogram(
+    'stockflow_http_request_duration_seconds', "Time spent serving HTTP requests.",
+    ['method', 'route'],
+)
+REQUESTS = Counter(
+    'stockflow_http_requests_total', "HTTP responses by route and status code.",
+    ['method', 'route', 'status'],
+)
+CACHE_REQUESTS = Counter(
+    'stockflow_cache_requests_total', "Response cache lookups by tier, key family and outcome.",
+    ['tier', 'family', 'outcome'],
+)
+TRANSACTION_DURATION = Histogram(
+    'stockflow_process_transaction_duration_seconds', "Time process_transaction spends on one order.",
+)
+TRANSACTION_OUTCOMES = Counter(
+    'stockflow_process_transaction_total', "Orders handled by process_transaction, by outcome.",
+    ['outcome'],
+)
+ORDER_LAG = Histogram(
+    'stockflow_order_completion_lag_seconds', "Time from an order being created to it completing or failing.",
+    ['mode'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+ORDERS_REJECTED = Counter(
+    'stockflow_orders_rejected_total', "Order submissions turned away by admission control, by reason.",
+    ['reason'],
+)
+
+CACHE_FAMILIES = ("user_", "stock_", "all_stocks")
+
+
+def key_family(key):
+    """
+    Collapse a cache key to its family (user_*, stock_*, all_stocks) so
+    label cardinality stays bounded.
+    """
+    for prefix in CACHE_FAMILIES:
+        if key.startswith(prefix):
+            return prefix + "*" if prefix.endswith("_") else prefix
+    return "other"
+
+
+def observe_order_lag(created_at, mode):
+    ORDER_LAG.labels(mode).observe(max(time.time() - created_at.timestamp(), 0))
+
+
+def queue_lengths(queues):
+    """
+    Messages waiting in each of ``queues`` on the Redis broker, read with
+    one pipelined round trip.
+
+    Returns:
+        dict: Queue name -> length, or None when the broker is not Redis
+        or cannot be reached.
+    """
+    broker_url = getattr(settings, 'CELERY_BROKER_URL', '')
+    if not broker_url.startswith(('redis://', 'rediss://')):
+        return None
+    try:
+        client = redis.Redis.from_url(broker_url, socket_timeout=1)
+        pipe = client.pipeline(transaction=False)
+        for queue in queues:
+            pipe.llen(queue)
+        return dict(zip(queues, pipe.execute()))
+    except redis.RedisError:
+        logger.warning("Could not read Celery queue lengths", exc_info=True)
+        return None
+
+
+class QueueDepthCollector:
+    """
+    Reports the length of each Celery queue in the Redis broker at scrape time.
+    """
+
+    def collect(self):
+        gauge = GaugeMetricFamily('stockflow_celery_queue_length', "Messages waiting in each Celery queue.", labels=['queue'])
+        for queue, length in (queue_lengths(['celery'] + transaction_queues()) or {}).items():
+            gauge.add_metric([queue], length)
+        yield gauge
+
+
+def registry():
+    """
+    The registry to expose: every process's samples when
+    PROMETHEUS_MULTIPROC_DIR is set (gunicorn workers, Celery workers),
+    otherwise this process's.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        combined = CollectorRegistry()
+        multiprocess.MultiProcessCollector(combined)
+        combined.register(QueueDepthCollector())
+        return combined
+    return REGISTRY
+
+
+if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    REGISTRY.register(QueueDepthCollector())
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint.
+    """
+    return HttpResponse(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+class MetricsMiddleware:
+    """
+    Times every request and counts responses per route and status.
+
+    Routes are labelled by URL name (e.g. ``users-detail``) rather than path,
+    so per-user or per-ticker URLs share one series. Works for both sync
+    and async views.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.observe(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, response, started)
+        return response
+
+    @staticmethod
+    def observe(request, response, started):
+        match = request.resolver_match
+        route = (match.view_name or match.route) if match else "unmatched"
+        # streaming responses are timed to the first byte
+        REQUEST_LATENCY.labels(request.method, route).observe(time.perf_counter() - started)
+        REQUESTS.labels(request.method, route, str(response.status_code)).inc()
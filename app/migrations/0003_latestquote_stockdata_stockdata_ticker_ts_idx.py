@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:23
+
+from django.db import migrations, models
+
+
+def backfill_latest_quotes(apps, schema_editor):
+    StockData = apps.get_model('app', 'StockData')
+    LatestQuote = apps.get_model('app', 'LatestQuote')
+    fields = ['ticker', 'open_price', 'close_price', 'high', 'low', 'volume', 'timestamp']
+
+    quotes = []
+    last_ticker = None
+    bars = StockData.objects.order_by('ticker', '-timestamp', '-id').values(*fields)
+    for bar in bars.iterator(chunk_size=2000):
+        if bar['ticker'] != last_ticker:
+            quotes.append(LatestQuote(**bar))
+            last_ticker = bar['ticker']
+    LatestQuote.objects.bulk_create(quotes, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_transaction_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestQuote',
+            fields=[
+                ('ticker', models.CharField(max_length=10, primary_key=True, serialize=False)),
+                ('open_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('close_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('high', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('low', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('volume', models.IntegerField()),
+                ('timestamp', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='stockdata',
+            index=models.Index(fields=['ticker', 'timestamp'], name='stockdata_ticker_ts_idx'),
+        ),
+        migrations.RunPython(backfill_latest_quotes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_latestquote_stockdata_stockdata_ticker_ts_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'timestamp', 'id'], name='transaction_user_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:32
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Copies of app.holdings' helpers as of this migration, so the backfill keeps
+# computing the same positions whatever later changes are made there.
+COST_PRECISION = Decimal('0.0001')
+
+
+def apply_fill(quantity, cost_basis, volume, amount):
+    unit_price = amount / abs(volume)
+    if quantity == 0 or (quantity > 0) == (volume > 0):
+        return quantity + volume, (cost_basis + unit_price * volume).quantize(COST_PRECISION)
+    new_quantity = quantity + volume
+    if abs(volume) <= abs(quantity):
+        return new_quantity, (cost_basis * new_quantity / quantity).quantize(COST_PRECISION)
+    return new_quantity, (unit_price * new_quantity).quantize(COST_PRECISION)
+
+
+def signed_volume(transaction_type, volume):
+    return volume if transaction_type == 'BUY' else -volume
+
+
+def backfill_holdings(apps, schema_editor):
+    Transaction = apps.get_model('app', 'Transaction')
+    Holding = apps.get_model('app', 'Holding')
+
+    positions = {}
+    completed = Transaction.objects.filter(status='completed').order_by('id').values_list(
+        'user_id', 'ticker', 'transaction_type', 'transaction_volume', 'transaction_price'
+    )
+    for user_id, ticker, transaction_type, volume, amount in completed.iterator(chunk_size=2000):
+        if volume <= 0:
+            continue
+        quantity, cost_basis = positions.get((user_id, ticker), (0, 0))
+        positions[(user_id, ticker)] = apply_fill(quantity, cost_basis, signed_volume(transaction_type, volume), amount)
+
+    Holding.objects.bulk_create([
+        Holding(user_id=user_id, ticker=ticker, quantity=quantity, cost_basis=cost_basis)
+        for (user_id, ticker), (quantity, cost_basis) in positions.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_transaction_transaction_user_ts_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Holding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticker', models.CharField(max_length=10)),
+                ('quantity', models.IntegerField(default=0)),
+                ('cost_basis', models.DecimalField(decimal_places=4, default=0, max_digits=16)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holdings', to='app.user')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'ticker'), name='holding_user_ticker_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_holdings, migrations.RunPython.noop),
+    ]
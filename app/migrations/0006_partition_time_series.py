@@ -0,0 +1,124 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import migrations
+
+# The table rebuild from app.partitions as of this migration, reduced to what
+# it runs (the swap and the initial months), so later changes there cannot
+# change what this migration does.
+PARTITIONED_TABLES = ('app_transaction', 'app_stockdata')
+
+
+def month_start(value):
+    value = value.astimezone(dt_timezone.utc) if value.tzinfo else value.replace(tzinfo=dt_timezone.utc)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def is_partitioned(cursor, table):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [table])
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def rebuild(connection, table, partitioned, months=()):
+    """
+    Copy ``table`` into a new table of the same shape, partitioned by month
+    or not, and swap it in under the same name with the same index,
+    constraint and sequence names, so Django's migration state still matches.
+    """
+    quote = connection.ops.quote_name
+    column = quote('timestamp')
+    old = f"{table}_old"
+    with connection.cursor() as cursor:
+        if is_partitioned(cursor, table) == partitioned:
+            return
+        cursor.execute(
+            "SELECT c.relname, pg_get_indexdef(i.indexrelid), i.indisprimary "
+            "FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE i.indrelid = %s::regclass",
+            [table],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+        primary_key = next((name for name, _, primary in indexes if primary), f"{table}_pkey")
+        cursor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(old)}")
+        for name, _, _ in indexes:
+            # frees the name for the index on the new table
+            cursor.execute(f"ALTER INDEX {quote(name)} RENAME TO {quote(name[:58] + '_old')}")
+
+        like = f"(LIKE {quote(old)} INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING CONSTRAINTS)"
+        if partitioned:
+            cursor.execute(f"CREATE TABLE {quote(table)} {like} PARTITION BY RANGE ({column})")
+            # a partitioned table's primary key must include the partition column
+            cursor.execute(f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(primary_key)} PRIMARY KEY (id, {column})")
+            cursor.execute(f"CREATE TABLE {quote(table + '_default')} PARTITION OF {quote(table)} DEFAULT")
+            cursor.execute(f"SELECT min({column}), max({column}) FROM {quote(old)}")
+            first, last = cursor.fetchone()
+            needed = set(months)
+            if first is not None:
+                month = month_start(first)
+                while month <= month_start(last):
+                    needed.add(month)
+                    month = add_months(month, 1)
+            # the new table is empty, so each month is created directly as a partition
+            for month in sorted(needed):
+                cursor.execute(
+                    f"CREATE TABLE {quote(f'{table}_p{month:%Y%m}')} PARTITION OF {quote(table)} "
+                    f"FOR VALUES FROM (%s) TO (%s)",
+                    [month, add_months(month, 1)],
+                )
+        else:
+            cursor.execute(f"CREATE TABLE {quote(table)} {like}")
+            cursor.execute(f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(primary_key)} PRIMARY KEY (id)")
+
+        cursor.execute(f"INSERT INTO {quote(table)} SELECT * FROM {quote(old)}")
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), coalesce(max(id), 0) + 1, false) FROM {quote(table)}",
+            [table],
+        )
+        cursor.execute(f"DROP TABLE {quote(old)} CASCADE")
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+        cursor.execute(f"ALTER SEQUENCE {cursor.fetchone()[0]} RENAME TO {quote(table + '_id_seq')}")
+        for _, definition, primary in indexes:
+            if not primary:
+                cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}")
+
+
+def partition(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    current = month_start(datetime.now(dt_timezone.utc))
+    for table in PARTITIONED_TABLES:
+        # existing months are added from the data; the next few up front
+        rebuild(schema_editor.connection, table, True, [add_months(current, offset) for offset in range(4)])
+
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in PARTITIONED_TABLES:
+        rebuild(schema_editor.connection, table, False)
+
+
+class Migration(migrations.Migration):
+    """
+    Range-partition app_transaction and app_stockdata by month on
+    PostgreSQL; a no-op on other databases. See app/partitions.py.
+    """
+
+    dependencies = [
+        ('app', '0005_holding'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
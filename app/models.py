@@ -20,8 +20,30 @@ class StockData(models.Model):
     volume = models.IntegerField()
     timestamp = models.DateTimeField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['ticker', 'timestamp'], name='stockdata_ticker_ts_idx'),
+        ]
+
     def __str__(self):
         return f"{self.ticker} at {self.timestamp}"
+
+
+class LatestQuote(models.Model):
+    """
+    Most recent bar per ticker, kept up to date on ingest so the current
+    price is a primary key lookup however much history is stored.
+    """
+    ticker = models.CharField(max_length=10, primary_key=True)
+    open_price = models.DecimalField(max_digits=10, decimal_places=2)
+    close_price = models.DecimalField(max_digits=10, decimal_places=2)
+    high = models.DecimalField(max_digits=10, decimal_places=2)
+    low = models.DecimalField(max_digits=10, decimal_places=2)
+    volume = models.IntegerField()
+    timestamp = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.ticker} latest at {self.timestamp}"
     
     
 class Transaction(models.Model):
@@ -44,6 +66,33 @@ class Transaction(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=10, choices=TRANSACTION_STATUSES, default='pending')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'timestamp', 'id'], name='transaction_user_ts_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.transaction_type} {self.transaction_volume} {self.ticker} by {self.user.username}"
+        return f"{self.transaction_type} {self.transaction_volume} {self.ticker} by user {self.user_id}"
+
+
+class Holding(models.Model):
+    """
+    A user's open position in one ticker, updated as transactions complete.
 
+    ``cost_basis`` is the signed total cost of the position at average cost
+    (negative for a short position), so unrealized P&L is always
+    ``quantity * price - cost_basis``.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='holdings')
+    ticker = models.CharField(max_length=10)
+    quantity = models.IntegerField(default=0)
+    cost_basis = models.DecimalField(max_digits=16, decimal_places=4, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ticker'], name='holding_user_ticker_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} {self.ticker} held by user {self.user_id}"
@@ -0,0 +1,116 @@
+"""
+Market-wide rankings of each ticker's latest bar, kept in Redis sorted sets.
+
+Two sorted sets rank tickers by the latest bar's percent change (close vs
+open) and by its volume. A hash holds each ranked bar's timestamp and one
+holds its quote. Ingest moves every ticker in the batch to its new score,
+in O(log n) per ticker. Reading the top N is O(log n + N), however much
+history is stored.
+
+The rankings are built from LatestQuote the first time they are read, for
+example after Redis is flushed. A bar only replaces a ticker's ranked bar
+when it is at least as recent, so a rebuild racing an ingest, or
+out-of-order batches, never move a ticker backwards.
+"""
+import json
+
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+from .models import LatestQuote
+from .prices import to_epoch
+from .quotes import newest_per_ticker
+from .serializers import LatestQuoteSerializer
+
+RANKINGS = ('change', 'volume')
+
+# ARGV is (ticker, timestamp, change, volume, quote) per ticker; applied only
+# once the rankings exist (or are being built) and only for bars at least as
+# recent as the ranked one
+_update_script = """
+if redis.call('EXISTS', KEYS[5]) == 0 then
+    return 0
+end
+for i = 1, #ARGV, 5 do
+    local current = redis.call('HGET', KEYS[3], ARGV[i])
+    if not current or tonumber(current) <= tonumber(ARGV[i + 1]) then
+        redis.call('HSET', KEYS[3], ARGV[i], ARGV[i + 1])
+        redis.call('ZADD', KEYS[1], ARGV[i + 2], ARGV[i])
+        redis.call('ZADD', KEYS[2], ARGV[i + 3], ARGV[i])
+        redis.call('HSET', KEYS[4], ARGV[i], ARGV[i + 4])
+    end
+end
+return 1
+"""
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+def _keys():
+    return [cache.make_key(f"movers_{name}") for name in (*RANKINGS, 'timestamp', 'quote', 'built')]
+
+
+def change_percent(open_price, close_price):
+    open_price = float(open_price)
+    return (float(close_price) - open_price) / open_price * 100 if open_price else 0.0
+
+
+def _apply(client, bars):
+    args = []
+    for bar in bars:
+        quote = LatestQuoteSerializer(bar).data
+        args += [bar.ticker, to_epoch(bar.timestamp), change_percent(bar.open_price, bar.close_price),
+                 int(bar.volume), json.dumps(quote)]
+    if args:
+        client.eval(_update_script, 5, *_keys(), *args)
+
+
+def update(bars):
+    """
+    Move the tickers in ``bars`` to the scores of their newest bar.
+    """
+    _apply(_redis(), newest_per_ticker(bars).values())
+
+
+def build(client):
+    """
+    Rank every ticker's latest quote.
+    """
+    # marked first: a batch committing while LatestQuote is read is applied
+    # too, and wins over the older quote read here
+    client.set(_keys()[4], 1)
+    quotes = list(LatestQuote.objects.all())
+    for start in range(0, len(quotes), 500):
+        _apply(client, quotes[start:start + 500])
+
+
+def top(by='change', n=20, ascending=False):
+    """
+    The ``n`` highest (or lowest) ranked tickers.
+
+    Returns:
+        list: Latest quotes, each with its ``change_percent``, in rank order.
+    """
+    client = _redis()
+    keys = _keys()
+    if not client.exists(keys[4]):
+        build(client)
+    ranking = keys[RANKINGS.index(by)]
+    tickers = client.zrange(ranking, 0, n - 1) if ascending else client.zrevrange(ranking, 0, n - 1)
+    if not tickers:
+        return []
+    movers = []
+    for raw in client.hmget(keys[3], tickers):
+        quote = json.loads(raw)
+        quote['change_percent'] = round(change_percent(quote['open_price'], quote['close_price']), 4)
+        movers.append(quote)
+    return movers
+
+
+def clear():
+    """
+    Drop the rankings; the next read rebuilds them.
+    """
+    _redis().delete(*_keys())
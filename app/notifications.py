@@ -0,0 +1,170 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.utils.dateparse import parse_datetime
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import pubsub
+from .caching import async_redis
+from .serializers import TransactionSerializer
+
+logger = logging.getLogger(__name__)
+
+STATUS_CHANNEL = "transaction-status"
+
+# how long a transaction's status record stays in Redis
+STATUS_TIMEOUT = getattr(settings, 'TRANSACTION_STATUS_TIMEOUT', 3600)
+
+FINAL_STATUSES = ('completed', 'failed')
+
+
+def status_key(transaction_id):
+    return cache.make_key(f"transaction_status_{transaction_id}")
+
+
+def pending_key():
+    # pending transaction ids scored by creation time, for admission control
+    return cache.make_key("pending_transactions")
+
+
+def record_statuses(records):
+    """
+    Store serialized transactions in Redis and announce the finished ones.
+
+    Every record is written with a single pipelined round trip, and all the
+    completed or failed records share one pub/sub message. Pending records
+    are also added to the pending set and finished ones removed from it.
+    """
+    finished = [record for record in records if record['status'] in FINAL_STATUSES]
+    pending = {
+        record['id']: parse_datetime(record['timestamp']).timestamp()
+        for record in records if record['status'] not in FINAL_STATUSES and record['timestamp']
+    }
+    try:
+        pipe = get_redis_connection("default").pipeline(transaction=False)
+        for record in records:
+            pipe.set(status_key(record['id']), json.dumps(record, cls=JSONEncoder), ex=STATUS_TIMEOUT)
+        if pending:
+            pipe.zadd(pending_key(), pending)
+        if finished:
+            pipe.zrem(pending_key(), *[record['id'] for record in finished])
+            pipe.publish(STATUS_CHANNEL, json.dumps(finished, cls=JSONEncoder))
+        pipe.execute()
+    except RedisError:
+        # waiters fall back to their timeout; the database stays authoritative
+        logger.warning("Could not record status for %d transactions", len(records), exc_info=True)
+
+
+def notify(transactions):
+    """
+    Record the current status of ``transactions`` once the surrounding
+    database transaction commits.
+    """
+    records = TransactionSerializer(transactions, many=True).data
+    if records:
+        db_transaction.on_commit(lambda: record_statuses(records))
+
+
+async def aget_status(transaction_id):
+    """
+    The stored status record for a transaction, or None if Redis has none.
+    """
+    raw = await async_redis().get(status_key(transaction_id))
+    return json.loads(raw) if raw is not None else None
+
+
+class StatusWaiters:
+    """
+    Lets coroutines in this process wait for transactions to finish.
+
+    The process holds a single subscription to the status channel (via the
+    shared pub/sub listener) and resolves the futures registered for each
+    announced transaction on their own event loops.
+    """
+
+    def __init__(self):
+        self._waiters = {}  # transaction id -> set of futures
+        self._lock = threading.Lock()
+        self._subscribed = False
+
+    def _ensure_subscribed(self):
+        with self._lock:
+            if self._subscribed:
+                return
+            self._subscribed = True
+        pubsub.listener.subscribe(STATUS_CHANNEL, self._dispatch, on_reconnect=self._wake_all)
+
+    async def wait(self, transaction_id, timeout):
+        """
+        Wait up to ``timeout`` seconds for a transaction to complete or fail.
+
+        Returns:
+            dict: The latest status record seen, or None if Redis has none.
+        """
+        if not self._subscribed:
+            await sync_to_async(self._ensure_subscribed, thread_sensitive=False)()
+        deadline = time.monotonic() + timeout
+        loop = asyncio.get_running_loop()
+        record = None
+        while True:
+            future = loop.create_future()
+            with self._lock:
+                self._waiters.setdefault(transaction_id, set()).add(future)
+            try:
+                # re-read after registering so an announcement cannot slip between the two
+                record = await aget_status(transaction_id) or record
+                if record is not None and record['status'] in FINAL_STATUSES:
+                    return record
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return record
+                try:
+                    announced = await asyncio.wait_for(future, remaining)
+                except asyncio.TimeoutError:
+                    return record
+                if announced is not None:
+                    return announced
+                # None means the listener reconnected; check Redis again
+            finally:
+                with self._lock:
+                    futures = self._waiters.get(transaction_id)
+                    if futures is not None:
+                        futures.discard(future)
+                        if not futures:
+                            del self._waiters[transaction_id]
+
+    def _dispatch(self, payload):
+        # runs on the pub/sub listener thread
+        for record in json.loads(payload):
+            with self._lock:
+                futures = list(self._waiters.get(record['id'], ()))
+            for future in futures:
+                _resolve_threadsafe(future, record)
+
+    def _wake_all(self):
+        with self._lock:
+            futures = [future for futures in self._waiters.values() for future in futures]
+        for future in futures:
+            _resolve_threadsafe(future, None)
+
+
+def _resolve_threadsafe(future, result):
+    def resolve():
+        if not future.done():
+            future.set_result(result)
+    try:
+        future.get_loop().call_soon_threadsafe(resolve)
+    except RuntimeError:
+        pass  # the waiting loop has already closed
+
+
+waiters = StatusWaiters()
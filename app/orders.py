@@ -0,0 +1,118 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+
+from .models import User, Transaction
+from .prices import price_table
+from .serializers import TransactionSerializer
+from .tasks import enqueue_transactions
+from . import notifications
+
+REQUIRED_FIELDS = ["user", "ticker", "transaction_type", "transaction_volume"]
+
+TRANSACTION_TYPES = {choice for choice, _ in Transaction.TRANSACTION_TYPES}
+
+MAX_BATCH_ORDERS = getattr(settings, 'MAX_BATCH_ORDERS', 1000)
+
+_price_field = Transaction._meta.get_field('transaction_price')
+
+MAX_TRANSACTION_VOLUME = 2 ** 31 - 1
+
+# exclusive bound on an order's total price, from the column's precision
+MAX_TRANSACTION_PRICE = Decimal(10) ** (_price_field.max_digits - _price_field.decimal_places)
+
+
+def price_order(price, volume):
+    """
+    Total price of an order, or None if it does not fit transaction_price.
+    """
+    total = price * volume
+    return total if abs(total) < MAX_TRANSACTION_PRICE else None
+
+
+def _clean_order(order):
+    """
+    Check the shape of a single order.
+
+    Returns:
+        tuple: (cleaned dict, None) or (None, error message).
+    """
+    if not isinstance(order, dict):
+        return None, "Order must be an object."
+    for field in REQUIRED_FIELDS:
+        if field not in order:
+            return None, f"Missing required field: {field}"
+    if order["transaction_type"] not in TRANSACTION_TYPES:
+        return None, "transaction_type must be BUY or SELL."
+    try:
+        user_id = int(order["user"])
+        volume = int(order["transaction_volume"])
+    except (TypeError, ValueError):
+        return None, "user and transaction_volume must be integers."
+    if not 0 < volume <= MAX_TRANSACTION_VOLUME:
+        return None, "transaction_volume must be positive and fit a 32-bit integer."
+    return {
+        "user_id": user_id,
+        "ticker": str(order["ticker"]),
+        "transaction_type": order["transaction_type"],
+        "transaction_volume": volume,
+    }, None
+
+
+def submit_orders(orders):
+    """
+    Validate, price, store and enqueue a basket of orders.
+
+    Users and tickers for the whole basket are resolved with one IN query
+    each, the transactions are written with a single bulk_create and the
+    processing tasks are queued in chunks rather than one message per order.
+
+    Args:
+        orders (list): Order dicts shaped like a TransactionViewSet.create body.
+
+    Returns:
+        list: One result per order, in input order, each either
+        {"index", "transaction"} or {"index", "error"}.
+    """
+    results = [None] * len(orders)
+    cleaned = []
+    for index, order in enumerate(orders):
+        order, error = _clean_order(order)
+        if error:
+            results[index] = {"index": index, "error": error}
+        else:
+            cleaned.append((index, order))
+
+    user_ids = {order["user_id"] for _, order in cleaned}
+    tickers = {order["ticker"] for _, order in cleaned}
+    known_users = set(User.objects.filter(id__in=user_ids).values_list("id", flat=True)) if user_ids else set()
+    prices = price_table.prices(tickers) if tickers else {}
+
+    pending = []
+    for index, order in cleaned:
+        if order["user_id"] not in known_users:
+            results[index] = {"index": index, "error": "User not found"}
+        elif order["ticker"] not in prices:
+            results[index] = {"index": index, "error": "Stock not found"}
+        else:
+            total = price_order(prices[order["ticker"]], order["transaction_volume"])
+            if total is None:
+                # checked here so one oversized order cannot fail the basket's bulk_create
+                results[index] = {"index": index, "error": "Order value is too large."}
+                continue
+            pending.append((index, Transaction(
+                transaction_price=total,
+                status="pending",
+                **order
+            )))
+
+    if pending:
+        with db_transaction.atomic():
+            created = Transaction.objects.bulk_create([txn for _, txn in pending])
+            notifications.notify(created)
+        enqueue_transactions(created)
+        for (index, _), txn in zip(pending, created):
+            results[index] = {"index": index, "transaction": TransactionSerializer(txn).data}
+
+    return results
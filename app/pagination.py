@@ -0,0 +1,129 @@
+import base64
+import json
+
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.utils.urls import replace_query_param
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPagination:
+    """
+    Cursor pagination over (timestamp, id), newest first.
+
+    Each page continues strictly after the last row of the previous page,
+    so it costs one index range scan no matter how deep it is, and rows
+    inserted while a client is paging cannot shift or duplicate results.
+    The response body stays a plain list; the next page is advertised in
+    a ``Link: <...>; rel="next"`` header.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+
+    def __init__(self, request):
+        self.request = request
+        # DRF requests expose query_params; plain Django requests (async views) use GET
+        self.params = getattr(request, 'query_params', request.GET)
+        self.next_cursor = None
+
+    @staticmethod
+    def encode_cursor(timestamp, pk):
+        raw = json.dumps([timestamp.isoformat(), pk]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            timestamp, pk = json.loads(raw)
+            timestamp = parse_datetime(timestamp)
+            if timestamp is None:
+                raise ValueError
+            return timestamp, int(pk)
+        except (ValueError, TypeError):
+            raise InvalidCursor("Invalid cursor.")
+
+    def get_page_size(self):
+        try:
+            size = int(self.params.get(self.page_size_query_param, DEFAULT_PAGE_SIZE))
+        except ValueError:
+            return DEFAULT_PAGE_SIZE
+        return max(1, min(size, MAX_PAGE_SIZE))
+
+    def paginate_queryset(self, queryset, archived=None):
+        """
+        Return one page of ``queryset`` and remember the cursor for the next.
+
+        Args:
+            archived (callable): Optional ``archived(before, limit)`` returning
+                up to ``limit`` older rows, newest first, strictly before the
+                (timestamp, id) position ``before`` (None for the start). It
+                fills the page once the queryset runs out, so paging
+                continues into archived data.
+
+        Raises:
+            InvalidCursor: If the cursor query parameter cannot be decoded.
+        """
+        page = list(self.page_queryset(queryset))
+        if archived is not None and len(page) <= self.get_page_size():
+            page += archived(self.position(page), self.get_page_size() + 1 - len(page))
+        return self.finish_page(page)
+
+    async def apaginate_queryset(self, queryset, archived=None):
+        """
+        Async counterpart of paginate_queryset using the async ORM.
+        """
+        page = [row async for row in self.page_queryset(queryset)]
+        if archived is not None and len(page) <= self.get_page_size():
+            page += await sync_to_async(archived)(self.position(page), self.get_page_size() + 1 - len(page))
+        return self.finish_page(page)
+
+    def position(self, page):
+        """
+        The (timestamp, id) the next row must come strictly before.
+        """
+        if page:
+            return page[-1].timestamp, page[-1].id
+        cursor = self.params.get(self.cursor_query_param)
+        return self.decode_cursor(cursor) if cursor else None
+
+    def page_queryset(self, queryset):
+        """
+        Order, filter past the cursor and limit to one row more than a page.
+        """
+        queryset = queryset.order_by('-timestamp', '-id')
+        cursor = self.params.get(self.cursor_query_param)
+        if cursor:
+            timestamp, pk = self.decode_cursor(cursor)
+            # the timestamp__lte bound keeps this a single index range scan
+            queryset = queryset.filter(timestamp__lte=timestamp).filter(
+                Q(timestamp__lt=timestamp) | Q(id__lt=pk)
+            )
+
+        return queryset[:self.get_page_size() + 1]
+
+    def finish_page(self, page):
+        page_size = self.get_page_size()
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_cursor = self.encode_cursor(page[-1].timestamp, page[-1].id)
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def add_headers(self, response):
+        next_link = self.get_next_link()
+        if next_link:
+            response['Link'] = f'<{next_link}>; rel="next"'
+        return response
@@ -0,0 +1,229 @@
+"""
+Monthly range partitioning of the time-series tables on PostgreSQL.
+
+app_transaction and app_stockdata are partitioned by RANGE ("timestamp")
+into one partition per calendar month (``<table>_pYYYYMM``), plus a DEFAULT
+partition catching rows outside every month created so far. Queries with a
+timestamp bound only touch the months they cover, and old months are
+removed by dropping a partition instead of a bulk DELETE, so VACUUM and
+index bloat stay proportional to recent data.
+
+Other databases (SQLite in tests) keep plain tables; every helper here is
+a no-op on them and archival falls back to range deletes.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+PARTITIONED_TABLES = ('app_transaction', 'app_stockdata')
+PARTITION_COLUMN = 'timestamp'
+
+
+def month_start(value):
+    """
+    The first instant (UTC) of the month containing ``value``.
+    """
+    value = value.astimezone(dt_timezone.utc) if value.tzinfo else value.replace(tzinfo=dt_timezone.utc)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def iter_months(first, last):
+    """
+    Month starts from the month of ``first`` to the month of ``last``, inclusive.
+    """
+    month, last = month_start(first), month_start(last)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+
+def supported(connection):
+    return connection.vendor == 'postgresql'
+
+
+def is_partitioned(connection, table):
+    if not supported(connection):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [table])
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def _table_objects(cursor, table):
+    # indexes and foreign keys to carry over when the table is rebuilt
+    cursor.execute(
+        "SELECT c.relname, pg_get_indexdef(i.indexrelid), i.indisprimary "
+        "FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE i.indrelid = %s::regclass",
+        [table],
+    )
+    indexes = cursor.fetchall()
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table],
+    )
+    return indexes, cursor.fetchall()
+
+
+def _rebuild(connection, table, partitioned, months=()):
+    """
+    Copy ``table`` into a new table of the same shape, partitioned by month
+    or not, and swap it in under the same name with the same index,
+    constraint and sequence names, so Django's migration state still matches.
+    """
+    quote = connection.ops.quote_name
+    column = quote(PARTITION_COLUMN)
+    old = f"{table}_old"
+    with connection.cursor() as cursor:
+        indexes, foreign_keys = _table_objects(cursor, table)
+        primary_key = next((name for name, _, primary in indexes if primary), f"{table}_pkey")
+        cursor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(old)}")
+        for name, _, _ in indexes:
+            # frees the name for the index on the new table
+            cursor.execute(f"ALTER INDEX {quote(name)} RENAME TO {quote(name[:58] + '_old')}")
+
+        like = f"(LIKE {quote(old)} INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING CONSTRAINTS)"
+        if partitioned:
+            cursor.execute(f"CREATE TABLE {quote(table)} {like} PARTITION BY RANGE ({column})")
+            # a partitioned table's primary key must include the partition column
+            cursor.execute(f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(primary_key)} PRIMARY KEY (id, {column})")
+            cursor.execute(f"CREATE TABLE {quote(table + '_default')} PARTITION OF {quote(table)} DEFAULT")
+            cursor.execute(f"SELECT min({column}), max({column}) FROM {quote(old)}")
+            first, last = cursor.fetchone()
+            needed = set(months)
+            if first is not None:
+                needed.update(iter_months(first, last))
+            for month in sorted(needed):
+                _create(cursor, connection, table, month)
+        else:
+            cursor.execute(f"CREATE TABLE {quote(table)} {like}")
+            cursor.execute(f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(primary_key)} PRIMARY KEY (id)")
+
+        cursor.execute(f"INSERT INTO {quote(table)} SELECT * FROM {quote(old)}")
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), coalesce(max(id), 0) + 1, false) FROM {quote(table)}",
+            [table],
+        )
+        cursor.execute(f"DROP TABLE {quote(old)} CASCADE")
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+        cursor.execute(f"ALTER SEQUENCE {cursor.fetchone()[0]} RENAME TO {quote(table + '_id_seq')}")
+        for _, definition, primary in indexes:
+            if not primary:
+                cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}")
+
+
+def partition_table(connection, table, months=()):
+    """
+    Convert a plain table into a monthly partitioned one, creating a
+    partition for every month that has rows plus ``months``.
+    """
+    if supported(connection) and not is_partitioned(connection, table):
+        _rebuild(connection, table, partitioned=True, months=months)
+
+
+def unpartition_table(connection, table):
+    """
+    Reverse of partition_table.
+    """
+    if is_partitioned(connection, table):
+        _rebuild(connection, table, partitioned=False)
+
+
+def _create(cursor, connection, table, month):
+    quote = connection.ops.quote_name
+    column = quote(PARTITION_COLUMN)
+    name = partition_name(table, month)
+    cursor.execute("SELECT to_regclass(%s)", [name])
+    if cursor.fetchone()[0] is not None:
+        return False
+    bounds = [month, add_months(month, 1)]
+    # rows for this month may already sit in the default partition; attaching
+    # the new range would fail while they are there, so move them first
+    cursor.execute(f"CREATE TABLE {quote(name)} (LIKE {quote(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    cursor.execute(
+        f"WITH moved AS (DELETE FROM {quote(table + '_default')} WHERE {column} >= %s AND {column} < %s RETURNING *) "
+        f"INSERT INTO {quote(name)} SELECT * FROM moved",
+        bounds,
+    )
+    cursor.execute(f"ALTER TABLE {quote(table)} ATTACH PARTITION {quote(name)} FOR VALUES FROM (%s) TO (%s)", bounds)
+    return True
+
+
+def create_partition(connection, table, month):
+    """
+    Create and attach the partition for ``month`` if it does not exist.
+
+    Returns:
+        bool: True if a partition was created.
+    """
+    if not is_partitioned(connection, table):
+        return False
+    with connection.cursor() as cursor:
+        return _create(cursor, connection, table, month_start(month))
+
+
+def lock_partition(connection, table, month):
+    """
+    Block writes to ``month``'s partition until the transaction ends;
+    reads continue.
+
+    Returns:
+        bool: True if the month has its own partition.
+    """
+    if not is_partitioned(connection, table):
+        return False
+    name = partition_name(table, month_start(month))
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [name])
+        if cursor.fetchone()[0] is None:
+            return False
+        cursor.execute(f"LOCK TABLE {connection.ops.quote_name(name)} IN SHARE MODE")
+    return True
+
+
+def drop_partition(connection, table, month):
+    """
+    Detach and drop the partition for ``month``, discarding its rows.
+
+    Returns:
+        bool: True if the month had its own partition.
+    """
+    if not is_partitioned(connection, table):
+        return False
+    quote = connection.ops.quote_name
+    name = partition_name(table, month_start(month))
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [name])
+        if cursor.fetchone()[0] is None:
+            return False
+        cursor.execute(f"ALTER TABLE {quote(table)} DETACH PARTITION {quote(name)}")
+        cursor.execute(f"DROP TABLE {quote(name)}")
+    return True
+
+
+def ensure_partitions(connection, months_ahead=3, now=None):
+    """
+    Create partitions from the current month through ``months_ahead``
+    months ahead for every partitioned table, so new rows never land in
+    the default partition.
+
+    Returns:
+        list: Names of the partitions created.
+    """
+    current = month_start(now or datetime.now(dt_timezone.utc))
+    created = []
+    for table in PARTITIONED_TABLES:
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            if create_partition(connection, table, month):
+                created.append(partition_name(table, month))
+    return created
@@ -0,0 +1,157 @@
+import json
+import threading
+import time
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from prometheus_client import Counter
+
+from . import pubsub
+from .models import LatestQuote
+from .streaming import QUOTE_CHANNEL, unpack_bar
+
+# seconds a price may be served without confirmation before the table
+# re-reads it from the database
+PRICE_TABLE_MAX_AGE = getattr(settings, 'PRICE_TABLE_MAX_AGE', 60)
+
+PRICE_LOOKUPS = Counter(
+    'stockflow_price_table_lookups_total', "Order-pricing lookups by outcome (hit, stale, miss).",
+    ['outcome'],
+)
+
+
+def to_cents(price):
+    return int(Decimal(str(price)).scaleb(2).to_integral_value())
+
+
+def to_epoch(timestamp):
+    if isinstance(timestamp, str):
+        timestamp = parse_datetime(timestamp)
+    return int(timestamp.timestamp())
+
+
+def from_cents(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+class PriceTable:
+    """
+    Latest close price per ticker, held in NumPy arrays in this process.
+
+    Prices are int64 cents in slots assigned per ticker; alongside each
+    price the table keeps the bar's timestamp (so late or duplicate
+    updates never move a price backwards) and when the price was last
+    confirmed. It is warmed from LatestQuote on first use, updated from
+    the quote-stream pub/sub channel, and re-warmed if that subscription
+    drops. A price not confirmed within ``max_age`` seconds is re-read
+    from the database.
+    """
+
+    def __init__(self, max_age=PRICE_TABLE_MAX_AGE, capacity=1024):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._cents = np.zeros(capacity, dtype=np.int64)
+        self._bar_time = np.zeros(capacity, dtype=np.int64)
+        self._confirmed = np.zeros(capacity, dtype=np.float64)
+        self._warm = False
+        self._subscribed = False
+
+    def clear(self):
+        with self._lock:
+            self._slots.clear()
+            self._warm = False
+
+    def _slot(self, ticker):
+        slot = self._slots.get(ticker)
+        if slot is None:
+            slot = len(self._slots)
+            if slot == len(self._cents):
+                self._cents = np.resize(self._cents, slot * 2)
+                self._bar_time = np.resize(self._bar_time, slot * 2)
+                self._confirmed = np.resize(self._confirmed, slot * 2)
+            self._slots[ticker] = slot
+            self._bar_time[slot] = np.iinfo(np.int64).min
+        return slot
+
+    def _store(self, ticker, cents, bar_time, confirmed):
+        slot = self._slot(ticker)
+        if bar_time >= self._bar_time[slot]:
+            self._cents[slot] = cents
+            self._bar_time[slot] = bar_time
+        self._confirmed[slot] = confirmed
+
+    def update(self, quotes):
+        """
+        Apply (ticker, close price, bar timestamp) updates; timestamps may be
+        datetimes or ISO 8601 strings.
+        """
+        now = time.time()
+        with self._lock:
+            for ticker, price, timestamp in quotes:
+                self._store(ticker, to_cents(price), to_epoch(timestamp), now)
+
+    def warm(self):
+        """
+        Load every latest quote; one query.
+        """
+        self._ensure_subscribed()
+        rows = LatestQuote.objects.values_list('ticker', 'close_price', 'timestamp')
+        now = time.time()
+        with self._lock:
+            self._slots.clear()
+            for ticker, price, timestamp in rows:
+                self._store(ticker, to_cents(price), to_epoch(timestamp), now)
+            self._warm = True
+
+    def _ensure_subscribed(self):
+        if not self._subscribed:
+            self._subscribed = True
+            # a reconnect means quote messages may have been missed
+            pubsub.listener.subscribe(QUOTE_CHANNEL, self._on_quotes, on_reconnect=self.clear)
+
+    def _on_quotes(self, payload):
+        message = json.loads(payload)
+        self.update(
+            (quote['ticker'], quote['close_price'], quote['timestamp'])
+            for quote in map(unpack_bar, message.get('quotes', ()))
+        )
+
+    def prices(self, tickers):
+        """
+        Latest close price for each ticker, reading the database only for
+        tickers that are unknown or past the staleness bound.
+
+        Returns:
+            dict: ticker -> Decimal; tickers without a quote are omitted.
+        """
+        if not self._warm:
+            self.warm()
+        found = {}
+        missing = []
+        deadline = time.time() - self.max_age
+        with self._lock:
+            for ticker in tickers:
+                slot = self._slots.get(ticker)
+                if slot is None or self._confirmed[slot] < deadline:
+                    missing.append(ticker)
+                    PRICE_LOOKUPS.labels("miss" if slot is None else "stale").inc()
+                else:
+                    found[ticker] = from_cents(self._cents[slot])
+                    PRICE_LOOKUPS.labels("hit").inc()
+        if missing:
+            rows = list(LatestQuote.objects.filter(ticker__in=missing).values_list('ticker', 'close_price', 'timestamp'))
+            self.update(rows)
+            found.update((ticker, price) for ticker, price, _ in rows)
+        return found
+
+    def price(self, ticker):
+        """
+        Latest close price for one ticker, or None if it has no quote.
+        """
+        return self.prices([ticker]).get(ticker)
+
+
+price_table = PriceTable()
@@ -0,0 +1,275 @@
+import contextvars
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from prometheus_client import Counter as PrometheusCounter, Histogram
+
+logger = logging.getLogger(__name__)
+
+SQL_QUERIES = Histogram(
+    'stockflow_sql_queries', "SQL queries run per request or Celery task.",
+    ['route'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144),
+)
+SQL_SECONDS = Histogram(
+    'stockflow_sql_seconds', "Total SQL time per request or Celery task.",
+    ['route'],
+)
+BUDGET_EXCEEDED = PrometheusCounter(
+    'stockflow_sql_budget_exceeded_total', "Requests or tasks that ran more queries or SQL time than budgeted.",
+    ['route'],
+)
+
+
+class QueryStats:
+    """
+    Queries and SQL time accumulated while tracking is active. Queries also
+    count towards every enclosing tracker (a task run eagerly inside a
+    request, or a test wrapping a request).
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = []
+
+    def __repr__(self):
+        return f"<QueryStats {self.count} queries in {self.seconds * 1000:.1f} ms>"
+
+
+# the tracker for the request or task running in this context; contextvars
+# follow sync_to_async, so async views are tracked too
+_current = contextvars.ContextVar('sql_query_stats', default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        while stats is not None:
+            stats.count += 1
+            stats.seconds += elapsed
+            stats.statements.append(sql)
+            stats = stats.parent
+
+
+def _install_wrapper(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def install():
+    """
+    Attach the query recorder to every database connection, now and as
+    they are opened.
+    """
+    connection_created.connect(_install_wrapper, dispatch_uid='app.profiling')
+    for connection in connections.all(initialized_only=True):
+        _install_wrapper(connection)
+
+
+@contextmanager
+def track_queries():
+    """
+    Count the queries run inside the block, on any thread the block's
+    context is carried to.
+
+    Yields:
+        QueryStats: Filled in as queries execute.
+    """
+    for connection in connections.all(initialized_only=True):
+        _install_wrapper(connection)
+    stats = QueryStats(_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def query_budget(route):
+    """
+    The (max queries, max SQL milliseconds) budget for a route or task name.
+
+    SQL_QUERY_BUDGETS overrides the SQL_QUERY_BUDGET / SQL_TIME_BUDGET_MS defaults
+    per name, e.g. {"transactions-detail": 3}.
+    """
+    max_queries = getattr(settings, 'SQL_QUERY_BUDGETS', {}).get(route, getattr(settings, 'SQL_QUERY_BUDGET', 20))
+    return max_queries, getattr(settings, 'SQL_TIME_BUDGET_MS', 200)
+
+
+def check_budget(route, stats):
+    """
+    Export a request's or task's SQL usage and log it if over budget.
+
+    Returns:
+        bool: True if the budget was exceeded.
+    """
+    SQL_QUERIES.labels(route).observe(stats.count)
+    SQL_SECONDS.labels(route).observe(stats.seconds)
+    max_queries, max_ms = query_budget(route)
+    if stats.count <= max_queries and stats.seconds * 1000 <= max_ms:
+        return False
+    BUDGET_EXCEEDED.labels(route).inc()
+    repeated = Counter(stats.statements).most_common(1)
+    logger.warning(
+        "%s exceeded its SQL budget: %d queries (budget %d), %.1f ms (budget %d ms); most repeated: %r",
+        route, stats.count, max_queries, stats.seconds * 1000, max_ms, repeated[0] if repeated else None,
+    )
+    return True
+
+
+class SamplingProfiler:
+    """
+    Samples one thread's Python stack at a fixed interval and aggregates
+    the stacks in folded format ("outer;inner;leaf count"), which
+    flamegraph.pl, speedscope and inferno render as flame graphs.
+    """
+
+    def __init__(self, interval=0.005, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self):
+        # sample straight away so even short requests leave a profile
+        while True:
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+            if self._stop.wait(self.interval):
+                return
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def save(self, directory, name):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{name}.folded")
+        with open(path, 'w') as f:
+            f.write(self.folded())
+        return path
+
+
+def should_profile(request):
+    """
+    Profile a PROFILE_SAMPLE_RATE fraction of requests, plus any request
+    sending ``X-Profile: 1`` when PROFILE_ON_DEMAND is enabled.
+    """
+    if getattr(settings, 'PROFILE_ON_DEMAND', settings.DEBUG) and request.headers.get('X-Profile') == '1':
+        return True
+    rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0.0)
+    return rate > 0 and random.random() < rate
+
+
+def _route(request):
+    match = request.resolver_match
+    return (match.view_name or match.route) if match else "unmatched"
+
+
+class SQLBudgetMiddleware:
+    """
+    Records query count and SQL time for every request, flags requests over
+    budget, and runs the sampling profiler on the requests chosen by
+    should_profile (sync views only; an async view shares its thread with
+    other requests).
+
+    With SQL_BUDGET_HEADERS on, responses carry X-SQL-Queries and
+    X-SQL-Time-Ms (and X-Profile-Output when profiled).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profiler = None
+        with track_queries() as stats:
+            if should_profile(request):
+                profiler = SamplingProfiler(getattr(settings, 'PROFILE_INTERVAL_MS', 5) / 1000)
+                with profiler:
+                    response = self.get_response(request)
+            else:
+                response = self.get_response(request)
+        return self.finish(request, response, stats, profiler)
+
+    async def __acall__(self, request):
+        with track_queries() as stats:
+            response = await self.get_response(request)
+        return self.finish(request, response, stats)
+
+    @staticmethod
+    def finish(request, response, stats, profiler=None):
+        route = _route(request)
+        check_budget(route, stats)
+        headers = getattr(settings, 'SQL_BUDGET_HEADERS', settings.DEBUG)
+        if headers:
+            response['X-SQL-Queries'] = str(stats.count)
+            response['X-SQL-Time-Ms'] = f"{stats.seconds * 1000:.1f}"
+        if profiler is not None:
+            directory = getattr(settings, 'PROFILE_OUTPUT_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+            path = profiler.save(directory, route.replace('/', '_'))
+            if headers:
+                response['X-Profile-Output'] = path
+        return response
+
+
+_task_stats = {}
+
+
+@task_prerun.connect
+def _start_task_tracking(task_id, task, **kwargs):
+    stats = QueryStats(_current.get())
+    _task_stats[task_id] = (stats, _current.set(stats))
+
+
+@task_postrun.connect
+def _finish_task_tracking(task_id, task, **kwargs):
+    tracked = _task_stats.pop(task_id, None)
+    if tracked is None:
+        return
+    stats, token = tracked
+    try:
+        _current.reset(token)
+    except ValueError:
+        _current.set(None)  # finished in a different context than it started
+    check_budget(task.name, stats)
@@ -0,0 +1,116 @@
+import logging
+import threading
+import time
+
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+# seconds a subscribe() call waits for the listener to confirm
+SUBSCRIBE_TIMEOUT = 2
+
+# longest pause between reconnection attempts
+MAX_BACKOFF = 10
+
+
+def publish(channel, message):
+    """
+    Publish a message to every process subscribed to ``channel``.
+    """
+    get_redis_connection("default").publish(channel, message)
+
+
+class Listener:
+    """
+    One Redis pub/sub connection per process, shared by every subscriber.
+
+    A daemon thread reads messages and calls each channel's handlers with
+    the raw payload. If the connection drops, the thread resubscribes and
+    calls the ``on_reconnect`` hooks, because messages published in the
+    meantime were lost.
+    """
+
+    def __init__(self):
+        self._handlers = {}
+        self._reconnect_hooks = []
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, channel, handler, on_reconnect=None):
+        """
+        Register ``handler(payload)`` for ``channel``, starting the thread if needed.
+        """
+        with self._lock:
+            new_channel = channel not in self._handlers
+            self._handlers.setdefault(channel, []).append(handler)
+            if on_reconnect is not None:
+                self._reconnect_hooks.append(on_reconnect)
+            confirmed = self._pending.setdefault(channel, threading.Event()) if new_channel else None
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="redis-pubsub", daemon=True)
+                self._thread.start()
+        if confirmed is not None and not confirmed.wait(SUBSCRIBE_TIMEOUT):
+            logger.warning("Timed out waiting for pub/sub subscription to %s", channel)
+
+    def _run(self):
+        backoff = 0.1
+        connected_before = False
+        while True:
+            pubsub = None
+            try:
+                pubsub = get_redis_connection("default").pubsub(ignore_subscribe_messages=True)
+                with self._lock:
+                    channels = list(self._handlers)
+                pubsub.subscribe(*channels)
+                if connected_before:
+                    for hook in list(self._reconnect_hooks):
+                        hook()
+                connected_before = True
+                self._confirm(channels)
+                backoff = 0.1
+                self._listen(pubsub)
+            except Exception:
+                logger.exception("Redis pub/sub listener failed; reconnecting in %.1fs", backoff)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def _confirm(self, channels):
+        for channel in channels:
+            event = self._pending_event(channel)
+            if event is not None:
+                event.set()
+
+    def _pending_event(self, channel):
+        with self._lock:
+            return self._pending.pop(channel, None)
+
+    def _listen(self, pubsub):
+        while True:
+            # pick up channels registered since the last pass
+            with self._lock:
+                new_channels = list(self._pending)
+            if new_channels:
+                pubsub.subscribe(*new_channels)
+                self._confirm(new_channels)
+
+            message = pubsub.get_message(timeout=0.1)
+            if message is None or message['type'] != 'message':
+                continue
+            channel = message['channel']
+            if isinstance(channel, bytes):
+                channel = channel.decode()
+            for handler in list(self._handlers.get(channel, ())):
+                try:
+                    handler(message['data'])
+                except Exception:
+                    logger.exception("Pub/sub handler for %s failed", channel)
+
+
+listener = Listener()
@@ -0,0 +1,50 @@
+from django.db import connection
+
+from .models import LatestQuote
+
+QUOTE_FIELDS = ['ticker', 'open_price', 'close_price', 'high', 'low', 'volume', 'timestamp']
+
+
+def newest_per_ticker(bars):
+    """
+    Reduce a batch of bars to the newest bar for each ticker.
+    """
+    newest = {}
+    for bar in bars:
+        current = newest.get(bar.ticker)
+        if current is None or bar.timestamp >= current.timestamp:
+            newest[bar.ticker] = bar
+    return newest
+
+
+def update_latest_quotes(bars):
+    """
+    Upsert the latest quote for every ticker in ``bars``.
+
+    A single INSERT ... ON CONFLICT statement is used, and an existing quote
+    is only replaced when the incoming bar is at least as recent, so
+    concurrent or out-of-order ingests can never move a quote backwards.
+    """
+    newest = newest_per_ticker(bars)
+    if not newest:
+        return
+
+    fields = [LatestQuote._meta.get_field(name) for name in QUOTE_FIELDS]
+    quote = connection.ops.quote_name
+    table = quote(LatestQuote._meta.db_table)
+    columns = ', '.join(quote(field.column) for field in fields)
+    placeholders = ', '.join(['(' + ', '.join(['%s'] * len(fields)) + ')'] * len(newest))
+    updates = ', '.join(
+        f"{quote(field.column)} = excluded.{quote(field.column)}" for field in fields if not field.primary_key
+    )
+    params = [
+        field.get_db_prep_save(getattr(bar, field.name), connection)
+        for bar in newest.values() for field in fields
+    ]
+    sql = (
+        f"INSERT INTO {table} ({columns}) VALUES {placeholders} "
+        f"ON CONFLICT ({quote('ticker')}) DO UPDATE SET {updates} "
+        f"WHERE {table}.{quote('timestamp')} <= excluded.{quote('timestamp')}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
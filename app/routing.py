@@ -0,0 +1,42 @@
+from django.conf import settings
+
+TRANSACTION_QUEUE_PREFIX = getattr(settings, 'TRANSACTION_QUEUE_PREFIX', 'transactions')
+
+
+def jump_consistent_hash(key, num_buckets):
+    """
+    Map an integer key onto one of ``num_buckets`` buckets.
+
+    Implements Lamping & Veach's jump consistent hash: when the bucket
+    count changes from N to N+1 only about 1/(N+1) of the keys move, so
+    adding a shard does not reshuffle every user.
+    """
+    bucket, jump = -1, 0
+    key &= 0xFFFFFFFFFFFFFFFF
+    while jump < num_buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_count():
+    return max(1, int(getattr(settings, 'TRANSACTION_SHARDS', 1)))
+
+
+def shard_for_user(user_id):
+    return jump_consistent_hash(int(user_id), shard_count())
+
+
+def queue_for_user(user_id):
+    """
+    Name of the Celery queue that owns a user's transactions.
+
+    Each queue is consumed by a single worker process, so a user's orders
+    are processed one at a time and in the order they were submitted.
+    """
+    return f"{TRANSACTION_QUEUE_PREFIX}.{shard_for_user(user_id)}"
+
+
+def transaction_queues():
+    return [f"{TRANSACTION_QUEUE_PREFIX}.{shard}" for shard in range(shard_count())]
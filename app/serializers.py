@@ -1,6 +1,6 @@
 
 from rest_framework import serializers
-from .models import User, StockData, Transaction
+from .models import User, StockData, LatestQuote, Transaction
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -12,6 +12,11 @@ class StockDataSerializer(serializers.ModelSerializer):
         model = StockData
         fields = ['ticker', 'open_price', 'close_price', 'high', 'low', 'volume', 'timestamp']
 
+class LatestQuoteSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LatestQuote
+        fields = ['ticker', 'open_price', 'close_price', 'high', 'low', 'volume', 'timestamp']
+
 class TransactionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Transaction
@@ -0,0 +1,66 @@
+from django.db import transaction as db_transaction
+from django.db.models.signals import post_save
+from django.dispatch import Signal, receiver
+
+from .models import StockData
+
+# Sent with ``bars`` (a list of StockData instances) whenever new bars are
+# stored, whether one at a time or through bulk ingestion.
+bars_ingested = Signal()
+
+
+@receiver(post_save, sender=StockData)
+def stock_data_saved(sender, instance, created, **kwargs):
+    if created:
+        bars_ingested.send(sender=StockData, bars=[instance])
+
+
+@receiver(bars_ingested)
+def refresh_latest_quotes(sender, bars, **kwargs):
+    from .quotes import update_latest_quotes
+    update_latest_quotes(bars)
+
+
+@receiver(bars_ingested)
+def invalidate_stock_cache(sender, bars, **kwargs):
+    from .caching import invalidate
+    # one round trip per batch, after commit so a reader cannot rebuild the
+    # entries from the old rows in between; entries go stale rather than
+    # missing so a burst of readers does not rebuild them all at once
+    keys = ["all_stocks", *[f"stock_{ticker}" for ticker in {bar.ticker for bar in bars}]]
+    db_transaction.on_commit(lambda: invalidate(*keys))
+
+
+@receiver(bars_ingested)
+def publish_quote_stream(sender, bars, **kwargs):
+    from .streaming import publish_bars
+    publish_bars(bars)
+
+
+@receiver(bars_ingested)
+def update_price_table(sender, bars, **kwargs):
+    from .prices import price_table
+    from .quotes import newest_per_ticker
+    # other processes learn of the new prices through the quote stream
+    quotes = [(bar.ticker, bar.close_price, bar.timestamp) for bar in newest_per_ticker(bars).values()]
+    db_transaction.on_commit(lambda: price_table.update(quotes))
+
+
+@receiver(bars_ingested)
+def append_bar_store(sender, bars, **kwargs):
+    from .barstore import bar_store
+    if bar_store.enabled:
+        # after commit, so a concurrent rebuild can tell these bars apart
+        db_transaction.on_commit(lambda: bar_store.append(bars))
+
+
+@receiver(bars_ingested)
+def advance_indicators(sender, bars, **kwargs):
+    from .indicators import update
+    db_transaction.on_commit(lambda: update(bars))
+
+
+@receiver(bars_ingested)
+def rank_movers(sender, bars, **kwargs):
+    from . import movers
+    db_transaction.on_commit(lambda: movers.update(bars))
@@ -0,0 +1,250 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from rest_framework import serializers
+
+from . import pubsub
+from .quotes import newest_per_ticker
+
+logger = logging.getLogger(__name__)
+
+QUOTE_CHANNEL = "quote-stream"
+
+# frames a slow client may fall behind by before it is disconnected
+CLIENT_QUEUE_SIZE = getattr(settings, 'QUOTE_STREAM_QUEUE_SIZE', 256)
+
+STREAM_EVENTS = ("bar", "quote")
+
+# a bar travels as [ticker, timestamp, open, high, low, close, volume]
+BAR_FIELDS = ('ticker', 'timestamp', 'open_price', 'high', 'low', 'close_price', 'volume')
+
+# seconds a ticker stays registered as streamed after its hub last renewed it
+STREAMED_TICKER_TTL = 60
+
+# how long a publishing process reuses its copy of the streamed tickers
+STREAMED_TICKERS_REFRESH = 1.0
+
+_timestamp = serializers.DateTimeField().to_representation
+_price = serializers.DecimalField(max_digits=10, decimal_places=2).to_representation
+
+_streamed = {"tickers": None, "until": 0.0}
+
+
+def streamed_key():
+    # ticker -> expiry (epoch seconds), renewed by every hub streaming it
+    return cache.make_key("quote_stream_tickers")
+
+
+def pack_bar(bar):
+    """
+    A bar as a compact list, formatted as StockDataSerializer would.
+    """
+    return [bar.ticker, _timestamp(bar.timestamp), _price(bar.open_price), _price(bar.high),
+            _price(bar.low), _price(bar.close_price), int(bar.volume)]
+
+
+def unpack_bar(packed):
+    return dict(zip(BAR_FIELDS, packed))
+
+
+def streamed_tickers():
+    """
+    Tickers some open stream follows, or None if that is unknown.
+    """
+    now = time.monotonic()
+    if now >= _streamed["until"]:
+        try:
+            members = get_redis_connection("default").zrangebyscore(streamed_key(), time.time(), '+inf')
+            _streamed["tickers"] = {member.decode() for member in members}
+        except RedisError:
+            logger.warning("Could not read the streamed tickers", exc_info=True)
+            _streamed["tickers"] = None
+        _streamed["until"] = now + STREAMED_TICKERS_REFRESH
+    return _streamed["tickers"]
+
+
+def publish_bars(bars):
+    """
+    Announce newly stored bars to every web process once the transaction commits.
+
+    One message is published per ingest batch. It carries the newest bar per
+    ticker (the ``quote`` events) and, for tickers an open stream follows,
+    every bar (the ``bar`` events), packed as lists rather than serialized
+    records.
+    """
+    if not bars:
+        return
+
+    def publish():
+        message = {"quotes": [pack_bar(bar) for bar in newest_per_ticker(bars).values()]}
+        streamed = streamed_tickers()
+        followed = [pack_bar(bar) for bar in bars if streamed is None or bar.ticker in streamed]
+        if followed:
+            message["bars"] = followed
+        pubsub.publish(QUOTE_CHANNEL, json.dumps(message, separators=(',', ':')))
+
+    db_transaction.on_commit(publish)
+
+
+def format_event(event, data):
+    """
+    Encode one Server-Sent Events frame.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+class StreamClient:
+    """
+    One open stream: the tickers and event types it wants, and a bounded
+    queue of encoded frames owned by its event loop.
+    """
+
+    def __init__(self, tickers, events, loop):
+        self.tickers = frozenset(tickers)
+        self.events = frozenset(events)
+        self.loop = loop
+        self.queue = asyncio.Queue(CLIENT_QUEUE_SIZE)
+        self.closed = False
+
+    def put(self, frame):
+        # runs on the client's event loop
+        if self.closed:
+            return
+        if self.queue.full():
+            # a client that cannot keep up is dropped rather than buffered
+            # without bound; EventSource reconnects and refetches
+            self.closed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return
+        self.queue.put_nowait(frame)
+
+
+class QuoteHub:
+    """
+    Fans quote-stream messages out to the streams open in this process.
+
+    The process holds a single Redis subscription (the shared pub/sub
+    listener); each message is decoded and each frame encoded once, then
+    handed to every interested stream with one thread-safe callback per
+    event loop.
+    """
+
+    def __init__(self):
+        self._clients = {}  # ticker -> set of StreamClient
+        self._lock = threading.Lock()
+        self._subscribed = False
+        self._renew_at = 0.0
+
+    def _ensure_subscribed(self):
+        with self._lock:
+            if self._subscribed:
+                return
+            self._subscribed = True
+        pubsub.listener.subscribe(QUOTE_CHANNEL, self._dispatch, on_reconnect=self._resync)
+
+    async def connect(self, tickers, events=STREAM_EVENTS):
+        """
+        Open a stream for ``tickers`` on the running event loop.
+        """
+        if not self._subscribed:
+            # the first subscription waits for Redis to confirm; keep it off the loop
+            await sync_to_async(self._ensure_subscribed, thread_sensitive=False)()
+        client = StreamClient(tickers, events, asyncio.get_running_loop())
+        with self._lock:
+            added = [ticker for ticker in client.tickers if ticker not in self._clients]
+            for ticker in client.tickers:
+                self._clients.setdefault(ticker, set()).add(client)
+        if added:
+            # publishers only include bars for registered tickers
+            await sync_to_async(self._register, thread_sensitive=False)(added)
+        return client
+
+    async def renew(self):
+        """
+        Keep this process's tickers registered as streamed; cheap when not due.
+        """
+        if time.monotonic() >= self._renew_at:
+            self._renew_at = time.monotonic() + STREAMED_TICKER_TTL / 3
+            with self._lock:
+                tickers = list(self._clients)
+            if tickers:
+                await sync_to_async(self._register, thread_sensitive=False)(tickers)
+
+    @staticmethod
+    def _register(tickers):
+        now = time.time()
+        try:
+            pipe = get_redis_connection("default").pipeline()
+            pipe.zremrangebyscore(streamed_key(), '-inf', now)
+            pipe.zadd(streamed_key(), {ticker: now + STREAMED_TICKER_TTL for ticker in tickers}, gt=True)
+            pipe.execute()
+        except RedisError:
+            logger.warning("Could not register streamed tickers", exc_info=True)
+        # publishers in this process see the new tickers straight away
+        _streamed["until"] = 0.0
+
+    def disconnect(self, client):
+        client.closed = True
+        with self._lock:
+            for ticker in client.tickers:
+                clients = self._clients.get(ticker)
+                if clients is not None:
+                    clients.discard(client)
+                    if not clients:
+                        del self._clients[ticker]
+
+    def client_count(self):
+        with self._lock:
+            return len({client for clients in self._clients.values() for client in clients})
+
+    def _dispatch(self, payload):
+        # runs on the pub/sub listener thread
+        message = json.loads(payload)
+        deliveries = {}  # loop -> [(client, frame)]
+        with self._lock:
+            for event, key in (("bar", "bars"), ("quote", "quotes")):
+                for packed in message.get(key, ()):
+                    clients = self._clients.get(packed[0])
+                    if not clients:
+                        continue
+                    frame = format_event(event, unpack_bar(packed))
+                    for client in clients:
+                        if event in client.events:
+                            deliveries.setdefault(client.loop, []).append((client, frame))
+        self._deliver(deliveries)
+
+    def _resync(self):
+        # messages published while disconnected are lost; tell clients to refetch
+        frame = format_event("resync", {})
+        deliveries = {}
+        with self._lock:
+            for client in {client for clients in self._clients.values() for client in clients}:
+                deliveries.setdefault(client.loop, []).append((client, frame))
+        self._deliver(deliveries)
+
+    @staticmethod
+    def _deliver(deliveries):
+        for loop, items in deliveries.items():
+            try:
+                loop.call_soon_threadsafe(_put_all, items)
+            except RuntimeError:
+                logger.debug("Dropping quote frames for a closed event loop")
+
+
+def _put_all(items):
+    for client, frame in items:
+        client.put(frame)
+
+
+hub = QuoteHub()
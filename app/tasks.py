@@ -1,12 +1,21 @@
+import time
+
 from celery import shared_task
-from django.core.cache import cache
-from django.db import transaction as db_transaction  # to avoid conflict with local transaction
-from .models import Transaction, User
+from django.conf import settings
+from django.db import connection, transaction as db_transaction  # to avoid conflict with local transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from .models import Holding, Transaction, User
+from .holdings import apply_fill, signed_volume, update_holding
+from .routing import queue_for_user
+from . import archive, caching, metrics, notifications, partitions
 
 @shared_task
 def process_transaction(transaction_id):
     """
     Process a transaction by updating the user's balance.
+
+    Used when TRANSACTION_PROCESSING_MODE is "task"; see
+    process_pending_batch for the batched alternative.
     
     Args:
         transaction_id (int): The ID of the transaction to be processed.
@@ -14,16 +23,31 @@ def process_transaction(transaction_id):
     Returns:
         str: Success or error message.
     """
+    started = time.perf_counter()
+    outcome = "error"
     try:
         # get the transaction by its ID
-        transaction = Transaction.objects.get(id=transaction_id)
+        transaction = Transaction.objects.select_related('user').get(id=transaction_id)
+        if transaction.status != 'pending':
+            # tasks can be delivered more than once; never apply an order twice
+            outcome = "skipped"
+            return f"Transaction {transaction_id} already {transaction.status}."
         user = transaction.user
         
-        # validate the transaction (check if the user has enough balance for a buy transaction)
-        if transaction.transaction_type == 'BUY' and user.balance < transaction.transaction_price:
+        # validate the transaction (a positive volume, and enough balance for a buy transaction)
+        if transaction.transaction_volume <= 0:
+            error = "transaction_volume must be positive."
+        elif transaction.transaction_type == 'BUY' and user.balance < transaction.transaction_price:
+            error = "Insufficient balance for the transaction."
+        else:
+            error = None
+        if error:
             transaction.status = "failed"
             transaction.save()
-            raise ValueError("Insufficient balance for the transaction.")
+            notifications.notify([transaction])
+            outcome = "failed"
+            metrics.observe_order_lag(transaction.timestamp, "task")
+            raise ValueError(error)
 
         # perform the transaction processing inside an atomic block for data consistency
         with db_transaction.atomic():
@@ -34,15 +58,199 @@ def process_transaction(transaction_id):
                 user.balance += transaction.transaction_price  # add amount for sell transaction
 
             user.save()
+            update_holding(user.id, transaction.ticker, transaction.transaction_type,
+                           transaction.transaction_volume, transaction.transaction_price)
             transaction.status = 'completed'
             transaction.save()
+            notifications.notify([transaction])  # sent once the block commits
 
         # delete the cache for user data to ensure updated balance is fetched next time
         cache_key = f"user_{user.username}"
-        cache.delete(cache_key)
-        
+        caching.delete(cache_key)  # also evicts every web process's local copy
+
+        outcome = "completed"
+        metrics.observe_order_lag(transaction.timestamp, "task")
         return f"Transaction {transaction_id} processed successfully."
 
     except Exception as e:
         # handle any errors during processing and return error message
         return f"Error processing transaction {transaction_id}: {str(e)}"
+    finally:
+        metrics.TRANSACTION_DURATION.observe(time.perf_counter() - started)
+        metrics.TRANSACTION_OUTCOMES.labels(outcome).inc()
+
+
+def batch_mode():
+    return getattr(settings, 'TRANSACTION_PROCESSING_MODE', 'task') == 'batch'
+
+
+def enqueue_transaction(transaction):
+    """
+    Queue a single transaction on its user's shard.
+
+    Args:
+        transaction (Transaction): A saved, pending transaction.
+    """
+    if batch_mode():
+        return  # picked up by the process_transactions drainer
+    process_transaction.apply_async((transaction.id,), queue=queue_for_user(transaction.user_id))
+
+
+def enqueue_transactions(transactions, chunk_size=None):
+    """
+    Queue many transactions for processing in as few broker messages as possible.
+
+    Transactions are grouped by their user's shard queue, then each group is
+    split into chunks and every chunk is sent as a single message that runs
+    process_transaction for each id it holds, in submission order.
+
+    Args:
+        transactions (list): Saved, pending Transaction instances.
+        chunk_size (int): Transactions per message.
+    """
+    if batch_mode():
+        return  # picked up by the process_transactions drainer
+    chunk_size = chunk_size or getattr(settings, 'TRANSACTION_ENQUEUE_CHUNK_SIZE', 100)
+    by_queue = {}
+    for transaction in transactions:
+        by_queue.setdefault(queue_for_user(transaction.user_id), []).append((transaction.id,))
+    for queue, arguments in by_queue.items():
+        process_transaction.chunks(arguments, chunk_size).apply_async(queue=queue)
+
+
+def process_pending_batch(batch_size=500):
+    """
+    Process up to ``batch_size`` pending transactions in one database transaction.
+
+    Balance checks follow the same rules as process_transaction and are
+    applied to each user's orders in submission order. The writes are
+    aggregated instead of issued per order: one UPDATE applies every
+    user's net balance change as an F() expression, one upsert writes the
+    affected holdings, one UPDATE sets all statuses, and the affected
+    user_* cache keys are removed in a single delete_many.
+
+    Pending rows are claimed with SKIP LOCKED where supported, so several
+    drainers can run side by side.
+
+    Args:
+        batch_size (int): Maximum number of transactions to claim.
+
+    Returns:
+        int: Number of transactions processed.
+    """
+    with db_transaction.atomic():
+        pending = Transaction.objects.filter(status='pending').order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(skip_locked=True)
+        pending = list(pending.values_list(
+            'id', 'user_id', 'ticker', 'transaction_type', 'transaction_volume', 'transaction_price', 'timestamp'
+        )[:batch_size])
+        if not pending:
+            return 0
+
+        user_ids = sorted({row[1] for row in pending})
+        # lock users in id order so concurrent drainers cannot deadlock
+        users = User.objects.select_for_update().filter(id__in=user_ids).order_by('id')
+        balances = {}
+        usernames = {}
+        for user_id, username, balance in users.values_list('id', 'username', 'balance'):
+            balances[user_id] = balance
+            usernames[user_id] = username
+        starting = dict(balances)
+
+        tickers = {row[2] for row in pending}
+        holdings = {
+            (holding.user_id, holding.ticker): holding
+            for holding in Holding.objects.select_for_update().filter(user_id__in=user_ids, ticker__in=tickers)
+        }
+        touched = {}
+
+        failed = []
+        for transaction_id, user_id, ticker, transaction_type, volume, price, _ in pending:
+            if volume <= 0:
+                # cannot be applied to a position; failing it keeps the drainer moving
+                failed.append(transaction_id)
+                continue
+            if transaction_type == 'BUY':
+                if balances[user_id] < price:
+                    failed.append(transaction_id)
+                    continue
+                balances[user_id] -= price
+            elif transaction_type == 'SELL':
+                balances[user_id] += price
+            holding = holdings.setdefault((user_id, ticker), Holding(user_id=user_id, ticker=ticker, quantity=0, cost_basis=0))
+            holding.quantity, holding.cost_basis = apply_fill(
+                holding.quantity, holding.cost_basis, signed_volume(transaction_type, volume), price
+            )
+            touched[(user_id, ticker)] = holding
+
+        deltas = {user_id: balances[user_id] - starting[user_id]
+                  for user_id in user_ids if balances[user_id] != starting[user_id]}
+        if deltas:
+            User.objects.filter(id__in=deltas).update(balance=F('balance') + Case(
+                *[When(id=user_id, then=Value(delta)) for user_id, delta in deltas.items()],
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            ))
+
+        if touched:
+            Holding.objects.bulk_create(
+                touched.values(), update_conflicts=True, unique_fields=['user', 'ticker'],
+                update_fields=['quantity', 'cost_basis', 'updated_at'],
+            )
+
+        Transaction.objects.filter(id__in=[row[0] for row in pending]).update(status=Case(
+            When(id__in=failed, then=Value('failed')),
+            default=Value('completed'),
+        ))
+        failed_ids = set(failed)
+        notifications.notify([
+            Transaction(id=row[0], user_id=row[1], ticker=row[2], transaction_type=row[3],
+                        transaction_volume=row[4], transaction_price=row[5], timestamp=row[6],
+                        status='failed' if row[0] in failed_ids else 'completed')
+            for row in pending
+        ])
+
+    caching.delete(*[f"user_{usernames[user_id]}" for user_id in user_ids])
+    for row in pending:
+        metrics.observe_order_lag(row[6], "batch")
+    return len(pending)
+
+
+@shared_task
+def process_pending_transactions(batch_size=500):
+    """
+    Drain pending transactions in batches until fewer than a full batch remain.
+
+    Returns:
+        int: Total number of transactions processed.
+    """
+    total = 0
+    while True:
+        processed = process_pending_batch(batch_size)
+        total += processed
+        if processed < batch_size:
+            return total
+
+
+@shared_task
+def ensure_partitions():
+    """
+    Create the coming months' partitions ahead of the rows that need them
+    (PostgreSQL only; see app/partitions.py).
+
+    Returns:
+        list: Names of the partitions created.
+    """
+    return partitions.ensure_partitions(connection, getattr(settings, 'PARTITION_MONTHS_AHEAD', 3))
+
+
+@shared_task
+def archive_expired_partitions():
+    """
+    Move months past ARCHIVE_RETENTION_MONTHS to compressed files in
+    ARCHIVE_DIR (see app/archive.py).
+
+    Returns:
+        dict: Table name -> rows archived.
+    """
+    return archive.archive_expired()
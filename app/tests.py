@@ -1,12 +1,42 @@
-from django.test import TestCase
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import TestCase, RequestFactory, override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils.dateparse import parse_datetime
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from io import StringIO
+from prometheus_client import REGISTRY
+from redis.exceptions import ConnectionError as RedisConnectionError
+from rest_framework.response import Response
+import asyncio
+import threading
+import time
+from unittest import mock
+import json
+import os
+import tempfile
+from datetime import datetime, timezone as dt_timezone
+from contextlib import contextmanager
+import zlib
 from rest_framework.test import APIClient
 from rest_framework import status
-from app.tasks import process_transaction
-from .models import User, StockData, Transaction
+from app.tasks import process_transaction, process_pending_batch
+from app import admission, archive, benchmarks, caching, notifications, partitions, profiling, streaming
+from app.admission import admission_control
+from app.barstore import bar_store
+from app.prices import price_table
+from app.routing import jump_consistent_hash, queue_for_user
+from .models import User, StockData, LatestQuote, Transaction, Holding
 
 class APITestCase(TestCase):
     def setUp(self):
         self.client = APIClient()  # Initialize the API client for testing
+        caching.local_cache.clear()  # Don't carry in-process cache entries between tests
+        price_table.clear()  # Or prices from another test's quotes
+        admission_control.clear()  # Or a load measured by another test
+        cache.delete_pattern("order_rate_*")  # Redis outlives the test database, so do rate limits
         
         # Create a test user with a balance of 10,000.00
         self.user = User.objects.create(username='testuser', balance=10000.00)
@@ -16,6 +46,18 @@ class APITestCase(TestCase):
             ticker='AAPL', open_price=150.00, close_price=155.00,
             high=160.00, low=145.00, volume=1000, timestamp='2025-01-01T10:00:00Z'
         )
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries):
+        """
+        Fail if the block runs more than ``max_queries`` SQL statements.
+        """
+        with profiling.track_queries() as stats:
+            yield stats
+        self.assertLessEqual(
+            stats.count, max_queries,
+            f"{stats.count} queries, budget {max_queries}:\n" + "\n".join(stats.statements)
+        )
         
     def test_create_user(self):
         """
@@ -107,3 +149,891 @@ class APITestCase(TestCase):
         response = self.client.get(f'/api/transactions/{self.user.id}/?start_timestamp=2025-01-01T00:00:00Z&end_timestamp=2025-01-02T00:00:00Z')
         self.assertEqual(response.status_code, status.HTTP_200_OK)  # Check if transactions are retrieved
         self.assertEqual(len(response.data), 1)  # Verify 1 transaction is returned within the date range
+
+    def test_bulk_ingest_csv(self):
+        """
+        Test bulk loading bars from a raw CSV body, with bad rows rejected.
+        """
+        body = (
+            "ticker,open_price,close_price,high,low,volume,timestamp\n"
+            "MSFT,400.00,401.50,402.00,399.00,1200,2025-01-01T10:00:00Z\n"
+            "MSFT,401.50,403.00,404.00,401.00,900,2025-01-01T10:01:00Z\n"
+            "MSFT,not-a-price,403.00,404.00,401.00,900,2025-01-01T10:02:00Z\n"
+        )
+        response = self.client.post('/api/stocks/bulk/?batch_size=2', body, content_type='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)  # Check valid rows were stored
+        self.assertEqual(response.data['inserted'], 2)
+        self.assertEqual(response.data['rejected'], 1)
+        self.assertEqual(response.data['errors'][0]['line'], 4)  # Header is line 1
+        self.assertEqual(response.data['batches'], 2)
+        self.assertEqual(StockData.objects.filter(ticker='MSFT').count(), 2)
+
+    def test_bulk_ingest_ndjson_upload(self):
+        """
+        Test bulk loading bars from an NDJSON file upload.
+        """
+        upload = SimpleUploadedFile('bars.ndjson', (
+            b'{"ticker": "TSLA", "open_price": "250.00", "close_price": "252.00", "high": "253.00", '
+            b'"low": "249.00", "volume": 300, "timestamp": "2025-01-01T10:00:00Z"}\n'
+            b'not json\n'
+            b'{"ticker": "TS\xe9", "open_price": "250.00", "close_price": "252.00", "high": "253.00", '
+            b'"low": "249.00", "volume": 300, "timestamp": "2025-01-01T10:01:00Z"}\n'  # Latin-1, not UTF-8
+        ))
+        response = self.client.post('/api/stocks/bulk/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['inserted'], 1)
+        self.assertEqual(response.data['rejected'], 2)
+        self.assertEqual(response.data['errors'][1]['errors'], {'ticker': ['Not valid UTF-8 text.']})
+
+        upload = SimpleUploadedFile('bars.ndjson', (
+            b'{"ticker": "TSLA", "open_price": "250.00", "close_price": "252.00", "high": "253.00", '
+            b'"low": "249.00", "volume": 300, "timestamp": 1700000000}\n'  # Epoch seconds, not ISO 8601
+            b'{"ticker": "TSLA", "open_price": "250.00", "close_price": "252.00", "high": "253.00", '
+            b'"low": "249.00", "volume": 300.5, "timestamp": "2025-01-01T10:02:00Z"}\n'
+        ))
+        response = self.client.post('/api/stocks/bulk/', {'file': upload}, format='multipart')
+        self.assertEqual((response.data['inserted'], response.data['rejected']), (0, 2))
+        self.assertEqual([[*row['errors']] for row in response.data['errors']], [['timestamp'], ['volume']])
+
+    def test_ingest_bars_command(self):
+        """
+        Test the ingest_bars management command loads a CSV file.
+        """
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as f:
+            f.write("ticker,open_price,close_price,high,low,volume,timestamp\n"
+                    "NVDA,130.00,131.00,132.00,129.00,5000,2025-01-01T10:00:00Z\n")
+            f.flush()
+            out = StringIO()
+            call_command('ingest_bars', f.name, stdout=out)
+        self.assertIn('Inserted 1 of 1 rows', out.getvalue())
+        self.assertTrue(StockData.objects.filter(ticker='NVDA').exists())
+
+    def test_latest_quote_tracks_newest_bar(self):
+        """
+        Test the latest quote follows the newest bar and ignores older ones.
+        """
+        with self.captureOnCommitCallbacks(execute=True):  # Cached quotes are invalidated on commit
+            StockData.objects.create(
+                ticker='AAPL', open_price=155.00, close_price=158.00,
+                high=159.00, low=154.00, volume=800, timestamp='2025-01-01T11:00:00Z'
+            )
+            StockData.objects.create(  # Late-arriving older bar must not win
+                ticker='AAPL', open_price=140.00, close_price=141.00,
+                high=142.00, low=139.00, volume=10, timestamp='2025-01-01T09:00:00Z'
+            )
+        self.assertEqual(LatestQuote.objects.get(ticker='AAPL').close_price, 158)
+
+        response = self.client.get('/api/stocks/AAPL/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['close_price'], '158.00')
+
+        response = self.client.post('/api/transactions/', {
+            'user': self.user.id, 'ticker': 'AAPL', 'transaction_type': 'BUY', 'transaction_volume': 2
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['transaction_price'], '316.00')  # Priced off the newest close
+
+    def test_bulk_ingest_updates_latest_quote(self):
+        """
+        Test bulk ingestion refreshes the latest quote once per ticker.
+        """
+        body = (
+            "ticker,open_price,close_price,high,low,volume,timestamp\n"
+            "AAPL,155.00,156.00,157.00,154.00,100,2025-01-01T10:01:00Z\n"
+            "AAPL,156.00,157.50,158.00,155.00,100,2025-01-01T10:02:00Z\n"
+        )
+        self.client.post('/api/stocks/bulk/', body, content_type='text/csv')
+        quote = LatestQuote.objects.get(ticker='AAPL')
+        self.assertEqual(str(quote.close_price), '157.50')
+
+    def test_stock_bars_resampling(self):
+        """
+        Test rolling minute bars up into hourly candles.
+        """
+        for minute, (open_price, close_price, high, low) in enumerate([
+            (150.00, 151.00, 152.00, 149.00),
+            (151.00, 149.50, 151.50, 148.00),
+        ], start=30):
+            StockData.objects.create(
+                ticker='AAPL', open_price=open_price, close_price=close_price, high=high, low=low,
+                volume=100, timestamp=f'2025-01-01T10:{minute}:00Z'
+            )
+        StockData.objects.create(
+            ticker='AAPL', open_price=149.50, close_price=153.00, high=154.00, low=149.00,
+            volume=50, timestamp='2025-01-01T11:05:00Z'
+        )
+        response = self.client.get('/api/stocks/AAPL/bars/?interval=1h&start=2025-01-01T00:00:00Z')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        bars = response.data['bars']
+        self.assertEqual(len(bars), 2)  # 10:00 and 11:00 buckets
+        self.assertEqual(bars[0]['timestamp'], '2025-01-01T10:00:00Z')
+        self.assertEqual(bars[0]['open_price'], '150.00')  # From the setUp bar at 10:00
+        self.assertEqual(bars[0]['high'], '160.00')
+        self.assertEqual(bars[0]['low'], '145.00')
+        self.assertEqual(bars[0]['close_price'], '149.50')
+        self.assertEqual(bars[0]['volume'], 1200)
+        self.assertEqual(bars[1]['close_price'], '153.00')
+
+        response = self.client.get('/api/stocks/AAPL/bars/?interval=7x')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/stocks/AAPL/bars/?interval=99999999999999999999s')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)  # Would overflow int64 buckets
+
+    def test_batch_orders(self):
+        """
+        Test submitting a basket of orders with per-order results.
+        """
+        orders = [
+            {'user': self.user.id, 'ticker': 'AAPL', 'transaction_type': 'BUY', 'transaction_volume': 1},
+            {'user': self.user.id, 'ticker': 'NOPE', 'transaction_type': 'BUY', 'transaction_volume': 1},
+            {'user': 999999, 'ticker': 'AAPL', 'transaction_type': 'BUY', 'transaction_volume': 1},
+            {'user': self.user.id, 'ticker': 'AAPL', 'transaction_type': 'HOLD', 'transaction_volume': 1},
+            {'user': self.user.id, 'ticker': 'AAPL', 'transaction_type': 'SELL', 'transaction_volume': 2},
+            {'user': self.user.id, 'ticker': 'AAPL', 'transaction_type': 'BUY', 'transaction_volume': 10**9},
+        ]
+        response = self.client.post('/api/transactions/batch/', {'orders': orders}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        results = response.data['results']
+        self.assertEqual(results[0]['transaction']['transaction_price'], '155.00')
+        self.assertEqual(results[1]['error'], 'Stock not found')
+        self.assertEqual(results[2]['error'], 'User not found')
+        self.assertIn('transaction_type', results[3]['error'])
+        self.assertEqual(results[4]['transaction']['transaction_price'], '310.00')
+        self.assertEqual(results[5]['error'], 'Order value is too large.')  # Would not fit transaction_price
+        for result in (results[0], results[4]):
+            process_transaction(result['transaction']['id'])  # Simulate the queued tasks
+        self.user.refresh_from_db()
+        self.assertEqual(float(self.user.balance), 10000.00 - 155.00 + 310.00)  # Both orders processed
+
+    def test_batch_orders_constant_queries(self):
+        """
+        Test a batch costs the same number of queries however many orders it holds.
+        """
+        def count_queries(size):
+            orders = [{'user': self.user.id, 'ticker': 'AAPL', 'transaction_type': 'BUY', 'transaction_volume': 1}] * size
+            with mock.patch('app.orders.enqueue_transactions') as enqueue, \
+                    CaptureQueriesContext(connection) as queries:
+                self.client.post('/api/transactions/batch/', {'orders': orders}, format='json')
+            self.assertEqual(len(enqueue.call_args[0][0]), size)  # Every order enqueued in one call
+            return len(queries)
+
+        price_table.warm()  # Warming is a one-off query per process
+        with mock.patch.object(admission, 'ORDER_RATE_LIMIT', None):  # 100 orders for one user exceed a burst
+            self.assertEqual(count_queries(5), count_queries(100))
+
+    def test_transaction_routing_is_consistent(self):
+        """
+        Test orders are routed to a stable per-user shard queue.
+        """
+        with self.settings(TRANSACTION_SHARDS=4):
+            self.assertEqual(queue_for_user(self.user.id), queue_for_user(self.user.id))
+            self.assertTrue(queue_for_user(self.user.id).startswith('transactions.'))
+            with mock.patch('app.tasks.process_transaction.apply_async') as apply_async:
+                self.client.post('/api/transactions/', {
+                    'user': self.user.id, 'ticker': 'AAPL', 'transaction_type': 'BUY', 'transaction_volume': 1
+                })
+            self.assertEqual(apply_async.call_args.kwargs['queue'], queue_for_user(self.user.id))
+
+        # growing from 4 to 5 shards only moves about a fifth of the users
+        moved = sum(jump_consistent_hash(key, 4) != jump_consistent_hash(key, 5) for key in range(10000))
+        self.assertLess(moved, 2500)
+
+    def test_process_pending_batch(self):
+        """
+        Test the micro-batch processor applies orders in order with aggregated writes.
+        """
+        other = User.objects.create(username='other', balance=100.00)
+        buy = Transaction.objects.create(user=self.user, ticker='AAPL', transaction_type='BUY', transaction_volume=10, transaction_price=1550.00)
+        sell = Transaction.objects.create(user=self.user, ticker='AAPL', transaction_type='SELL', transaction_volume=2, transaction_price=310.00)
+        too_big = Transaction.objects.create(user=other, ticker='AAPL', transaction_type='BUY', transaction_volume=1, transaction_price=155.00)
+        fits = Transaction.objects.create(user=other, ticker='AAPL', transaction_type='SELL', transaction_volume=1, transaction_price=155.00)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(process_pending_batch(500), 4)
+        self.assertLessEqual(len(queries), 8)  # Fetch, lock users and holdings, three writes and savepoints
+
+        self.user.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(float(self.user.balance), 10000.00 - 1550.00 + 310.00)
+        self.assertEqual(float(other.balance), 255.00)  # Sell after the rejected buy still applies
+        statuses = dict(Transaction.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[buy.id], 'completed')
+        self.assertEqual(statuses[sell.id], 'completed')
+        self.assertEqual(statuses[too_big.id], 'failed')
+        self.assertEqual(statuses[fits.id], 'completed')
+        self.assertEqual(process_pending_batch(500), 0)  # Nothing left pending
+
+    def test_zero_volume_orders_fail_instead_of_stalling(self):
+        """
+        Test a non-positive volume is refused at intake and fails a stored order in both processing modes.
+        """
+        response = self.client.post('/api/transactions/', {'user': self.user.id, 'ticker': 'AAPL', 'transaction_type': 'BUY', 'transaction_volume': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post('/api/transactions/', {'user': self.user.id, 'ticker': 'AAPL', 'transaction_type': 'BUY', 'transaction_volume': 'ten'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Rows written before the check, or by other clients
+        task = Transaction.objects.create(user=self.user, ticker='AAPL', transaction_type='BUY', transaction_volume=0, transaction_price=0)
+        self.assertIn('must be positive', process_transaction(task.id))
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'failed')
+
+        bad = Transaction.objects.create(user=self.user, ticker='AAPL', transaction_type='SELL', transaction_volume=0, transaction_price=0)
+        good = Transaction.objects.create(user=self.user, ticker='AAPL', transaction_type='BUY', transaction_volume=1, transaction_price=155.00)
+        self.assertEqual(process_pending_batch(500), 2)
+        statuses = dict(Transaction.objects.values_list('id', 'status'))
+        self.assertEqual((statuses[bad.id], statuses[good.id]), ('failed', 'completed'))
+
+    def test_batch_mode_skips_per_order_tasks(self):
+        """
+        Test orders are left pending for the drainer in batch processing mode.
+        """
+        with self.settings(TRANSACTION_PROCESSING_MODE='batch'):
+            response = self.client.post('/api/transactions/', {
+                'user': self.user.id, 'ticker': 'AAPL', 'transaction_type': 'BUY', 'transaction_volume': 1
+            })
+        self.assertEqual(Transaction.objects.get(id=response.data['id']).status, 'pending')
+        call_command('process_transactions', '--once', stdout=StringIO())
+        self.assertEqual(Transaction.objects.get(id=response.data['id']).status, 'completed')
+
+    def test_transactions_keyset_pagination(self):
+        """
+        Test paging through a user's transactions with the Link header cursor.
+        """
+        for volume in range(1, 6):
+            Transaction.objects.create(user=self.user, ticker='AAPL', transaction_type='BUY', transaction_volume=volume, transaction_price=155.00 * volume, status='completed')
+
+        url = f'/api/transactions/{self.user.id}/?limit=2'
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data), 2)
+            seen.extend(row['id'] for row in response.data)
+            link = response.headers.get('Link')
+            url = link[1:link.index('>')] if link else None
+            if len(seen) == 2:  # A row inserted mid-pagination must not shift later pages
+                Transaction.objects.create(user=self.user, ticker='AAPL', transaction_type='SELL', transaction_volume=1, transaction_price=155.00)
+
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(seen, sorted(seen, reverse=True))  # Newest first, no duplicates
+
+        response = self.client.get(f'/api/transactions/{self.user.id}/?cursor=garbage')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_transactions_and_bars(self):
+        """
+        Test streaming exports of transactions and bar history.
+        """
+        Transaction.objects.create(user=self.user, ticker='AAPL', transaction_type='BUY', transaction_volume=10, transaction_price=1500.00, status='completed')
+        response = self.client.get(
+            f'/api/transactions/export/?user_id={self.user.id}&start_timestamp=2000-01-01T00:00:00Z&end_timestamp=2100-01-01T00:00:00Z'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'user_id', 'ticker'])
+        self.assertEqual(len(lines), 2)  # Header plus one transaction
+
+        response = self.client.get('/api/transactions/export/?start_timestamp=2000-01-01T00:00:00Z')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)  # Same filters as transactions_by_date
+        response = self.client.get('/api/transactions/export/?user_id=abc&start_timestamp=2000-01-01T00:00:00Z'
+                                   '&end_timestamp=2100-01-01T00:00:00Z')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get('/api/stocks/AAPL/export/?output=ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(rows[0]['close_price'], '155.00')
+
+    def test_cached_responses_etag_and_compression(self):
+        """
+        Test cached endpoints serve pre-rendered bytes with ETag/304 support.
+        """
+        first = self.client.get(f'/api/users/{self.user.username}/')
+        second = self.client.get(f'/api/users/{self.user.username}/')
+        self.assertEqual(first.content, second.content)  # Hit returns the stored bytes
+        self.assertEqual(second.json()['username'], 'testuser')
+        etag = second.headers['ETag']
+        response = self.client.get(f'/api/users/{self.user.username}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+        for minute in range(20):
+            StockData.objects.create(
+                ticker='AAPL', open_price=150.00, close_price=151.00, high=152.00, low=149.00,
+                volume=100, timestamp=f'2025-01-02T10:{minute:02d}:00Z'
+            )
+        response = self.client.get('/api/stocks/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.headers['Content-Encoding'], 'deflate')  # Large list stored compressed
+        self.assertEqual(len(json.loads(zlib.decompress(response.content))), 21)
+        response = self.client.get('/api/stocks/')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(len(response.json()), 21)
+
+        response = self.client.get('/api/users/nobody/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)  # Misses are not cached
+
+    def test_cache_single_flight_rebuild(self):
+        """
+        Test a burst of concurrent misses triggers exactly one rebuild.
+        """
+        builds = []
+
+        def build():
+            builds.append(1)
+            time.sleep(0.3)  # Slow query
+            return Response({'value': 42})
+
+        request = RequestFactory().get('/')
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                caching.cached_response(request, 'stampede_test', build, timeout=60).status_code
+            ))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(results, [200] * 8)
+
+    def test_cache_serves_stale_while_revalidating(self):
+        """
+        Test an invalidated entry is served stale while another worker holds the rebuild lock.
+        """
+        request = RequestFactory().get('/')
+        caching.cached_response(request, 'swr_test', lambda: Response({'version': 1}), timeout=60)
+        caching.invalidate('swr_test')
+        self.assertTrue(caching.needs_refresh(caching.get_entry('swr_test')))
+
+        lock = caching._redis().lock(f"{caching.cache.make_key('swr_test')}:lock", timeout=5)
+        self.assertTrue(lock.acquire(blocking=False))  # Another worker is rebuilding
+        try:
+            response = caching.cached_response(request, 'swr_test', lambda: Response({'version': 2}), timeout=60)
+            self.assertEqual(response.data, {'version': 1})
+        finally:
+            lock.release()
+
+        response = caching.cached_response(request, 'swr_test', lambda: Response({'version': 2}), timeout=60)
+        self.assertEqual(response.data, {'version': 2})  # Lock free again, so this request refreshes
+
+    def test_local_cache_tier_and_pubsub_eviction(self):
+        """
+        Test the in-process tier serves repeat reads and is evicted through pub/sub.
+        """
+        request = RequestFactory().get('/')
+        caching.cached_response(request, 'tier_test', lambda: Response({'v': 1}), timeout=60)
+        before = caching.cache_stats()
+        caching.cached_response(request, 'tier_test', lambda: Response({'v': 2}), timeout=60)
+        after = caching.cache_stats()
+        self.assertEqual(after['local']['hits'], before['local']['hits'] + 1)
+        self.assertEqual(after['redis']['hits'] + after['redis']['misses'],
+                         before['redis']['hits'] + before['redis']['misses'])  # No Redis round trip
+
+        # another process deletes the key and broadcasts the eviction
+        caching.cache.delete('tier_test')
+        caching.pubsub.publish(caching.INVALIDATION_CHANNEL, json.dumps({'origin': 'other-host:1', 'keys': ['tier_test']}))
+        deadline = time.monotonic() + 2
+        while caching.local_cache.get('tier_test') is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIsNone(caching.local_cache.get('tier_test'))
+        response = caching.cached_response(request, 'tier_test', lambda: Response({'v': 2}), timeout=60)
+        self.assertEqual(response.data, {'v': 2})
+
+    def test_holdings_and_portfolio(self):
+        """
+        Test holdings follow completed transactions and the portfolio is valued at latest prices.
+        """
+        for transaction_type, volume in [('BUY', 10), ('BUY', 10), ('SELL', 5)]:
+            response = self.client.post('/api/transactions/', {
+                'user': self.user.id, 'ticker': 'AAPL', 'transaction_type': transaction_type, 'transaction_volume': volume
+            })
+            process_transaction(response.data['id'])
+        holding = Holding.objects.get(user=self.user, ticker='AAPL')
+        self.assertEqual(holding.quantity, 15)
+        self.assertEqual(float(holding.cost_basis), 15 * 155.00)  # Average cost kept on a partial sell
+
+        StockData.objects.create(
+            ticker='AAPL', open_price=155.00, close_price=165.00,
+            high=166.00, low=154.00, volume=10, timestamp='2025-01-02T10:00:00Z'
+        )
+        response = self.client.get(f'/api/users/{self.user.username}/portfolio/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        position = response.data['positions'][0]
+        self.assertEqual(position['market_value'], '2475.00')
+        self.assertEqual(position['unrealized_pnl'], '150.00')
+        self.assertEqual(response.data['unrealized_pnl'], '150.00')
+
+    def test_batch_processor_updates_holdings(self):
+        """
+        Test the micro-batch processor maintains holdings like the per-order task.
+        """
+        Transaction.objects.create(user=self.user, ticker='AAPL', transaction_type='BUY', transaction_volume=4, transaction_price=620.00)
+        Transaction.objects.create(user=self.user, ticker='AAPL', transaction_type='SELL', transaction_volume=1, transaction_price=160.00)
+        Transaction.objects.create(user=self.user, ticker='AAPL', transaction_type='BUY', transaction_volume=1000, transaction_price=155000.00)
+        process_pending_batch(500)
+        holding = Holding.objects.get(user=self.user, ticker='AAPL')
+        self.assertEqual(holding.quantity, 3)  # Failed buy is not applied
+        self.assertEqual(float(holding.cost_basis), 465.00)
+
+    def test_async_read_endpoints(self):
+        """
+        Test the async views return the same bodies and share cache entries with the sync views.
+        """
+        sync_response = self.client.get(f'/api/users/{self.user.username}/')
+        response = self.client.get(f'/api/async/users/{self.user.username}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, sync_response.content)  # Served from the entry the sync view stored
+        response = self.client.get(f'/api/async/users/{self.user.username}/', HTTP_IF_NONE_MATCH=sync_response.headers['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # A per-request loop (async views over WSGI) closes its Redis client as it ends
+        async def client():
+            return caching.async_redis()
+        closed = mock.AsyncMock()
+        with mock.patch.object(type(async_to_sync(client)()), 'aclose', closed):
+            first, second = async_to_sync(client)(), async_to_sync(client)()
+        self.assertIsNot(first, second)
+        self.assertEqual(closed.await_count, 2)
+        with override_settings(CACHES={'default': {'LOCATION': 'redis://a:1/2,redis://b:1/2', 'OPTIONS': {
+                'PASSWORD': 'secret', 'CONNECTION_POOL_KWARGS': {'max_connections': 5, 'connection_class': object, 'server': object()}}}}):
+            self.assertEqual(caching.async_redis_kwargs(), ('redis://a:1/2', {'password': 'secret', 'max_connections': 5}))
+        self.assertEqual(self.client.get('/api/async/users/nobody/').status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get(f'/api/async/stocks/{self.stock.ticker}/')
+        self.assertEqual(response.json()['close_price'], '155.00')
+        self.assertEqual(self.client.get('/api/async/stocks/NOPE/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(len(self.client.get('/api/async/stocks/').json()), 1)
+
+        for volume in range(1, 4):
+            Transaction.objects.create(user=self.user, ticker='AAPL', transaction_type='BUY', transaction_volume=volume, transaction_price=155.00 * volume, status='completed')
+        response = self.client.get(f'/api/async/transactions/{self.user.id}/?limit=2')
+        self.assertEqual([row['transaction_volume'] for row in response.json()], [3, 2])
+        link = response.headers['Link']
+        response = self.client.get(link[1:link.index('>')])
+        self.assertEqual([row['transaction_volume'] for row in response.json()], [1])
+        self.assertEqual(self.client.get(f'/api/async/transactions/{self.user.id}/?cursor=garbage').status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_quote_stream_pushes_ingested_bars(self):
+        """
+        Test the SSE stream delivers bars and quotes for subscribed tickers only.
+        """
+        response = await self.async_client.get('/api/async/stocks/stream/?tickers=AAPL')
+        self.assertEqual(response.headers['Content-Type'], 'text/event-stream')
+        frames = response.streaming_content.__aiter__()
+        self.assertTrue((await frames.__anext__()).startswith(b'retry:'))
+
+        def ingest():
+            with self.captureOnCommitCallbacks(execute=True):
+                for ticker in ('MSFT', 'AAPL'):
+                    StockData.objects.create(
+                        ticker=ticker, open_price=155.00, close_price=158.00, high=159.00,
+                        low=154.00, volume=300, timestamp='2025-01-01T11:00:00Z'
+                    )
+        await sync_to_async(ingest)()
+
+        bar = await asyncio.wait_for(frames.__anext__(), 5)
+        quote = await asyncio.wait_for(frames.__anext__(), 5)
+        self.assertTrue(bar.startswith(b'event: bar\n'))
+        self.assertTrue(quote.startswith(b'event: quote\n'))
+        data = json.loads(bar.decode().split('data: ', 1)[1])
+        self.assertEqual((data['ticker'], data['close_price']), ('AAPL', '158.00'))  # MSFT was not subscribed
+
+        # Bars of tickers no stream follows are left out of the message
+        def publish_msft():
+            with mock.patch.object(streaming.pubsub, 'publish') as publish, self.captureOnCommitCallbacks(execute=True):
+                streaming.publish_bars([StockData.objects.get(ticker='MSFT')])
+            return json.loads(publish.call_args.args[1])
+        message = await sync_to_async(publish_msft)()
+        self.assertEqual([quote[0] for quote in message['quotes']], ['MSFT'])
+        self.assertNotIn('bars', message)
+
+        response = await self.async_client.get('/api/async/stocks/stream/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_transaction_wait_long_poll(self):
+        """
+        Test waiting on an order returns once it is processed, without DB queries.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/transactions/', {'user': self.user.id, 'ticker': 'AAPL', 'transaction_type': 'BUY', 'transaction_volume': 2})
+        transaction_id = response.data['id']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/api/transactions/{transaction_id}/wait/?timeout=0')
+        self.assertEqual(response.json()['status'], 'pending')
+
+        def process():
+            time.sleep(0.3)
+            # a worker records the outcome; simulated here without its own DB connection
+            notifications.record_statuses([dict(response.json(), status='completed')])
+        worker = threading.Thread(target=process)
+        worker.start()
+        started = time.monotonic()
+        with self.assertNumQueries(0):
+            waited = self.client.get(f'/api/transactions/{transaction_id}/wait/?timeout=5')
+        worker.join()
+        self.assertEqual(waited.json()['status'], 'completed')
+        self.assertLess(time.monotonic() - started, 3)  # Woken by the notification, not the timeout
+
+        with self.captureOnCommitCallbacks(execute=True):
+            process_transaction(transaction_id)
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/api/transactions/{transaction_id}/wait/')
+        self.assertEqual(response.json()['transaction_price'], '310.00')
+
+        response = self.client.get('/api/transactions/999999/wait/?timeout=0')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_benchmark_seed_and_cases(self):
+        """
+        Test the benchmark suite seeds data and measures cases without errors.
+        """
+        benchmarks.seed(users=3, tickers=2, bars=50, transactions=20)
+        self.assertEqual(StockData.objects.count(), 50)
+        self.assertEqual(LatestQuote.objects.count(), 2)
+        self.assertEqual(Transaction.objects.filter(timestamp__lt=benchmarks.SEED_END).count(), 20)  # Seeded history, not now()
+
+        results = benchmarks.Bench().run(iterations=3, patterns=['users.*', 'stocks.retrieve', 'tasks.process_transaction'])
+        self.assertEqual(set(results), {'users.create', 'users.retrieve', 'users.portfolio', 'stocks.retrieve', 'tasks.process_transaction'})
+        for result in results.values():
+            self.assertEqual(result['errors'], 0)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+        changes = benchmarks.compare(results, {'users.create': dict(results['users.create'], p99_ms=results['users.create']['p99_ms'] * 2)})
+        self.assertEqual(changes['users.create']['p99_change_pct'], 100.0)
+
+    def test_prometheus_metrics(self):
+        """
+        Test request, cache and transaction metrics are exported on /metrics.
+        """
+        def sample(name, **labels):
+            return REGISTRY.get_sample_value(name, labels) or 0
+
+        requests_before = sample('stockflow_http_requests_total', method='GET', route='users-detail', status='200')
+        misses_before = sample('stockflow_cache_requests_total', tier='redis', family='user_*', outcome='miss')
+        hits_before = sample('stockflow_cache_requests_total', tier='local', family='user_*', outcome='hit')
+        completed_before = sample('stockflow_process_transaction_total', outcome='completed')
+
+        self.client.get(f'/api/users/{self.user.username}/')
+        self.client.get(f'/api/users/{self.user.username}/')
+        self.assertEqual(sample('stockflow_http_requests_total', method='GET', route='users-detail', status='200'), requests_before + 2)
+        self.assertGreater(sample('stockflow_cache_requests_total', tier='redis', family='user_*', outcome='miss'), misses_before)
+        self.assertEqual(sample('stockflow_cache_requests_total', tier='local', family='user_*', outcome='hit'), hits_before + 1)
+
+        transaction = Transaction.objects.create(user=self.user, ticker='AAPL', transaction_type='BUY', transaction_volume=1, transaction_price=155.00)
+        process_transaction(transaction.id)
+        self.assertEqual(sample('stockflow_process_transaction_total', outcome='completed'), completed_before + 1)
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertIn('stockflow_http_request_duration_seconds_bucket{le="0.005",method="GET",route="users-detail"}', body)
+        self.assertIn('stockflow_order_completion_lag_seconds_count{mode="task"}', body)
+        self.assertIn('stockflow_celery_queue_length', body)
+
+    def test_endpoint_query_budgets(self):
+        """
+        Test each endpoint stays within its SQL query budget.
+        """
+        for volume in range(1, 30):  # Enough rows to expose per-row queries
+            Transaction.objects.create(user=self.user, ticker='AAPL', transaction_type='BUY', transaction_volume=volume, transaction_price=155.00, status='completed')
+        window = 'start_timestamp=2000-01-01T00:00:00Z&end_timestamp=2100-01-01T00:00:00Z'
+        budgets = [
+            ('get', f'/api/users/{self.user.username}/', None, 1),
+            ('get', f'/api/users/{self.user.username}/portfolio/', None, 2),
+            ('get', '/api/stocks/', None, 1),
+            ('get', '/api/stocks/AAPL/', None, 1),
+            ('get', '/api/stocks/AAPL/bars/?interval=1h', None, 1),
+            ('get', f'/api/transactions/{self.user.id}/', None, 1),
+            ('get', f'/api/transactions/{self.user.id}/transactions_by_date/?{window}', None, 1),
+            ('post', '/api/users/', {'username': 'budget', 'balance': 10}, 2),
+            ('post', '/api/transactions/', {'user': self.user.id, 'ticker': 'AAPL', 'transaction_type': 'BUY', 'transaction_volume': 1}, 3),
+        ]
+        for method, url, data, budget in budgets:
+            with self.subTest(url=url), self.assertQueryBudget(budget):
+                response = getattr(self.client, method)(url, data)
+                self.assertLess(response.status_code, 400)
+
+        transaction = Transaction.objects.create(user=self.user, ticker='AAPL', transaction_type='SELL', transaction_volume=1, transaction_price=155.00)
+        with self.assertQueryBudget(10):  # Includes savepoints from the test transaction
+            process_transaction(transaction.id)
+
+    @override_settings(SQL_QUERY_BUDGETS={'users-detail': 0}, SQL_BUDGET_HEADERS=True, PROFILE_ON_DEMAND=True)
+    def test_sql_budget_middleware_and_profiler(self):
+        """
+        Test over-budget requests are flagged and X-Profile writes folded stacks.
+        """
+        with self.assertLogs('app.profiling', level='WARNING') as logs:
+            response = self.client.get(f'/api/users/{self.user.username}/')
+        self.assertEqual(response.headers['X-SQL-Queries'], '1')
+        self.assertIn('users-detail exceeded its SQL budget', logs.output[0])
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(PROFILE_OUTPUT_DIR=directory, PROFILE_INTERVAL_MS=1):
+            response = self.client.get('/api/stocks/AAPL/bars/?interval=1h', HTTP_X_PROFILE='1')
+            with open(response.headers['X-Profile-Output']) as f:
+                folded = f.read()
+        self.assertRegex(folded.splitlines()[0], r'^\S.*;.* \d+$')  # "outer;...;leaf count"
+
+    def test_price_table_prices_orders_without_db_reads(self):
+        """
+        Test orders are priced from the in-process table, which follows ingests and falls back when stale.
+        """
+        price_table.warm()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/transactions/', {'user': self.user.id, 'ticker': 'AAPL', 'transaction_type': 'BUY', 'transaction_volume': 2})
+        self.assertEqual(response.data['transaction_price'], '310.00')
+        self.assertFalse([q for q in queries if 'app_latestquote' in q['sql']])  # No quote read
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StockData.objects.create(ticker='AAPL', open_price=155.00, close_price=170.25, high=171.00,
+                                     low=154.00, volume=10, timestamp='2025-01-01T11:00:00Z')
+            StockData.objects.create(ticker='AAPL', open_price=150.00, close_price=1.00, high=151.00,
+                                     low=1.00, volume=10, timestamp='2025-01-01T09:00:00Z')  # Late bar
+        self.assertEqual(str(price_table.price('AAPL')), '170.25')
+
+        LatestQuote.objects.filter(ticker='AAPL').update(close_price=180.00)  # Changed behind the table's back
+        with mock.patch('app.prices.time.time', return_value=time.time() + price_table.max_age + 1):
+            self.assertEqual(str(price_table.price('AAPL')), '180.00')  # Stale entries are re-read
+        self.assertIsNone(price_table.price('NOPE'))
+
+    def test_archive_expired_months_with_read_through(self):
+        """
+        Test months past retention move to archive files and reads still return them.
+        """
+        march = datetime(2020, 3, 1, tzinfo=dt_timezone.utc)
+        for day in (2, 3, 4):
+            order = Transaction.objects.create(user=self.user, ticker='AAPL', transaction_type='BUY', transaction_volume=day, transaction_price=155.00 * day, status='completed')
+            Transaction.objects.filter(id=order.id).update(timestamp=march.replace(day=day))  # timestamp is auto_now_add
+        pending = Transaction.objects.create(user=self.user, ticker='AAPL', transaction_type='BUY', transaction_volume=1, transaction_price=155.00)
+        Transaction.objects.filter(id=pending.id).update(timestamp=march.replace(month=5))
+        Transaction.objects.create(user=self.user, ticker='AAPL', transaction_type='SELL', transaction_volume=1, transaction_price=155.00, status='completed')
+        for day in (2, 3):
+            StockData.objects.create(ticker='AAPL', open_price=100.00, close_price=101.50, high=102.00, low=99.00, volume=10, timestamp=march.replace(day=day))
+        # On PostgreSQL the March rows sit in the default partition until their month is created
+        self.assertEqual(partitions.create_partition(connection, 'app_transaction', march), connection.vendor == 'postgresql')
+
+        # Small chunks so a key's rows span several fetches
+        with tempfile.TemporaryDirectory() as directory, mock.patch('app.archive.ARCHIVE_DIR', directory), \
+                mock.patch('app.archive.ARCHIVE_CHUNK_SIZE', 2):
+            moved = archive.archive_expired(now=datetime(2027, 1, 15, tzinfo=dt_timezone.utc))
+            self.assertEqual(moved, {'app_transaction': 3, 'app_stockdata': 2})  # May 2020 still has a pending order
+            self.assertEqual(Transaction.objects.count(), 2)
+            self.assertEqual(StockData.objects.count(), 1)
+            self.assertEqual(archive.TRANSACTIONS.months(), [march])
+            self.assertEqual(archive.TRANSACTIONS.catalog()[march], {f'{self.user.id}.npz'})
+            with mock.patch('app.archive._load') as load:
+                # Keys and months without archived rows open no files
+                self.assertEqual(archive.archived_transactions(self.user.id + 1), [])
+                self.assertEqual(len(archive.BARS.select('AAPL', start=march.replace(month=4))['id']), 0)
+                load.assert_not_called()
+
+            url = f'/api/transactions/{self.user.id}/?limit=2'
+            seen = []
+            while url:
+                response = self.client.get(url)
+                seen.extend((row['id'], row['transaction_price']) for row in response.data)
+                link = response.headers.get('Link')
+                url = link[1:link.index('>')] if link else None
+            self.assertEqual(len(seen), 5)  # Database rows, then archived ones
+            self.assertEqual([pk for pk, _ in seen], sorted((pk for pk, _ in seen), reverse=True))
+            self.assertEqual(seen[-1][1], '310.00')
+
+            response = self.client.get(f'/api/transactions/{self.user.id}/transactions_by_date/?start_timestamp=2020-03-03T00:00:00Z&end_timestamp=2020-03-04T00:00:00Z')
+            self.assertEqual([row['transaction_volume'] for row in response.data], [4, 3])  # Inclusive end
+
+            response = self.client.get('/api/stocks/AAPL/bars/?interval=1d&start=2020-01-01T00:00:00Z')
+            self.assertEqual([bar['close_price'] for bar in response.data['bars']], ['101.50', '101.50', '155.00'])
+
+            response = self.client.get(f'/api/transactions/export/?user_id={self.user.id}&start_timestamp=2000-01-01T00:00:00Z&end_timestamp=2100-01-01T00:00:00Z')
+            lines = b''.join(response.streaming_content).decode().splitlines()
+            self.assertEqual(len(lines), 6)  # Header, three archived, two live
+            self.assertIn('2020-03-02T00:00:00+00:00', lines[1])
+            with mock.patch('app.archive._load', wraps=archive._load) as load:
+                rows = archive.TRANSACTIONS.iter_rows(['id', 'timestamp'])
+                load.assert_not_called()  # Months are loaded as the export reaches them
+                self.assertEqual(len([*rows]), 3)
+                self.assertEqual(load.call_count, 1)
+
+            self.assertEqual(archive.archive_expired(now=datetime(2027, 1, 15, tzinfo=dt_timezone.utc)), {'app_transaction': 0, 'app_stockdata': 0})
+
+    def test_bar_store_serves_and_follows_ingest(self):
+        """
+        Test the memory-mapped bar store matches the ORM path and stays in sync on ingest.
+        """
+        orm = self.client.get('/api/stocks/AAPL/bars/?interval=1m').data
+        with tempfile.TemporaryDirectory() as directory, override_settings(BAR_STORE_DIR=directory):
+            self.assertEqual(self.client.get('/api/stocks/AAPL/bars/?interval=1m').data, orm)  # Built from the database
+            path = bar_store.path('AAPL')
+            inode = os.stat(path).st_ino
+
+            newer = StockData(ticker='AAPL', open_price=155.00, close_price=156.25, high=157.00, low=154.00,
+                              volume=10, timestamp='2025-01-01T10:01:00Z')
+            with self.captureOnCommitCallbacks(execute=True):
+                newer.save()
+            bar_store.append([newer])  # Already stored: skipped
+            bars = bar_store.load('AAPL', start=parse_datetime('2025-01-01T10:00:30Z'))
+            self.assertEqual(bars['close_price'].tolist(), [156.25])
+            self.assertFalse(bars['close_price'].flags.owndata)  # A view of the mapped file
+            self.assertEqual(os.stat(path).st_ino, inode)  # Appended in place
+
+            with self.captureOnCommitCallbacks(execute=True):
+                StockData.objects.create(ticker='AAPL', open_price=150.00, close_price=151.00, high=152.00,
+                                         low=149.00, volume=10, timestamp='2025-01-01T09:59:00Z')  # Late bar
+            self.assertFalse(os.path.exists(path))  # Invalidated, rebuilt on the next read
+            self.assertEqual(bar_store.load('AAPL')['close_price'].tolist(), [151.00, 155.00, 156.25])
+            self.assertEqual(bar_store.load('NOPE')['close_price'].tolist(), [])
+
+    def test_indicators_update_incrementally(self):
+        """
+        Test cached indicator series advance on ingest to the values a full recompute gives.
+        """
+        from app import indicators
+        from app.timeseries import load_bars
+        invalidate = lambda: indicators.invalidate(indicators._redis(), 'IND')
+        invalidate()  # Redis outlives the test database
+        StockData.objects.bulk_create([
+            StockData(ticker='IND', open_price=100 + i % 7, close_price=100 + (i * 37) % 11, high=112, low=95,
+                      volume=100 + i, timestamp=f'2025-01-01T10:{i:02d}:00Z')
+            for i in range(30)
+        ])
+        url = '/api/stocks/IND/indicators/?window=5&limit=3'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.data['indicators']), ['sma', 'ema', 'vwap', 'rsi', 'bbands'])
+        self.assertEqual(len(response.data['indicators']['rsi']), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StockData.objects.create(ticker='IND', open_price=104, close_price=109, high=112, low=95,
+                                     volume=500, timestamp='2025-01-01T10:30:00Z')
+        with self.assertNumQueries(0):
+            data = self.client.get(url).data['indicators']  # Served from the advanced cache
+        bounded = self.client.get('/api/stocks/IND/indicators/?indicators=ema&window=5'
+                                  '&start=2025-01-01T10:10:00Z&end=2025-01-01T10:12:00Z').data['indicators']['ema']
+        self.assertEqual([point['timestamp'] for point in bounded], ['2025-01-01T10:10:00Z', '2025-01-01T10:11:00Z'])
+        with mock.patch('redis.client.Pipeline.get', side_effect=AssertionError):
+            self.client.get(url)  # Only the tail is read
+        for name, indicator in indicators.INDICATORS.items():
+            values, _ = indicator.compute(load_bars('IND'), 5)
+            self.assertEqual(data[name][-1]['timestamp'], '2025-01-01T10:30:00Z')
+            for field, expected in zip(indicator.fields, values[-1]):
+                self.assertAlmostEqual(data[name][-1][field], expected, places=4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StockData.objects.create(ticker='IND', open_price=104, close_price=109, high=112, low=95,
+                                     volume=500, timestamp='2025-01-01T09:00:00Z')  # Late bar
+        self.assertFalse(indicators._redis().exists(indicators._index_key('IND')))  # Recomputed on the next request
+        self.assertEqual(self.client.get('/api/stocks/IND/indicators/?indicators=sma,macd').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get('/api/stocks/NOPE/indicators/').status_code, status.HTTP_404_NOT_FOUND)
+        with mock.patch('app.indicators._redis', side_effect=RedisConnectionError), \
+                self.captureOnCommitCallbacks(execute=True):
+            StockData.objects.create(ticker='IND', open_price=104, close_price=109, high=112, low=95,
+                                     volume=500, timestamp='2025-01-01T10:31:00Z')  # Outage after commit: logged only
+        invalidate()
+
+    def test_movers_follow_ingest(self):
+        """
+        Test the movers rankings are built from the latest quotes and kept current on ingest.
+        """
+        from app import movers
+        movers.clear()  # Redis outlives the test database
+        for ticker, close, volume in [('MSFT', 110.00, 500), ('TSLA', 90.00, 3000), ('NVDA', 101.00, 20)]:
+            StockData.objects.create(ticker=ticker, open_price=100.00, close_price=close, high=120.00, low=80.00,
+                                     volume=volume, timestamp='2025-01-01T10:00:00Z')
+        response = self.client.get('/api/stocks/movers/?n=2')
+        self.assertEqual([row['ticker'] for row in response.data['movers']], ['MSFT', 'AAPL'])  # Built from LatestQuote
+        self.assertEqual(response.data['movers'][0]['change_percent'], 10.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StockData.objects.create(ticker='NVDA', open_price=100.00, close_price=125.00, high=130.00, low=99.00,
+                                     volume=40, timestamp='2025-01-01T10:01:00Z')
+            StockData.objects.create(ticker='NVDA', open_price=100.00, close_price=50.00, high=130.00, low=40.00,
+                                     volume=40, timestamp='2025-01-01T09:59:00Z')  # Late bar: ignored
+        with self.assertNumQueries(0):
+            gainers = self.client.get('/api/stocks/movers/?by=change&n=20').data['movers']
+        self.assertEqual([row['ticker'] for row in gainers], ['NVDA', 'MSFT', 'AAPL', 'TSLA'])
+        self.assertEqual(gainers[0]['close_price'], '125.00')
+        losers = self.client.get('/api/stocks/movers/?order=asc&n=1').data['movers']
+        self.assertEqual(losers[0]['ticker'], 'TSLA')
+        volume = self.client.get('/api/stocks/movers/?by=volume&n=1').data['movers']
+        self.assertEqual(volume[0]['ticker'], 'TSLA')
+        self.assertEqual(self.client.get('/api/stocks/movers/?by=price').status_code, status.HTTP_400_BAD_REQUEST)
+        movers.clear()
+
+    def test_batch_quotes_share_cache_entries(self):
+        """
+        Test batch quotes read every ticker in one round trip and fill misses with one query.
+        """
+        StockData.objects.create(ticker='MSFT', open_price=300.00, close_price=305.00, high=310.00, low=295.00,
+                                 volume=500, timestamp='2025-01-01T10:00:00Z')
+        self.client.get('/api/stocks/AAPL/')  # Cached by retrieve
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/stocks/quotes/?tickers=MSFT,AAPL,NOPE,MSFT')
+        self.assertEqual(len(queries), 1)  # One IN query for the misses
+        data = json.loads(response.content)
+        self.assertEqual([quote['ticker'] for quote in data['quotes']], ['MSFT', 'AAPL'])
+        self.assertEqual(data['quotes'][0]['close_price'], '305.00')
+        self.assertEqual(data['missing'], ['NOPE'])
+
+        caching.local_cache.clear()
+        with self.assertNumQueries(0), mock.patch.object(caching, 'decode_entry', wraps=caching.decode_entry) as decode:
+            self.client.get('/api/stocks/quotes/?tickers=MSFT,AAPL')  # Both from one MGET
+        self.assertEqual(decode.call_count, 2)
+        self.assertEqual(json.loads(self.client.get('/api/stocks/MSFT/').content)['close_price'], '305.00')
+
+        with self.captureOnCommitCallbacks(execute=True):  # Marks the entry stale on commit
+            StockData.objects.create(ticker='MSFT', open_price=305.00, close_price=306.00, high=310.00,
+                                     low=295.00, volume=500, timestamp='2025-01-01T10:01:00Z')
+        data = json.loads(self.client.get('/api/stocks/quotes/?tickers=MSFT').content)
+        self.assertEqual(data['quotes'][0]['close_price'], '306.00')
+        self.assertEqual(self.client.get('/api/stocks/quotes/').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_order_admission_control(self):
+        """
+        Test order intake sheds batches, rejects when behind and rate-limits users, with Retry-After.
+        """
+        order = {'user': self.user.id, 'ticker': 'AAPL', 'transaction_type': 'BUY', 'transaction_volume': 1}
+        with mock.patch.object(admission, 'ORDER_RATE_LIMIT', 1), mock.patch.object(admission, 'ORDER_RATE_BURST', 3):
+            self.assertEqual(self.client.post('/api/transactions/', order).status_code, status.HTTP_201_CREATED)
+            response = self.client.post('/api/transactions/batch/', {'orders': [order] * 3}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)  # One token per order
+            self.assertEqual(response.data['reason'], 'rate_limited')
+            self.assertEqual(response['Retry-After'], '1')
+            response = self.client.post('/api/transactions/batch/', {'orders': [order] * 4}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)  # More than a full bucket
+            self.assertEqual(self.client.post('/api/transactions/batch/', {'orders': [order] * 2}, format='json').status_code,
+                             status.HTTP_201_CREATED)
+            response = self.client.post('/api/transactions/', order)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response.data['reason'], 'rate_limited')
+        cache.delete_pattern("order_rate_*")
+
+        # the oldest pending order is 20s old: past the shed ratio, within the limit
+        pending = Transaction.objects.filter(status='pending').first()
+        redis_client = caching._redis()
+        redis_client.zadd(notifications.pending_key(), {pending.id: time.time() - 20, 999999: time.time() - 60})
+        admission_control.clear()
+        response = self.client.post('/api/transactions/batch/', {'orders': [order]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response.data['reason'], 'shed')
+        self.assertFalse(redis_client.zscore(notifications.pending_key(), 999999))  # No longer pending: dropped
+        self.assertEqual(self.client.post('/api/transactions/', order).status_code, status.HTTP_201_CREATED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            process_transaction(pending.id)
+        self.assertIsNone(redis_client.zscore(notifications.pending_key(), pending.id))  # Final status recorded
+        admission_control.clear()
+        self.assertEqual(self.client.post('/api/transactions/batch/', {'orders': [order]}, format='json').status_code,
+                         status.HTTP_201_CREATED)
+
+        admission_control.clear()
+        with mock.patch('app.metrics.queue_lengths', return_value={queue_for_user(self.user.id): 20000}):
+            response = self.client.post('/api/transactions/', order)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response.data['reason'], 'overloaded')
+        self.assertEqual(response['Retry-After'], '5')
+        redis_client.delete(notifications.pending_key())
@@ -0,0 +1,171 @@
+import re
+
+import numpy as np
+
+from .archive import BARS
+from .barstore import bar_store
+from .models import StockData
+
+INTERVAL_UNITS = {
+    's': 1,
+    'm': 60,
+    'h': 3600,
+    'd': 86400,
+    'w': 604800,
+}
+
+# widest candle accepted; ten years of weeks
+MAX_INTERVAL = 520 * INTERVAL_UNITS['w']
+
+_interval_pattern = re.compile(r'^(\d+)([smhdw])$')
+
+BAR_COLUMNS = ['timestamp', 'open_price', 'high', 'low', 'close_price', 'volume']
+
+
+def parse_interval(value):
+    """
+    Convert an interval such as '5m', '1h' or '1d' to seconds.
+
+    Raises:
+        ValueError: If the interval is malformed, zero or wider than MAX_INTERVAL.
+    """
+    match = _interval_pattern.match(value or '')
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Invalid interval '{value}'. Use a number followed by s, m, h, d or w (e.g. 5m, 1h).")
+    step = int(match.group(1)) * INTERVAL_UNITS[match.group(2)]
+    if step > MAX_INTERVAL:
+        raise ValueError(f"Interval '{value}' is too wide; the maximum is {MAX_INTERVAL // INTERVAL_UNITS['w']}w.")
+    return step
+
+
+def load_bars(ticker, start=None, end=None):
+    """
+    Load a ticker's bars as NumPy columns ordered by time.
+
+    Served from the memory-mapped bar store when BAR_STORE_DIR is set,
+    otherwise queried with query_bars.
+
+    Returns:
+        dict: Column name -> array; timestamps are epoch seconds (int64).
+    """
+    if bar_store.enabled:
+        return bar_store.load(ticker, start, end)
+    return query_bars(ticker, start, end)
+
+
+def query_bars(ticker, start=None, end=None):
+    """
+    Load a ticker's bars from the database as NumPy columns ordered by time.
+
+    Rows are fetched with values_list so no model instances are built;
+    bars from archived months are read from their archive files and come
+    first, being older than anything left in the database.
+
+    Returns:
+        dict: Column name -> array; timestamps are epoch seconds (int64).
+    """
+    queryset = StockData.objects.filter(ticker=ticker)
+    if start is not None:
+        queryset = queryset.filter(timestamp__gte=start)
+    if end is not None:
+        queryset = queryset.filter(timestamp__lt=end)
+    rows = list(queryset.order_by('timestamp', 'id').values_list(*BAR_COLUMNS))
+
+    archived = archived_bars(ticker, start, end)
+    if not rows:
+        return archived
+    timestamps, opens, highs, lows, closes, volumes = zip(*rows)
+    bars = {
+        'timestamp': np.fromiter((int(ts.timestamp()) for ts in timestamps), dtype=np.int64, count=len(rows)),
+        'open_price': np.array(opens, dtype=np.float64),
+        'high': np.array(highs, dtype=np.float64),
+        'low': np.array(lows, dtype=np.float64),
+        'close_price': np.array(closes, dtype=np.float64),
+        'volume': np.array(volumes, dtype=np.int64),
+    }
+    if len(archived['timestamp']) == 0:
+        return bars
+    return {column: np.concatenate([archived[column], bars[column]]) for column in BAR_COLUMNS}
+
+
+def archived_bars(ticker, start=None, end=None):
+    """
+    A ticker's archived bars in load_bars' column format.
+    """
+    columns = BARS.select(ticker, start, end)
+    return {
+        'timestamp': columns['timestamp'] // 1_000_000,
+        'open_price': columns['open_price'] / 100,
+        'high': columns['high'] / 100,
+        'low': columns['low'] / 100,
+        'close_price': columns['close_price'] / 100,
+        'volume': columns['volume'],
+    }
+
+
+def empty_bars():
+    return {
+        column: np.empty(0, dtype=np.int64 if column in ('timestamp', 'volume') else np.float64)
+        for column in BAR_COLUMNS
+    }
+
+
+def resample(bars, step):
+    """
+    Roll time-ordered bars up into candles of ``step`` seconds.
+
+    Each candle takes the first open, highest high, lowest low, last close
+    and summed volume of the bars in its bucket. Buckets are aligned to the
+    Unix epoch, and empty buckets are omitted.
+
+    Args:
+        bars (dict): Columns as returned by load_bars.
+        step (int): Candle width in seconds.
+
+    Returns:
+        dict: Candle columns, plus 'count' with the number of source bars.
+    """
+    timestamps = bars['timestamp']
+    if len(timestamps) == 0:
+        return dict(empty_bars(), count=np.empty(0, dtype=np.int64))
+
+    buckets = timestamps // step
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(timestamps)]
+
+    return {
+        'timestamp': buckets[starts] * step,
+        'open_price': bars['open_price'][starts],
+        'high': np.maximum.reduceat(bars['high'], starts),
+        'low': np.minimum.reduceat(bars['low'], starts),
+        'close_price': bars['close_price'][ends - 1],
+        'volume': np.add.reduceat(bars['volume'], starts),
+        'count': ends - starts,
+    }
+
+
+def candles_as_records(candles):
+    """
+    Convert candle columns into JSON-ready dicts matching StockData's field names.
+    """
+    timestamps = candles['timestamp'].astype('datetime64[s]').tolist()
+    return [
+        {
+            'timestamp': ts.isoformat() + 'Z',
+            'open_price': f"{open_price:.2f}",
+            'high': f"{high:.2f}",
+            'low': f"{low:.2f}",
+            'close_price': f"{close_price:.2f}",
+            'volume': volume,
+            'count': count,
+        }
+        for ts, open_price, high, low, close_price, volume, count in zip(
+            timestamps,
+            candles['open_price'].tolist(),
+            candles['high'].tolist(),
+            candles['low'].tolist(),
+            candles['close_price'].tolist(),
+            candles['volume'].tolist(),
+            candles['count'].tolist(),
+        )
+    ]
@@ -6,6 +6,8 @@ from drf_yasg.views import get_schema_view
 from rest_framework.permissions import AllowAny
 from drf_yasg import openapi
 from .views import UserViewSet, StockViewSet, TransactionViewSet
+from . import async_views
+from .metrics import metrics_view
 
 router = DefaultRouter()
 router.register('users',UserViewSet,basename='users')
@@ -27,7 +29,20 @@ schema_view = get_schema_view(
 )
 
 
+# async read endpoints; serve with an ASGI server (see README)
+async_urlpatterns = [
+    path('users/<str:username>/', async_views.user_detail, name='async-user-detail'),
+    path('stocks/', async_views.stock_list, name='async-stock-list'),
+    path('stocks/stream/', async_views.quote_stream, name='async-quote-stream'),
+    path('stocks/<str:ticker>/', async_views.stock_detail, name='async-stock-detail'),
+    path('transactions/<int:user_id>/', async_views.transaction_history, name='async-transaction-history'),
+]
+
+
 urlpatterns = [
+    path('api/async/',include(async_urlpatterns)),
+    path('api/transactions/<int:transaction_id>/wait/', async_views.transaction_wait, name='transaction-wait'),
     path('api/',include(router.urls)),
+    path('metrics', metrics_view, name='metrics'),
     path('docs/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui')
 ]
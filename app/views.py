@@ -1,15 +1,76 @@
+from datetime import timedelta
+
 from rest_framework import viewsets, status
 from rest_framework.response import Response
-from django.core.cache import cache
 from rest_framework.decorators import action
-import json
+from rest_framework.parsers import MultiPartParser
+from rest_framework.renderers import JSONRenderer
 
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
+from django.http import HttpResponse
 from django.utils.dateparse import parse_datetime
-from .serializers import UserSerializer, StockDataSerializer, TransactionSerializer
-from .models import User, StockData, Transaction
-from .tasks import process_transaction 
+from .serializers import UserSerializer, StockDataSerializer, LatestQuoteSerializer, TransactionSerializer
+from .models import User, StockData, LatestQuote, Transaction
+from .tasks import enqueue_transaction
+from .ingest import ingest_stream, iter_chunks, detect_format
+from .caching import cached_response, entry_body, get_entries, needs_refresh, set_entries
+from .exports import stream_queryset, EXPORT_FORMATS
+from .pagination import KeysetPagination, InvalidCursor
+from .orders import submit_orders, price_order, MAX_BATCH_ORDERS, MAX_TRANSACTION_VOLUME
+from .holdings import value_portfolio
+from . import admission, movers, notifications
+from .prices import price_table
+from .timeseries import parse_interval, load_bars, resample, candles_as_records
+from .archive import BARS, TRANSACTIONS, archived_transactions
+from .admission import Rejected, admission_control
+from .indicators import INDICATORS, get_series, series_records
+
+MAX_INDICATOR_WINDOW = 1000
+MAX_INDICATOR_POINTS = 5000
+MAX_MOVERS = 500
+MAX_QUOTE_TICKERS = 200
+
+def rejected_response(rejected):
+    """
+    429 telling the client when to retry an order submission, or 400 for
+    one that could never be admitted.
+    """
+    if rejected.reason == "too_large":
+        return Response(
+            {"error": f"At most {admission.ORDER_RATE_BURST} orders per user can be submitted at once.", "reason": rejected.reason},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    messages = {
+        "overloaded": "Order processing is behind; try again later.",
+        "shed": "Batch orders are paused while order processing catches up.",
+        "rate_limited": "Too many orders submitted.",
+    }
+    return Response(
+        {"error": messages[rejected.reason], "reason": rejected.reason},
+        status=status.HTTP_429_TOO_MANY_REQUESTS, headers={'Retry-After': rejected.retry_after_header}
+    )
+
+
+EXPORT_FORMAT_PARAMETER = openapi.Parameter(
+    'output', openapi.IN_QUERY,
+    description="Export format: csv (default) or ndjson",
+    type=openapi.TYPE_STRING, enum=list(EXPORT_FORMATS), required=False
+)
+
+PAGINATION_PARAMETERS = [
+    openapi.Parameter(
+        'limit', openapi.IN_QUERY,
+        description="Page size (default 100, max 1000)",
+        type=openapi.TYPE_INTEGER, required=False
+    ),
+    openapi.Parameter(
+        'cursor', openapi.IN_QUERY,
+        description="Opaque cursor from the previous page's Link header",
+        type=openapi.TYPE_STRING, required=False
+    )
+]
+
 
 class UserViewSet(viewsets.ViewSet):
     lookup_field = 'username'
@@ -18,21 +79,31 @@ class UserViewSet(viewsets.ViewSet):
         """
         Retrieve user data, using cache if available.
         """
-        cache_key = f"user_{username}"
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            return Response(json.loads(cached_data))
-        
+        def build():
+            try:
+                user = User.objects.get(username=username)
+            except User.DoesNotExist:
+                return Response(
+                    {"error": "User not found"}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            return Response(UserSerializer(user).data)
+
+        return cached_response(request, f"user_{username}", build, timeout=3600)
+    
+    @swagger_auto_schema(
+        responses={200: 'Positions valued at the latest prices', 404: 'User not found'}
+    )
+    @action(detail=True, methods=['get'])
+    def portfolio(self, request, username=None):
+        """
+        Value a user's holdings against the latest prices.
+        """
         try:
             user = User.objects.get(username=username)
-            serializer = UserSerializer(user)
-            cache.set(cache_key, json.dumps(serializer.data), timeout=3600)
-            return Response(serializer.data)
         except User.DoesNotExist:
-            return Response(
-                {"error": "User not found"}, 
-                status=status.HTTP_404_NOT_FOUND
-            )
+            return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(dict(value_portfolio(user), username=user.username, balance=str(user.balance)))
     
     @swagger_auto_schema(
         request_body=UserSerializer,
@@ -57,34 +128,24 @@ class StockViewSet(viewsets.ViewSet):
         """
         List all stocks, using cache if available.
         """
-        cache_key = "all_stocks"
-        cached_data = cache.get(cache_key)
-        
-        if cached_data:
-            return Response(json.loads(cached_data))
-        
-        stocks = StockData.objects.all()
-        serializer = StockDataSerializer(stocks, many=True)
-        cache.set(cache_key, json.dumps(serializer.data), timeout=3600)
-        return Response(serializer.data)
+        def build():
+            stocks = StockData.objects.all()
+            return Response(StockDataSerializer(stocks, many=True).data)
+
+        return cached_response(request, "all_stocks", build, timeout=3600)
     
     def retrieve(self, request, ticker=None):
         """
-        Retrieve stock data, using cache if available.
+        Retrieve the latest bar for a stock, using cache if available.
         """
-        cache_key = f"stock_{ticker}"
-        cached_data = cache.get(cache_key)
-        
-        if cached_data:
-            return Response(json.loads(cached_data))
-        
-        try:
-            stock = StockData.objects.get(ticker=ticker)
-            serializer = StockDataSerializer(stock)
-            cache.set(cache_key, json.dumps(serializer.data), timeout=3600)
-            return Response(serializer.data)
-        except StockData.DoesNotExist:
-            return Response({"error": "Stock not found"}, status=status.HTTP_404_NOT_FOUND)
+        def build():
+            try:
+                stock = LatestQuote.objects.get(ticker=ticker)
+            except LatestQuote.DoesNotExist:
+                return Response({"error": "Stock not found"}, status=status.HTTP_404_NOT_FOUND)
+            return Response(LatestQuoteSerializer(stock).data)
+
+        return cached_response(request, f"stock_{ticker}", build, timeout=3600)
     
     @swagger_auto_schema(
         request_body=StockDataSerializer,
@@ -96,18 +157,344 @@ class StockViewSet(viewsets.ViewSet):
         """
         serializer = StockDataSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
-            cache.delete("all_stocks")  # Invalidate cache for all stocks
+            serializer.save()  # bars_ingested invalidates all_stocks and the ticker's quote
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                'interval', openapi.IN_QUERY,
+                description="Candle width, e.g. 5m, 1h, 1d (default 1h)",
+                type=openapi.TYPE_STRING, required=False
+            ),
+            openapi.Parameter(
+                'start', openapi.IN_QUERY,
+                description="Inclusive start timestamp (ISO 8601 format)",
+                type=openapi.TYPE_STRING, required=False
+            ),
+            openapi.Parameter(
+                'end', openapi.IN_QUERY,
+                description="Exclusive end timestamp (ISO 8601 format)",
+                type=openapi.TYPE_STRING, required=False
+            )
+        ],
+        responses={200: 'Aggregated OHLCV candles', 400: 'Bad Request'}
+    )
+    @action(detail=True, methods=['get'])
+    def bars(self, request, ticker=None):
+        """
+        Resample a stock's bars into coarser OHLCV candles.
+        """
+        try:
+            step = parse_interval(request.query_params.get("interval", "1h"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        bounds = {}
+        for param in ("start", "end"):
+            value = request.query_params.get(param)
+            if value:
+                bounds[param] = parse_datetime(value)
+                if bounds[param] is None:
+                    return Response({"error": "Invalid date format. Use ISO 8601."}, status=status.HTTP_400_BAD_REQUEST)
+
+        candles = resample(load_bars(ticker, **bounds), step)
+        return Response({
+            "ticker": ticker,
+            "interval": request.query_params.get("interval", "1h"),
+            "bars": candles_as_records(candles),
+        })
+    
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                'indicators', openapi.IN_QUERY,
+                description="Comma-separated subset of " + ", ".join(INDICATORS) + " (default all)",
+                type=openapi.TYPE_STRING, required=False
+            ),
+            openapi.Parameter(
+                'window', openapi.IN_QUERY,
+                description=f"Lookback in bars (default 20, max {MAX_INDICATOR_WINDOW})",
+                type=openapi.TYPE_INTEGER, required=False
+            ),
+            openapi.Parameter(
+                'limit', openapi.IN_QUERY,
+                description=f"Most recent points returned (default 100, max {MAX_INDICATOR_POINTS})",
+                type=openapi.TYPE_INTEGER, required=False
+            ),
+            openapi.Parameter(
+                'start', openapi.IN_QUERY,
+                description="Inclusive start timestamp (ISO 8601 format)",
+                type=openapi.TYPE_STRING, required=False
+            ),
+            openapi.Parameter(
+                'end', openapi.IN_QUERY,
+                description="Exclusive end timestamp (ISO 8601 format)",
+                type=openapi.TYPE_STRING, required=False
+            )
+        ],
+        responses={200: 'Indicator series per bar', 400: 'Bad Request', 404: 'Stock not found'}
+    )
+    @action(detail=True, methods=['get'])
+    def indicators(self, request, ticker=None):
+        """
+        Compute SMA, EMA, VWAP, RSI and Bollinger bands over a stock's bars.
+        """
+        names = [name.strip() for name in request.query_params.get("indicators", ",".join(INDICATORS)).split(",") if name.strip()]
+        unknown = [name for name in names if name not in INDICATORS]
+        if not names or unknown:
+            return Response({"error": f"indicators must be a subset of {', '.join(INDICATORS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            window = int(request.query_params.get("window", 20))
+            limit = int(request.query_params.get("limit", 100))
+        except ValueError:
+            return Response({"error": "window and limit must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 2 <= window <= MAX_INDICATOR_WINDOW or not 1 <= limit <= MAX_INDICATOR_POINTS:
+            return Response(
+                {"error": f"window must be 2-{MAX_INDICATOR_WINDOW} and limit 1-{MAX_INDICATOR_POINTS}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        bounds = {}
+        for param in ("start", "end"):
+            value = request.query_params.get(param)
+            if value:
+                bounds[param] = parse_datetime(value)
+                if bounds[param] is None:
+                    return Response({"error": "Invalid date format. Use ISO 8601."}, status=status.HTTP_400_BAD_REQUEST)
+
+        loaded = {}
+
+        def load(ticker):
+            # several indicators missing the cache share one read of the bars
+            if "bars" not in loaded:
+                loaded["bars"] = load_bars(ticker)
+            return loaded["bars"]
+
+        series = {}
+        for name in names:
+            points = get_series(ticker, name, window, load, limit=limit, **bounds)
+            if points is None:
+                return Response({"error": "Stock not found"}, status=status.HTTP_404_NOT_FOUND)
+            series[name] = series_records(name, *points)
+
+        return Response({"ticker": ticker, "window": window, "indicators": series})
+    
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                'start', openapi.IN_QUERY,
+                description="Inclusive start timestamp (ISO 8601 format)",
+                type=openapi.TYPE_STRING, required=False
+            ),
+            openapi.Parameter(
+                'end', openapi.IN_QUERY,
+                description="Exclusive end timestamp (ISO 8601 format)",
+                type=openapi.TYPE_STRING, required=False
+            ),
+            EXPORT_FORMAT_PARAMETER
+        ],
+        responses={200: 'Streamed CSV or NDJSON bars'}
+    )
+    @action(detail=True, methods=['get'])
+    def export(self, request, ticker=None):
+        """
+        Stream a stock's full bar history.
+        """
+        export_format = request.query_params.get("output", "csv")
+        if export_format not in EXPORT_FORMATS:
+            return Response({"error": "output must be csv or ndjson."}, status=status.HTTP_400_BAD_REQUEST)
+
+        bars = StockData.objects.filter(ticker=ticker)
+        bounds = {}
+        for param, lookup in (("start", "timestamp__gte"), ("end", "timestamp__lt")):
+            value = request.query_params.get(param)
+            if value:
+                parsed = parse_datetime(value)
+                if parsed is None:
+                    return Response({"error": "Invalid date format. Use ISO 8601."}, status=status.HTTP_400_BAD_REQUEST)
+                bars = bars.filter(**{lookup: parsed})
+                bounds[param] = parsed
+
+        fields = ['ticker', 'timestamp', 'open_price', 'high', 'low', 'close_price', 'volume']
+        return stream_queryset(
+            bars.order_by('timestamp', 'id'), fields, export_format, f"{ticker}_bars",
+            leading_rows=BARS.iter_rows(fields, ticker, **bounds)
+        )
+    
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                'tickers', openapi.IN_QUERY,
+                description=f"Comma-separated tickers (at most {MAX_QUOTE_TICKERS})",
+                type=openapi.TYPE_STRING, required=True
+            )
+        ],
+        responses={200: 'Latest bar per ticker, in request order, and the tickers not found', 400: 'Bad Request'}
+    )
+    @action(detail=False, methods=['get'])
+    def quotes(self, request):
+        """
+        Retrieve the latest bar for many stocks in one request.
+
+        Quotes share the ``stock_{ticker}`` cache entries of retrieve. All of
+        them are fetched with one MGET; misses are filled by one query and
+        written back in one pipeline, and the cached bodies are spliced into
+        the response without being decoded.
+        """
+        tickers = list(dict.fromkeys(
+            ticker.strip() for ticker in request.query_params.get("tickers", "").split(",") if ticker.strip()
+        ))
+        if not 1 <= len(tickers) <= MAX_QUOTE_TICKERS:
+            return Response({"error": f"tickers must list 1-{MAX_QUOTE_TICKERS} tickers."}, status=status.HTTP_400_BAD_REQUEST)
+
+        keys = {ticker: f"stock_{ticker}" for ticker in tickers}
+        entries = get_entries(keys.values())
+        # stale entries are refreshed with the misses rather than served
+        stale = [ticker for ticker in tickers if keys[ticker] not in entries or needs_refresh(entries[keys[ticker]])]
+        if stale:
+            quotes = LatestQuote.objects.filter(ticker__in=stale)
+            rendered = {
+                keys[quote.ticker]: JSONRenderer().render(LatestQuoteSerializer(quote).data) for quote in quotes
+            }
+            for key in {keys[ticker] for ticker in stale} - rendered.keys():
+                entries.pop(key, None)  # no longer has a quote
+            entries.update(set_entries(rendered, timeout=3600))
+
+        found = [entry_body(entries[keys[ticker]]) for ticker in tickers if keys[ticker] in entries]
+        missing = [ticker for ticker in tickers if keys[ticker] not in entries]
+        body = b'{"quotes":[' + b','.join(found) + b'],"missing":' + JSONRenderer().render(missing) + b'}'
+        return HttpResponse(body, content_type='application/json')
+    
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                'by', openapi.IN_QUERY,
+                description="Ranking: percent change of the latest bar (close vs open) or its volume",
+                type=openapi.TYPE_STRING, enum=[*movers.RANKINGS], default='change', required=False
+            ),
+            openapi.Parameter(
+                'order', openapi.IN_QUERY,
+                description="desc for gainers / highest volume, asc for losers / lowest volume",
+                type=openapi.TYPE_STRING, enum=['desc', 'asc'], default='desc', required=False
+            ),
+            openapi.Parameter(
+                'n', openapi.IN_QUERY,
+                description=f"Number of tickers (default 20, max {MAX_MOVERS})",
+                type=openapi.TYPE_INTEGER, required=False
+            )
+        ],
+        responses={200: 'Latest quotes in rank order', 400: 'Bad Request'}
+    )
+    @action(detail=False, methods=['get'])
+    def movers(self, request):
+        """
+        Rank tickers by their latest bar, from the rankings kept on ingest.
+        """
+        by = request.query_params.get("by", "change")
+        order = request.query_params.get("order", "desc")
+        try:
+            n = int(request.query_params.get("n", 20))
+        except ValueError:
+            n = 0
+        if by not in movers.RANKINGS or order not in ("desc", "asc") or not 1 <= n <= MAX_MOVERS:
+            return Response(
+                {"error": f"by must be one of {', '.join(movers.RANKINGS)}, order desc or asc, and n 1-{MAX_MOVERS}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({"by": by, "order": order, "movers": movers.top(by, n, ascending=order == "asc")})
+    
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                'file', openapi.IN_FORM,
+                description="CSV (with header) or NDJSON file of bars",
+                type=openapi.TYPE_FILE, required=True
+            ),
+            openapi.Parameter(
+                'batch_size', openapi.IN_QUERY,
+                description="Rows validated and written per batch",
+                type=openapi.TYPE_INTEGER, required=False
+            )
+        ],
+        responses={201: 'Ingestion report', 400: 'No valid rows'},
+        operation_description="Bulk load OHLCV bars from a CSV or NDJSON upload. "
+                              "The body may also be sent raw as text/csv or application/x-ndjson."
+    )
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser])
+    def bulk(self, request):
+        """
+        Stream-parse and ingest many bars at once.
+        """
+        options = {}
+        if "batch_size" in request.query_params:
+            try:
+                options["batch_size"] = int(request.query_params["batch_size"])
+            except ValueError:
+                options["batch_size"] = 0
+            if options["batch_size"] <= 0:
+                return Response({"error": "batch_size must be a positive integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.content_type.startswith("multipart/"):
+            upload = request.FILES.get("file")
+            if upload is None:
+                return Response({"error": "Missing file upload."}, status=status.HTTP_400_BAD_REQUEST)
+            chunks = upload.chunks()
+            data_format = detect_format(upload.name, upload.content_type)
+        else:
+            # read the raw body incrementally instead of letting DRF parse it
+            chunks = iter_chunks(request._request)
+            data_format = detect_format(content_type=request.content_type)
+
+        report = ingest_stream(chunks, data_format, **options).as_dict()
+        if report["inserted"] == 0:
+            return Response(report, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_201_CREATED)
+    
     
 class TransactionViewSet(viewsets.ViewSet):
     lookup_field = 'user_id'
     
+    def date_range(self, request):
+        """
+        Parse the required start_timestamp/end_timestamp query parameters.
+
+        Returns:
+            tuple: (start, end, None) or (None, None, error Response).
+        """
+        start_timestamp = request.query_params.get("start_timestamp")
+        end_timestamp = request.query_params.get("end_timestamp")
+        
+        if not start_timestamp or not end_timestamp:
+            return None, None, Response(
+                {"error": "Both start_timestamp and end_timestamp are required. Use ISO 8601 format."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        start_datetime = parse_datetime(start_timestamp)
+        end_datetime = parse_datetime(end_timestamp)
+        
+        if not start_datetime or not end_datetime:
+            return None, None, Response({"error": "Invalid date format. Use ISO 8601."}, status=status.HTTP_400_BAD_REQUEST)
+        return start_datetime, end_datetime, None
+    
+    def paginated_response(self, request, transactions, archived=None):
+        """
+        Serialize one keyset page of transactions, newest first, continuing
+        into ``archived`` (see KeysetPagination) once the database runs out.
+        """
+        paginator = KeysetPagination(request)
+        try:
+            page = paginator.paginate_queryset(transactions, archived)
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = TransactionSerializer(page, many=True)
+        return paginator.add_headers(Response(serializer.data))
+    
     @swagger_auto_schema(
         request_body=TransactionSerializer,
-        responses={201: TransactionSerializer()}
+        responses={201: TransactionSerializer(), 429: 'Order intake overloaded or rate limited; see Retry-After'}
     )
     def create(self, request):
         """
@@ -122,12 +509,27 @@ class TransactionViewSet(viewsets.ViewSet):
         user_id = request.data.get("user")
         ticker = request.data.get("ticker")
         transaction_type = request.data.get("transaction_type")
-        transaction_volume = int(request.data.get("transaction_volume"))
+        try:
+            transaction_volume = int(request.data.get("transaction_volume"))
+        except (TypeError, ValueError):
+            return Response({"error": "transaction_volume must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < transaction_volume <= MAX_TRANSACTION_VOLUME:
+            return Response({"error": "transaction_volume must be positive and fit a 32-bit integer."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            admission_control.check([user_id])
+        except Rejected as rejected:
+            return rejected_response(rejected)
         
         try:
             user = User.objects.get(id=user_id)
-            stock = StockData.objects.get(ticker=ticker)
-            transaction_price = stock.close_price * transaction_volume
+            close_price = price_table.price(ticker)  # in-process; reads the DB only when stale
+            if close_price is None:
+                return Response({"error": "Stock not found"}, status=status.HTTP_404_NOT_FOUND)
+            transaction_price = price_order(close_price, transaction_volume)
+            if transaction_price is None:
+                return Response({"error": "Order value is too large."}, status=status.HTTP_400_BAD_REQUEST)
             
             transaction = Transaction.objects.create(
                 user=user,
@@ -138,22 +540,79 @@ class TransactionViewSet(viewsets.ViewSet):
                 status="pending"
             )
 
-            process_transaction.delay(transaction.id)
+            notifications.notify([transaction])  # lets /wait/ answer without a query
+            enqueue_transaction(transaction)  # routed to the user's shard queue
             serializer = TransactionSerializer(transaction)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
             
         except User.DoesNotExist:
             return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
-        except StockData.DoesNotExist:
-            return Response({"error": "Stock not found"}, status=status.HTTP_404_NOT_FOUND)
     
+    @swagger_auto_schema(
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'orders': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        properties={
+                            'user': openapi.Schema(type=openapi.TYPE_INTEGER),
+                            'ticker': openapi.Schema(type=openapi.TYPE_STRING),
+                            'transaction_type': openapi.Schema(type=openapi.TYPE_STRING, enum=['BUY', 'SELL']),
+                            'transaction_volume': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        }
+                    )
+                )
+            },
+            required=['orders']
+        ),
+        responses={201: 'Per-order results', 400: 'Bad Request', 429: 'Shed under load or rate limited; see Retry-After'},
+        operation_description="Submit a basket of orders in one request"
+    )
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Create many transactions at once.
+        """
+        orders = request.data.get("orders") if isinstance(request.data, dict) else request.data
+        if not isinstance(orders, list) or not orders:
+            return Response({"error": "orders must be a non-empty list."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(orders) > MAX_BATCH_ORDERS:
+            return Response(
+                {"error": f"At most {MAX_BATCH_ORDERS} orders can be submitted per batch."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            # baskets are low priority: shed first when processing falls behind
+            admission_control.check(
+                [order.get("user") for order in orders if isinstance(order, dict)], low_priority=True
+            )
+        except Rejected as rejected:
+            return rejected_response(rejected)
+
+        results = submit_orders(orders)
+        created = sum(1 for result in results if "transaction" in result)
+        response_status = status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST
+        return Response(
+            {"created": created, "failed": len(results) - created, "results": results},
+            status=response_status
+        )
+    
+    @swagger_auto_schema(
+        manual_parameters=PAGINATION_PARAMETERS,
+        responses={200: TransactionSerializer(many=True)}
+    )
     def retrieve(self, request, user_id=None):
         """
-        Retrieve transactions for a specific user.
+        Retrieve transactions for a specific user, one page at a time.
         """
         transactions = Transaction.objects.filter(user_id=user_id)
-        serializer = TransactionSerializer(transactions, many=True)
-        return Response(serializer.data)
+        return self.paginated_response(
+            request, transactions,
+            lambda before, limit: archived_transactions(user_id, before=before, limit=limit)
+        )
     
     @swagger_auto_schema(
         manual_parameters=[
@@ -167,7 +626,7 @@ class TransactionViewSet(viewsets.ViewSet):
                 description="End timestamp (ISO 8601 format)", 
                 type=openapi.TYPE_STRING, required=True
             )
-        ],
+        ] + PAGINATION_PARAMETERS,
         responses={200: TransactionSerializer(many=True)}
     )
     @action(detail=True, methods=['get'])
@@ -175,24 +634,65 @@ class TransactionViewSet(viewsets.ViewSet):
         """
         Filter transactions by date range.
         """
-        start_timestamp = request.query_params.get("start_timestamp")
-        end_timestamp = request.query_params.get("end_timestamp")
-        
-        if not start_timestamp or not end_timestamp:
-            return Response(
-                {"error": "Both start_timestamp and end_timestamp are required. Use ISO 8601 format."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        start_datetime = parse_datetime(start_timestamp)
-        end_datetime = parse_datetime(end_timestamp)
-        
-        if not start_datetime or not end_datetime:
-            return Response({"error": "Invalid date format. Use ISO 8601."}, status=status.HTTP_400_BAD_REQUEST)
+        start_datetime, end_datetime, error = self.date_range(request)
+        if error:
+            return error
 
         transactions = Transaction.objects.filter(
             user_id=user_id, timestamp__range=[start_datetime, end_datetime]
         )
-        
-        serializer = TransactionSerializer(transactions, many=True)
-        return Response(serializer.data)
+        return self.paginated_response(
+            request, transactions,
+            lambda before, limit: archived_transactions(user_id, start_datetime, end_datetime, before, limit)
+        )
+    
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                'start_timestamp', openapi.IN_QUERY,
+                description="Start timestamp (ISO 8601 format)",
+                type=openapi.TYPE_STRING, required=True
+            ),
+            openapi.Parameter(
+                'end_timestamp', openapi.IN_QUERY,
+                description="End timestamp (ISO 8601 format)",
+                type=openapi.TYPE_STRING, required=True
+            ),
+            openapi.Parameter(
+                'user_id', openapi.IN_QUERY,
+                description="Only export this user's transactions",
+                type=openapi.TYPE_INTEGER, required=False
+            ),
+            EXPORT_FORMAT_PARAMETER
+        ],
+        responses={200: 'Streamed CSV or NDJSON transactions'}
+    )
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream every transaction in a date range, optionally for one user.
+        """
+        export_format = request.query_params.get("output", "csv")
+        if export_format not in EXPORT_FORMATS:
+            return Response({"error": "output must be csv or ndjson."}, status=status.HTTP_400_BAD_REQUEST)
+
+        start_datetime, end_datetime, error = self.date_range(request)
+        if error:
+            return error
+
+        transactions = Transaction.objects.filter(timestamp__range=[start_datetime, end_datetime])
+        user_id = request.query_params.get("user_id") or None
+        if user_id is not None:
+            try:
+                user_id = int(user_id)
+            except ValueError:
+                return Response({"error": "user_id must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+            transactions = transactions.filter(user_id=user_id)
+
+        fields = ['id', 'user_id', 'ticker', 'transaction_type', 'transaction_volume', 'transaction_price', 'timestamp', 'status']
+        # timestamp__range includes its end; archive selections exclude theirs
+        archived = TRANSACTIONS.iter_rows(fields, user_id, start_datetime, end_datetime + timedelta(microseconds=1))
+        return stream_queryset(
+            transactions.order_by('timestamp', 'id'), fields, export_format, "transactions",
+            leading_rows=archived
+        )
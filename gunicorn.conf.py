@@ -0,0 +1,11 @@
+# Loaded by gunicorn from the working directory (the asgi service in
+# docker-compose.yaml).
+from prometheus_client import multiprocess
+
+from StockFlow import metrics_process_id
+
+
+def child_exit(server, worker):
+    # drop the exited worker's live gauge files from the shared metrics
+    # directory; its counters and histograms keep counting toward the totals
+    multiprocess.mark_process_dead(metrics_process_id(worker.pid))